@@ -182,6 +182,74 @@ class BaseController:
         return v_safe
 
 
+def safe_action_instantaneous(action, speed, headway, has_leader, time_step):
+    """
+    Batched version of BaseController.get_safe_action_instantaneous:
+    instantaneously stops the vehicles that may collide into their leaders in
+    the next step.
+
+    Parameters
+    ----------
+    action: numpy array of float
+        requested accelerations
+    speed: numpy array of float
+        speeds of the vehicles
+    headway: numpy array of float
+        headways of the vehicles
+    has_leader: numpy array of bool
+        whether each vehicle has a leader (vehicles without a leader are always
+        safe)
+    time_step: float
+        duration of a simulation step
+
+    Returns
+    -------
+    numpy array of float
+        the requested accelerations of the vehicles that are not in danger of
+        crashing, and stopping accelerations otherwise
+    """
+    next_vel = speed + action * time_step
+    unsafe = has_leader & (next_vel > 0) & \
+        (headway < time_step * next_vel + speed * 1e-3)
+    return np.where(unsafe, -speed / time_step, action)
+
+
+def safe_velocity_action(action, speed, lead_speed, headway, delay,
+                         has_leader, time_step):
+    """
+    Batched version of BaseController.get_safe_action: clips the requested
+    accelerations so that vehicles do not exceed their safe velocities (see
+    BaseController.safe_velocity).
+
+    Parameters
+    ----------
+    action: numpy array of float
+        requested accelerations
+    speed: numpy array of float
+        speeds of the vehicles
+    lead_speed: numpy array of float
+        speeds of the leaders of the vehicles
+    headway: numpy array of float
+        headways of the vehicles
+    delay: numpy array of float
+        delays of the controllers of the vehicles
+    has_leader: numpy array of bool
+        whether each vehicle has a leader (the actions of vehicles without a
+        leader are not clipped)
+    time_step: float
+        duration of a simulation step
+
+    Returns
+    -------
+    numpy array of float
+        the requested accelerations, clipped by the safe velocities
+    """
+    v_safe = 2 * headway / time_step + (lead_speed - speed) - \
+        speed * (2 * delay)
+    unsafe = has_leader & (speed + action * time_step > v_safe)
+    return np.where(unsafe, (v_safe - speed) / time_step, action)
+
+
 # TODO: still a work in progress
 class SumoController:
 
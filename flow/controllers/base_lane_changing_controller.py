@@ -38,7 +38,7 @@ class BaseLaneChangingController:
         :return: the safe target lane (requested target lane if action is safe,
                  current lane if the action is not)
         """
-        current_lane = env.vehicles[self.veh_id]['lane']
+        current_lane = env.vehicles.get_lane(self.veh_id)
 
         # if no lane change is being performed, there is no need to check for
         # safety
@@ -56,18 +56,18 @@ class BaseLaneChangingController:
         # if there is only one vehicle in the environment, or there are no
         # vehicles in the target
         # lane, then lane changing to the target lane is safe
-        if (lead_id is None) or (len(env.vehicles) == 1):
+        if (lead_id is None) or (env.vehicles.num_vehicles == 1):
             return target_lane
 
         lead_pos = env.get_x_by_id(lead_id)
-        lead_length = env.vehicles[lead_id]['length']
+        lead_length = env.vehicles.get_state(lead_id, 'length')
 
         trail_pos = env.get_x_by_id(trail_id)
-        trail_vel = env.vehicles[trail_id]['speed']
+        trail_vel = env.vehicles.get_speed(trail_id)
 
         this_pos = env.get_x_by_id(self.veh_id)
-        this_vel = env.vehicles[self.veh_id]['speed']
-        this_length = env.vehicles[self.veh_id]['length']
+        this_vel = env.vehicles.get_speed(self.veh_id)
+        this_length = env.vehicles.get_state(self.veh_id, 'length')
 
         lead_gap = (lead_pos - this_pos) % env.scenario.length - lead_length
         trail_gap = (this_pos - trail_pos) % env.scenario.length - this_length
@@ -0,0 +1,358 @@
+"""
+This script contains a batched engine for computing the accelerations of
+flow-controlled vehicles.
+
+Vehicles are grouped by the class and parameters of their acceleration
+controller, and the accelerations of all vehicles in a group are computed at
+once over the speed, leader, and headway arrays of the Vehicles class. The
+batched computations mirror the scalar get_action methods of the controllers
+in car_following_models.py, which remain the reference implementations;
+vehicles whose controllers are not supported (including subclasses of the
+supported controllers) are computed with their scalar get_action methods.
+"""
+
+import collections
+import numpy as np
+
+from flow.controllers.car_following_models import CFMController, \
+    BCMController, OVMController, LinearOVM, IDMController
+
+# attributes of the controllers that are not parameters of the model
+NON_PARAMETERS = ("veh_id", "d")
+
+# states of the vehicles needed by the accelerations kernels
+State = collections.namedtuple(
+    "State", ["speed", "lead_speed", "headway", "trail_speed", "footway"])
+
+
+def _cfm_accel(contr, s):
+    return contr.k_d * (s.headway - contr.d_des) + \
+        contr.k_v * (s.lead_speed - s.speed) + \
+        contr.k_c * (contr.v_des - s.speed)
+
+
+def _bcm_accel(contr, s):
+    return contr.k_d * (s.headway - s.footway) + \
+        contr.k_v * ((s.lead_speed - s.speed) - (s.speed - s.trail_speed)) + \
+        contr.k_c * (contr.v_des - s.speed)
+
+
+def _ovm_accel(contr, s):
+    # V function here - input: h, output : Vh
+    v_h = contr.v_max / 2 * (1 - np.cos(np.pi * (s.headway - contr.h_st) /
+                                        (contr.h_go - contr.h_st)))
+    v_h[s.headway <= contr.h_st] = 0
+    v_h[s.headway >= contr.h_go] = contr.v_max
+
+    return contr.alpha * (v_h - s.speed) + \
+        contr.beta * (s.lead_speed - s.speed)
+
+
+def _linear_ovm_accel(contr, s):
+    # V function here - input: h, output : Vh
+    alpha = 1.689  # the average value from Nakayama paper
+    v_h = np.clip(alpha * (s.headway - contr.h_st), 0, contr.v_max)
+
+    return (v_h - s.speed) / contr.adaptation
+
+
+def _idm_accel(contr, s):
+    # negative headways are maintained (see IDMController.get_accel)
+    h = np.where(np.abs(s.headway) < 1e-3, 1e-3, s.headway)
+
+    # vehicles without a leader have a lead speed of nan, and consequently a
+    # desired gap of zero
+    s_star = contr.s0 + np.maximum(
+        0, s.speed * contr.T + s.speed * (s.speed - s.lead_speed)
+        / (2 * np.sqrt(contr.a * contr.b)))
+    s_star[np.isnan(s.lead_speed)] = 0
+
+    return contr.a * (1 - (s.speed / contr.v0) ** contr.delta - (s_star / h)**2)
+
+
+def _clip_max(contr, acc):
+    return np.minimum(acc, contr.accel_max)
+
+
+def _clip_max_decel(contr, acc):
+    return np.clip(acc, -abs(contr.decel_max), contr.accel_max)
+
+
+def _clip_acc_max_decel(contr, acc):
+    return np.clip(acc, -abs(contr.decel_max), contr.acc_max)
+
+
+# Key = controller class, Value = (acceleration kernel, whether vehicles
+# without a leader are given the maximum acceleration, whether the output is
+# delayed, clipping function applied after the delay)
+KERNELS = {
+    CFMController: (_cfm_accel, True, True, _clip_max),
+    BCMController: (_bcm_accel, True, True, _clip_max),
+    OVMController: (_ovm_accel, True, True, _clip_max_decel),
+    LinearOVM: (_linear_ovm_accel, False, True, _clip_acc_max_decel),
+    IDMController: (_idm_accel, False, False, None),
+}
+
+
+class ControllerGroup:
+
+    def __init__(self, controller, positions, indices):
+        """
+        Group of vehicles with controllers of the same class and parameters.
+
+        Attributes
+        ----------
+        controller: BaseController type
+            acceleration controller of one of the vehicles in the group, from
+            which the parameters of the group are collected
+        positions: numpy array of int
+            positions of the vehicles in the list of vehicles of the engine
+        indices: numpy array of int
+            indices of the vehicles in the Vehicles class
+        """
+        self.controller = controller
+        self.positions = positions
+        self.indices = indices
+        self.accel, self.requires_leader, delayed, self.clip = \
+            KERNELS[type(controller)]
+
+        # number of steps by which the output of the controllers is delayed
+        # (see the accel_queue of the scalar controllers)
+        self.delay = int(np.floor(controller.delay)) if delayed else 0
+
+        # delay queues of all vehicles in the group, stored as a ring buffer
+        # of the last "delay" accelerations of each vehicle
+        self.queue = np.zeros((len(indices), self.delay))
+        self.head = np.zeros(len(indices), dtype=int)
+        self.filled = np.zeros(len(indices), dtype=bool)
+
+    def get_actions(self, state):
+        """
+        Returns the accelerations of all vehicles in the group.
+
+        Parameters
+        ----------
+        state: State type
+            states of the vehicles in the group
+
+        Returns
+        -------
+        numpy array of float
+        """
+        contr = self.controller
+        acc = self.accel(contr, state)
+
+        if self.requires_leader:
+            has_leader = ~np.isnan(state.lead_speed)
+        else:
+            has_leader = np.ones(len(acc), dtype=bool)
+
+        if self.delay > 0:
+            # queues are initially filled with the current acceleration
+            new = has_leader & ~self.filled
+            self.queue[new] = acc[new, np.newaxis]
+            self.filled |= new
+
+            # pop the oldest acceleration, and push the current one
+            rows = np.flatnonzero(has_leader)
+            cols = self.head[rows]
+            delayed_acc = self.queue[rows, cols]
+            self.queue[rows, cols] = acc[rows]
+            self.head[rows] = (cols + 1) % self.delay
+            acc[rows] = delayed_acc
+
+        if self.clip is not None:
+            acc = self.clip(contr, acc)
+
+        # vehicles without a leader perform their maximum acceleration
+        if self.requires_leader:
+            acc[~has_leader] = contr.accel_max
+
+        if contr.acc_noise > 0:
+            acc += np.random.normal(0, contr.acc_noise, len(acc))
+
+        return acc
+
+    def add(self, positions, indices):
+        """
+        Appends vehicles to the group, with empty delay queues.
+        """
+        self.positions = np.append(self.positions, positions)
+        self.indices = np.append(self.indices, indices)
+        self.queue = np.concatenate(
+            (self.queue, np.zeros((len(indices), self.delay))))
+        self.head = np.append(self.head, np.zeros(len(indices), dtype=int))
+        self.filled = np.append(self.filled,
+                                np.zeros(len(indices), dtype=bool))
+
+    def reindex(self, new_position, new_index):
+        """
+        Drops the vehicles that left the network, along with their delay
+        queues, and follows the remaining ones to their new positions and
+        indices (-1 for vehicles that left).
+        """
+        kept = new_position[self.positions] >= 0
+        self.positions = new_position[self.positions[kept]]
+        self.indices = new_index[self.indices[kept]]
+        self.queue = self.queue[kept]
+        self.head = self.head[kept]
+        self.filled = self.filled[kept]
+
+    def reset_delay(self):
+        self.head[:] = 0
+        self.filled[:] = False
+
+
+class BatchController:
+
+    def __init__(self, vehicles, veh_ids):
+        """
+        Computes the accelerations of a set of flow-controlled vehicles at
+        once.
+
+        Attributes
+        ----------
+        vehicles: Vehicles type
+            see flow/core/vehicles.py
+        veh_ids: list of str
+            ids of the vehicles whose accelerations are computed
+        """
+        self.veh_ids = []
+        self.indices = np.zeros(0, dtype=int)
+        self.groups = []
+        self.fallback = []
+
+        # groups of the engine, by controller class and parameters
+        self._groups = dict()
+
+        self._add(vehicles, list(veh_ids))
+
+    def _add(self, vehicles, veh_ids):
+        """
+        Appends vehicles to the engine, in the groups of their controllers.
+        """
+        start = len(self.veh_ids)
+        self.veh_ids.extend(veh_ids)
+        self.indices = np.append(self.indices, vehicles.get_index(veh_ids))
+
+        positions = collections.OrderedDict()
+        for i, veh_id in enumerate(veh_ids, start):
+            contr = vehicles.get_acc_controller(veh_id)
+            if type(contr) not in KERNELS:
+                self.fallback.append((i, contr))
+                continue
+            params = tuple(sorted(
+                (key, value) for key, value in vars(contr).items()
+                if key not in NON_PARAMETERS
+                and isinstance(value, (int, float, str))))
+            positions.setdefault((type(contr), params), []).append(i)
+
+        for key, group_positions in positions.items():
+            group_positions = np.array(group_positions, dtype=int)
+            if key in self._groups:
+                self._groups[key].add(group_positions,
+                                      self.indices[group_positions])
+            else:
+                contr = vehicles.get_acc_controller(
+                    self.veh_ids[group_positions[0]])
+                group = ControllerGroup(contr, group_positions,
+                                        self.indices[group_positions])
+                self._groups[key] = group
+                self.groups.append(group)
+
+    def get_actions(self, env):
+        """
+        Returns the accelerations requested by the controllers of all vehicles,
+        including stochastic noise (if requested by the controllers).
+
+        Parameters
+        ----------
+        env: Environment type
+            current environment, which contains information of the state of the
+            network at the current time step
+
+        Returns
+        -------
+        numpy array of float
+            accelerations, in the order of veh_ids
+        """
+        accel = np.zeros(len(self.veh_ids))
+
+        if self.groups:
+            speed = env.vehicles.get_speed()
+            headway = env.vehicles.get_headway()
+            leader = env.vehicles.get_leader_index()
+            follower = env.vehicles.get_follower_index()
+
+            # speeds of missing leaders/followers are set to nan
+            padded_speed = np.append(speed, np.nan)
+
+            for group in self.groups:
+                lead = leader[group.indices]
+                trail = follower[group.indices]
+                this_speed = speed[group.indices]
+                this_headway = headway[group.indices]
+
+                # vehicles without a follower are treated as if followed by a
+                # vehicle with the same speed and headway
+                has_trail = trail >= 0
+                trail_speed = np.where(has_trail, padded_speed[trail],
+                                       this_speed)
+                footway = np.where(has_trail, headway[trail], this_headway)
+
+                state = State(speed=this_speed,
+                              lead_speed=padded_speed[lead],
+                              headway=this_headway,
+                              trail_speed=trail_speed,
+                              footway=footway)
+
+                accel[group.positions] = group.get_actions(state)
+
+        for i, contr in self.fallback:
+            accel[i] = contr.get_action(env)
+
+        return accel
+
+    def reindex(self, vehicles, veh_ids, new_index):
+        """
+        Follows the vehicles after vehicles entered or left the network. The
+        vehicles that left are dropped from their groups, the remaining ones
+        keep their delay queues, and the vehicles that entered are added to
+        the groups of their controllers.
+
+        Parameters
+        ----------
+        vehicles: Vehicles type
+            see flow/core/vehicles.py
+        veh_ids: list of str
+            ids of the vehicles whose accelerations are computed: the
+            remaining vehicles, in their previous order, followed by the
+            vehicles that entered the network
+        new_index: numpy array of int
+            new index in the vehicles class of every vehicle previously in the
+            network, or -1 if it left (see Vehicles.remove)
+        """
+        indices = new_index[self.indices]
+        kept = indices >= 0
+        new_position = -np.ones(len(kept), dtype=int)
+        new_position[kept] = np.arange(np.count_nonzero(kept))
+
+        self.veh_ids = [veh_id for veh_id, keep in zip(self.veh_ids, kept)
+                        if keep]
+        self.indices = indices[kept]
+        for group in self.groups:
+            group.reindex(new_position, new_index)
+        self.fallback = [(new_position[i], contr)
+                         for i, contr in self.fallback if kept[i]]
+
+        self._add(vehicles, veh_ids[len(self.veh_ids):])
+
+    def reset_delay(self, env):
+        """
+        Clears the delay queues of all vehicles.
+        """
+        for group in self.groups:
+            group.reset_delay()
+
+        for _, contr in self.fallback:
+            contr.reset_delay(env)
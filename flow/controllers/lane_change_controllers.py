@@ -45,8 +45,8 @@ class StochasticLaneChanger:
         v = [0] * env.scenario.lanes
         for lane in range(num_lanes):
             # count the cars in this lane
-            leadID = env.vehicles.get_leader(self.veh_id)
-            trailID = env.vehicles.get_follower(self.veh_id)
+            leadID = env.get_leading_car(self.veh_id, lane)
+            trailID = env.get_trailing_car(self.veh_id, lane)
 
             if not leadID or not trailID:
                 # empty lanes are assigned maximum speeds
@@ -70,8 +70,11 @@ class StochasticLaneChanger:
             # region
             other_car_ids = env.get_cars(self.veh_id, dxBack=self.dxBack,
                                          dxForward=self.dxForward, lane=lane)
-            v[lane] = np.mean([env.vehicles.get_speed(other_id)
-                               for other_id in other_car_ids])
+            if not other_car_ids:
+                # lanes without cars in the region are assigned maximum speeds
+                v[lane] = env.vehicles.get_state(self.veh_id, 'max_speed')
+                continue
+            v[lane] = np.mean(env.vehicles.get_speed(other_car_ids))
 
         maxv = max(v)  # determine max velocity
         maxl = v.index(maxv)  # lane with max velocity
@@ -81,11 +84,11 @@ class StochasticLaneChanger:
         # choosing preferred lane:
         # new lane is chosen with a probability prob
         # if its velocity is sufficiently greater than that of the current lane
-        if maxl != env.vehicles[self.veh_id]['lane'] and \
+        if maxl != env.vehicles.get_lane(self.veh_id) and \
                 (maxv - myv) > self.speedThreshold and \
                 random.random() < self.prob:
             return maxl
-        return env.vehicles[self.veh_id]['lane']
+        return env.vehicles.get_lane(self.veh_id)
 
 
 def stochastic_lane_changer(speedThreshold=5, prob=0.5,
@@ -119,7 +122,7 @@ def stochastic_lane_changer(speedThreshold=5, prob=0.5,
 
             if not leadID or not trailID:
                 # empty lanes are assigned maximum speeds
-                v[lane] = env.vehicles[carID]['max_speed']
+                v[lane] = env.vehicles.get_state(carID, 'max_speed')
                 continue
 
             leadPos = env.get_x_by_id(leadID)
@@ -139,8 +142,11 @@ def stochastic_lane_changer(speedThreshold=5, prob=0.5,
             # region
             other_car_ids = env.get_cars(carID, dxBack=dxBack,
                                          dxForward=dxForward, lane=lane)
-            v[lane] = np.mean([env.vehicles.get_speed(other_id)
-                               for other_id in other_car_ids])
+            if not other_car_ids:
+                # lanes without cars in the region are assigned maximum speeds
+                v[lane] = env.vehicles.get_state(carID, 'max_speed')
+                continue
+            v[lane] = np.mean(env.vehicles.get_speed(other_car_ids))
 
         maxv = max(v)  # determine max velocity
         maxl = v.index(maxv)  # lane with max velocity
@@ -0,0 +1,160 @@
+"""
+Simulation backends used by SumoEnvironment to start a simulation and connect
+to it. A backend returns a connection object exposing (a subset of) the traci
+connection interface, e.g. the vehicle, simulation, and lane domains.
+"""
+import logging
+import subprocess
+import sys
+import time
+
+import traci
+
+from flow.core.mock_traci import MockTraCIConnection
+from flow.core.sumo_pool import get_pool
+
+
+class SimulationBackend:
+    """
+    Abstract base class for simulation backends.
+    """
+
+    def start(self, env):
+        """
+        Starts a simulation of the scenario of an environment, and connects to
+        it. MUST BE implemented in any new backend.
+
+        Parameters
+        ----------
+        env: SumoEnvironment type
+            environment requesting the simulation
+
+        Returns
+        -------
+        connection: traci.connection.Connection or equivalent
+            connection to the simulation
+        """
+        raise NotImplementedError
+
+    def close(self, connection, wait=True):
+        """
+        Closes a connection returned by start, and terminates its simulation.
+
+        Parameters
+        ----------
+        connection: traci.connection.Connection or equivalent
+            connection to the simulation
+        wait: bool, optional
+            whether to wait for the simulation to terminate
+        """
+        connection.close(wait)
+
+
+class TraCIBackend(SimulationBackend):
+    """
+    Starts a sumo instance using the configuration files created by the
+    generator class, and connects to it with traci.
+    """
+
+    @staticmethod
+    def sumo_call(env):
+        """
+        Returns the sumo binary and command line arguments used to simulate
+        the scenario of an environment, excluding the --remote-port argument.
+        """
+        logging.debug(" Cfg file %s", env.scenario.cfg)
+        logging.debug(" Emission file: %s", env.emission_out)
+        logging.debug(" Time step: %s", env.time_step)
+
+        sumo_call = [env.sumo_binary,
+                     "-c", env.scenario.cfg,
+                     "--step-length", str(env.time_step)]
+        if env.emission_out:
+            sumo_call.append("--emission-output")
+            sumo_call.append(env.emission_out)
+
+        return sumo_call
+
+    def start(self, env):
+        """
+        See parent class.
+        """
+        logging.info(" Starting SUMO on port %s", env.port)
+
+        # Opening the I/O thread to SUMO
+        sumo_call = self.sumo_call(env) + ["--remote-port", str(env.port)]
+        logging.info("Traci on port: %s", env.port)
+
+        subprocess.Popen(sumo_call, stdout=sys.stdout, stderr=sys.stderr)
+
+        logging.debug(" Initializing TraCI on port %s!", env.port)
+
+        # wait a small period of time for the subprocess to activate before
+        # trying to connect with traci
+        time.sleep(0.02)
+
+        return traci.connect(env.port, numRetries=100)
+
+
+class PooledTraCIBackend(TraCIBackend):
+    """
+    Hands out connections to sumo processes launched ahead of time by a pool
+    of processes (see flow/core/sumo_pool.py), and recycles the processes of
+    closed connections instead of killing them. The number of processes
+    launched ahead of time is specified by "pool_size" in SumoParams.
+    """
+
+    def __init__(self):
+        self.pool = None
+
+    def start(self, env):
+        """
+        See parent class. The port of the environment is set to the port of
+        the process handed out by the pool.
+        """
+        self.pool = get_pool(self.sumo_call(env), env.sumo_params.pool_size)
+        connection, env.port = self.pool.acquire()
+        logging.info(" Using pooled SUMO on port %s", env.port)
+        return connection
+
+    def close(self, connection, wait=True):
+        """
+        See parent class. The process of the connection is returned to the
+        pool.
+        """
+        self.pool.release(connection)
+
+
+class MockTraCIBackend(SimulationBackend):
+    """
+    Starts a pure-python stand-in for sumo (see flow/core/mock_traci.py). No
+    sumo process is launched, and the generated configuration files are not
+    read; the initial state of the vehicles is collected from the scenario.
+    """
+
+    def start(self, env):
+        """
+        See parent class.
+        """
+        logging.info(" Starting mock simulation backend")
+        return MockTraCIConnection(env.scenario, env.time_step)
+
+
+# available backends, keyed by the value of sim_backend in SumoParams
+BACKENDS = {"traci": TraCIBackend, "traci_pool": PooledTraCIBackend,
+            "mock": MockTraCIBackend}
+
+
+def get_backend(name):
+    """
+    Returns an instance of the simulation backend specified by name.
+
+    Raises
+    ------
+    ValueError
+        If the backend is not one of the available backends
+    """
+    if name not in BACKENDS:
+        raise ValueError("Unknown simulation backend: %s. Available backends "
+                         "are: %s" % (name, ", ".join(sorted(BACKENDS))))
+    return BACKENDS[name]()
@@ -0,0 +1,115 @@
+"""
+Batching of traci commands issued to sumo during a simulation step.
+
+Each traci command (e.g. vehicle.slowDown) is normally sent to sumo in its own
+message, and waits for sumo's response before returning, resulting in one
+round-trip over the socket per command and per vehicle. The CommandBatcher
+instead appends the commands it is given to the message being built by the
+traci connection without sending it. All queued commands are then sent in a
+single message together with the next command that requires a response (in
+practice, simulationStep), as the traci protocol allows several commands per
+message, answered in order.
+
+Note that, since queued commands are only sent with a later command, errors
+raised by sumo for a queued command (e.g. an unknown vehicle id) are raised by
+that later command.
+"""
+
+
+class CommandBatcher:
+
+    def __init__(self, connection):
+        """
+        Wraps a traci connection to count and (optionally) defer the messages
+        sent to sumo.
+
+        Connections that are not backed by a socket (e.g. the mock connection
+        in flow/core/mock_traci.py) are supported, in which case commands are
+        performed immediately, and no round-trips are counted.
+
+        Attributes
+        ----------
+        connection: traci.connection.Connection type
+            connection to the sumo instance
+        round_trips: int
+            number of messages sent to sumo since the last call to reset_counts
+        num_commands: int
+            number of commands queued since the last call to reset_counts
+        """
+        self.connection = connection
+        self.round_trips = 0
+        self.num_commands = 0
+        self._deferring = False
+
+        # all commands are sent to sumo through the _sendExact method of the
+        # connection, which is replaced by a method that can defer sending.
+        # The original method is kept by the connection, so that connections
+        # reused by several batchers (e.g. the connections of a pool of sumo
+        # processes) are only wrapped once
+        self._send_exact = getattr(connection, "_flow_send_exact", None) or \
+            getattr(connection, "_sendExact", None)
+        if self._send_exact is not None:
+            connection._flow_send_exact = self._send_exact
+            connection._sendExact = self._send
+
+    def _send(self):
+        if self._deferring:
+            return None
+        self.round_trips += 1
+        return self._send_exact()
+
+    def defer(self, command, *args, **kwargs):
+        """
+        Queues a traci command that does not return a value, such as the
+        setters of the vehicle domain.
+
+        Parameters
+        ----------
+        command: function
+            traci command, e.g. traci_connection.vehicle.slowDown
+        args, kwargs:
+            arguments of the command
+        """
+        self._deferring = True
+        try:
+            command(*args, **kwargs)
+        finally:
+            self._deferring = False
+        self.num_commands += 1
+
+    def flush(self):
+        """
+        Sends all queued commands to sumo, if any, without waiting for another
+        command to do so.
+        """
+        if self._send_exact is not None and self.connection._queue:
+            self._send()
+
+    def reset_counts(self):
+        """
+        Resets the number of round-trips and queued commands (e.g. at the start
+        of a step).
+        """
+        self.round_trips = 0
+        self.num_commands = 0
+
+
+def restore_connection(connection):
+    """
+    Undoes the changes made to a traci connection by command batchers, and
+    discards the commands that were queued but not sent, e.g. before the
+    connection is handed out to another environment.
+
+    Parameters
+    ----------
+    connection: traci.connection.Connection type
+        connection to the sumo instance
+    """
+    send_exact = getattr(connection, "_flow_send_exact", None)
+    if send_exact is not None:
+        connection._sendExact = send_exact
+        del connection._flow_send_exact
+    if hasattr(connection, "_queue"):
+        connection._queue = []
+    if hasattr(connection, "_string"):
+        connection._string = bytes()
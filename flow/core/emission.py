@@ -0,0 +1,304 @@
+"""
+Streaming conversion of the emission files generated by sumo.
+
+Emission files contain the state of every vehicle at every time step of a
+simulation, and easily grow larger than the memory available to parse them
+into a tree. The converter instead parses them incrementally (discarding the
+elements it is done with), and stores the vehicle records in typed columns.
+
+The records are sorted by vehicle id (and, for a given vehicle, by time) with
+an external merge sort: chunks of at most chunk_size records are sorted in
+memory and spilled to memory-mapped run files in a temporary directory, after
+which the runs are merged, at most fan_in at a time. The peak memory usage is
+accordingly bounded by the chunk size, whatever the size of the emission file.
+
+The sorted records can be written as a csv file, as an .npz archive of one
+array per column, or as a single .npy file of records that can be memory
+mapped with numpy.load(path, mmap_mode="r").
+"""
+import csv
+import heapq
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from lxml import etree
+
+# columns of the converted emission files, with the emission attribute they
+# are read from (the time is the one of the enclosing timestep, and the edge
+# and lane number are read from the lane of the vehicle), and their type
+COLUMNS = [
+    ("time", None, np.float64),
+    ("CO", "CO", np.float64),
+    ("y", "y", np.float64),
+    ("CO2", "CO2", np.float64),
+    ("electricity", "electricity", np.float64),
+    ("type", "type", np.str_),
+    ("id", "id", np.str_),
+    ("eclass", "eclass", np.str_),
+    ("waiting", "waiting", np.float64),
+    ("NOx", "NOx", np.float64),
+    ("fuel", "fuel", np.float64),
+    ("HC", "HC", np.float64),
+    ("x", "x", np.float64),
+    ("route", "route", np.str_),
+    ("relative_position", "pos", np.float64),
+    ("noise", "noise", np.float64),
+    ("angle", "angle", np.float64),
+    ("PMx", "PMx", np.float64),
+    ("speed", "speed", np.float64),
+    ("edge_id", None, np.str_),
+    ("lane_number", None, np.int64),
+]
+
+COLUMN_NAMES = [name for name, _, _ in COLUMNS]
+
+OUTPUT_FORMATS = ["csv", "npz", "npy"]
+
+# attributes read as floats, and the columns they are stored in
+_FLOAT_ATTRIBUTES = [(name, attribute) for name, attribute, dtype in COLUMNS
+                     if attribute is not None and dtype is np.float64]
+_STR_ATTRIBUTES = [(name, attribute) for name, attribute, dtype in COLUMNS
+                   if attribute is not None and dtype is np.str_]
+
+
+def convert_emission(emission_path, output_path=None, output_format="csv",
+                     chunk_size=100000, fan_in=64, tmp_dir=None):
+    """
+    Converts an emission file generated by sumo into a csv file, an .npz
+    archive, or a memory-mappable .npy file, with the records sorted by
+    vehicle id.
+
+    Parameters
+    ----------
+    emission_path: str
+        path to the emission file that should be converted
+    output_path: str, optional
+        path to the file that will be generated, default is the path of the
+        emission file, with the extension of the output format
+    output_format: str, optional
+        one of "csv", "npz" (one array per column) and "npy" (a single array
+        of records)
+    chunk_size: int, optional
+        number of records sorted in memory at a time
+    fan_in: int, optional
+        maximum number of runs merged at a time
+    tmp_dir: str, optional
+        directory in which the temporary run files are created, default is
+        the directory of the output file
+
+    Returns
+    -------
+    str
+        path to the generated file
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("Output format must be one of {}, not {}".format(
+            OUTPUT_FORMATS, output_format))
+    if chunk_size < 1 or fan_in < 2:
+        raise ValueError("The chunk size must be positive, and the fan in "
+                         "at least 2")
+
+    # default output path
+    if output_path is None:
+        output_path = emission_path[:-3] + output_format
+
+    if tmp_dir is None:
+        tmp_dir = os.path.dirname(os.path.abspath(output_path))
+    run_dir = tempfile.mkdtemp(prefix="emission-", dir=tmp_dir)
+
+    try:
+        # sort the records chunk by chunk
+        runs = []
+        for chunk in iter_emission_chunks(emission_path, chunk_size):
+            order = np.argsort(chunk["id"], kind="mergesort")
+            runs.append(_save_run(
+                run_dir, len(runs), {name: column[order]
+                                     for name, column in chunk.items()}))
+        if not runs:
+            runs.append(_save_run(run_dir, 0, _to_arrays(
+                {name: [] for name in COLUMN_NAMES})))
+
+        # merge the runs, until at most fan_in runs are left
+        num_runs = len(runs)
+        while len(runs) > fan_in:
+            runs = [_merge_runs(runs[i:i + fan_in],
+                                _run_path(run_dir, num_runs + i // fan_in),
+                                chunk_size)
+                    for i in range(0, len(runs), fan_in)]
+            num_runs += len(runs)
+
+        merged_path = _run_path(run_dir, "merged")
+        _merge_runs(runs, merged_path, chunk_size)
+        logging.info("Sorted the emission file %s in %d runs",
+                     emission_path, num_runs)
+
+        if output_format == "npy":
+            shutil.move(merged_path, output_path)
+        else:
+            records = np.load(merged_path, mmap_mode="r")
+            if output_format == "csv":
+                _write_csv(records, output_path, chunk_size)
+            else:
+                np.savez(output_path, **{name: records[name]
+                                         for name in COLUMN_NAMES})
+            # release the memory map before removing the merged file
+            del records
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    return output_path
+
+
+def iter_emission_chunks(emission_path, chunk_size):
+    """
+    Parses an emission file incrementally, and yields its vehicle records in
+    chunks, in the order of the file.
+
+    Records missing any of the attributes of the columns (e.g. the final
+    records of the vehicles that are removed from the network) are skipped.
+
+    Parameters
+    ----------
+    emission_path: str
+        path to the emission file
+    chunk_size: int
+        maximum number of records per chunk
+
+    Yields
+    ------
+    dict of numpy ndarray
+        typed column of each column name
+    """
+    columns = {name: [] for name in COLUMN_NAMES}
+    num_records = 0
+
+    context = etree.iterparse(emission_path, events=("end",),
+                              tag=("vehicle", "timestep"), recover=True)
+    for _, elem in context:
+        if elem.tag == "vehicle":
+            attrib = elem.attrib
+            try:
+                # read all attributes before appending any of them, so that
+                # incomplete records leave the columns aligned
+                floats = [float(attrib[attribute])
+                          for _, attribute in _FLOAT_ATTRIBUTES]
+                strs = [attrib[attribute] for _, attribute in _STR_ATTRIBUTES]
+                edge, _, lane_number = attrib["lane"].rpartition("_")
+                lane_number = int(lane_number)
+                time = float(elem.getparent().attrib["time"])
+            except (KeyError, ValueError):
+                elem.clear()
+                continue
+
+            for (name, _), value in zip(_FLOAT_ATTRIBUTES, floats):
+                columns[name].append(value)
+            for (name, _), value in zip(_STR_ATTRIBUTES, strs):
+                columns[name].append(value)
+            columns["time"].append(time)
+            columns["edge_id"].append(edge)
+            columns["lane_number"].append(lane_number)
+            num_records += 1
+
+            if num_records == chunk_size:
+                yield _to_arrays(columns)
+                columns = {name: [] for name in COLUMN_NAMES}
+                num_records = 0
+
+        # free the elements that were parsed, including the (empty) siblings
+        # preceding them
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+    if num_records > 0:
+        yield _to_arrays(columns)
+
+
+def _to_arrays(columns):
+    return {name: np.array(columns[name], dtype=dtype)
+            for name, _, dtype in COLUMNS}
+
+
+def _run_path(run_dir, name):
+    return os.path.join(run_dir, "run-{}.npy".format(name))
+
+
+def _save_run(run_dir, index, columns):
+    """Saves sorted columns as a run file of records, and returns its path."""
+    dtype = np.dtype([(name, columns[name].dtype) for name in COLUMN_NAMES])
+    records = np.empty(len(columns["id"]), dtype=dtype)
+    for name in COLUMN_NAMES:
+        records[name] = columns[name]
+
+    path = _run_path(run_dir, index)
+    np.save(path, records)
+    return path
+
+
+def _merge_runs(paths, output_path, block_size):
+    """
+    Merges sorted run files into a single sorted run file, and removes them.
+    Records with the same id are kept in the order of the runs, and of the
+    records within each run.
+    """
+    runs = [np.load(path, mmap_mode="r") for path in paths]
+
+    # the string columns of the runs may have different widths
+    dtype = np.dtype([
+        (name, _common_type([run.dtype[name] for run in runs], dtype))
+        for name, _, dtype in COLUMNS])
+    num_records = sum(len(run) for run in runs)
+    merged = np.lib.format.open_memmap(output_path, mode="w+", dtype=dtype,
+                                       shape=(num_records,))
+
+    merged_ids = heapq.merge(*[_iter_ids(run, i, block_size)
+                               for i, run in enumerate(runs)])
+    start = 0
+    while start < num_records:
+        # records of each run in the next block of the merged records
+        block = [[] for _ in runs]
+        positions = [[] for _ in runs]
+        end = min(start + block_size, num_records)
+        for position in range(start, end):
+            _, i, record = next(merged_ids)
+            block[i].append(record)
+            positions[i].append(position)
+
+        for i, run in enumerate(runs):
+            if block[i]:
+                merged[positions[i]] = run[block[i]].astype(dtype)
+        start = end
+
+    merged.flush()
+    del merged, runs
+    for path in paths:
+        os.remove(path)
+
+    return output_path
+
+
+def _common_type(dtypes, dtype):
+    if dtype is np.str_:
+        return np.dtype((np.str_, max(max(d.itemsize // 4 for d in dtypes), 1)))
+    return np.dtype(dtype)
+
+
+def _iter_ids(run, index, block_size):
+    """Yields the id, run index, and record index of the records of a run."""
+    for start in range(0, len(run), block_size):
+        ids = run["id"][start:start + block_size].tolist()
+        for record, veh_id in enumerate(ids, start):
+            yield veh_id, index, record
+
+
+def _write_csv(records, output_path, block_size):
+    with open(output_path, "w") as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(COLUMN_NAMES)
+        for start in range(0, len(records), block_size):
+            block = records[start:start + block_size]
+            writer.writerows(zip(*[block[name].tolist()
+                                   for name in COLUMN_NAMES]))
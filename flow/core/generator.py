@@ -4,11 +4,13 @@ Base class for generating transportation networks.
 from flow.core.util import makexml
 from flow.core.util import printxml
 from flow.core.util import ensure_dir
+from flow.core.net_cache import NetCache
 
 import sys
 import subprocess
 import logging
 import random
+from collections import OrderedDict
 from lxml import etree
 
 from rllab.core.serializable import Serializable
@@ -51,6 +53,10 @@ class Generator(Serializable):
         netfn = "%s.net.xml" % self.name
         confn = "%s.con.xml" % self.name
 
+        # contents of the input files of netconvert, used to identify the
+        # network in the cache of networks
+        inputs = []
+
         # specify the attributes of the nodes
         nodes = self.specify_nodes(net_params)
 
@@ -60,6 +66,7 @@ class Generator(Serializable):
         for node_attributes in nodes:
             x.append(E("node", **node_attributes))
         printxml(x, self.net_path + nodfn)
+        inputs.append(etree.tostring(x))
 
         # collect the attributes of each edge
         edges = self.specify_edges(net_params)
@@ -69,6 +76,7 @@ class Generator(Serializable):
         for edge_attributes in edges:
             x.append(E("edge", attrib=edge_attributes))
         printxml(x, self.net_path + edgfn)
+        inputs.append(etree.tostring(x))
 
         # specify the types attributes (default is None)
         types = self.specify_types(net_params)
@@ -80,6 +88,9 @@ class Generator(Serializable):
             for type_attributes in types:
                 x.append(E("type", **type_attributes))
             printxml(x, self.net_path + typfn)
+            inputs.append(etree.tostring(x))
+        else:
+            inputs.append("")
 
         # specify the connection attributes (default is None)
         connections = self.specify_connections(net_params)
@@ -92,6 +103,9 @@ class Generator(Serializable):
             for connection_attributes in connections:
                 x.append(E("connection", **connection_attributes))
             printxml(x, self.net_path + confn)
+            inputs.append(etree.tostring(x))
+        else:
+            inputs.append("")
 
         # check whether the user requested no-internal-links (default="true")
         if net_params.no_internal_links:
@@ -122,11 +136,29 @@ class Generator(Serializable):
         x.append(t)
         printxml(x, self.net_path + cfgfn)
 
-        retcode = subprocess.call(
-            ["netconvert -c " + self.net_path + cfgfn + " --output-file=" +
-             self.cfg_path + netfn + ' --no-internal-links="%s"'
-             % no_internal_links],
-            stdout=sys.stdout, stderr=sys.stderr, shell=True)
+        netconvert_call = ["netconvert -c " + self.net_path + cfgfn +
+                           " --output-file=" + self.cfg_path + netfn +
+                           ' --no-internal-links="%s"' % no_internal_links]
+
+        # reuse a previously generated network with the same inputs, if a
+        # cache of networks is specified
+        if net_params.net_cache_dir is None:
+            subprocess.call(netconvert_call, stdout=sys.stdout,
+                            stderr=sys.stderr, shell=True)
+        else:
+            cache = NetCache(net_params.net_cache_dir,
+                             net_params.net_cache_size)
+            key = cache.key(no_internal_links, *inputs)
+            if not cache.fetch(key, self.cfg_path + netfn):
+                with cache.lock(key):
+                    # the network may have been generated by another process
+                    # while waiting for the lock
+                    if not cache.fetch(key, self.cfg_path + netfn):
+                        retcode = subprocess.call(
+                            netconvert_call, stdout=sys.stdout,
+                            stderr=sys.stderr, shell=True)
+                        if retcode == 0:
+                            cache.store(key, self.cfg_path + netfn)
 
         self.netfn = netfn
 
@@ -193,37 +225,141 @@ class Generator(Serializable):
         return cfgfn
 
     def make_routes(self, scenario, initial_config):
-
+        """
+        Generates the .rou.xml file containing the types of the vehicles and
+        their initial positions, lanes, and speeds. The file is streamed to
+        disk (see write_routes). If requested in the initial config, vehicles
+        written as flows are renamed in the vehicles class with the ids sumo
+        assigns them.
+        """
         vehicles = scenario.vehicles
-        type_list = vehicles.types
         if vehicles.num_vehicles > 0:
-            routes = makexml("routes", "http://sumo.dlr.de/xsd/routes_file.xsd")
-
-            # add the types of vehicles to the xml file
-            for veh_type in vehicles.types:
-                routes.append(E("vType", id=veh_type, minGap="0", accel="100",
-                                decel="100"))
-
-            self.vehicle_ids = vehicles.get_ids()
+            # a copy is made so that shuffling does not modify the ordering of
+            # vehicles in the Vehicles class
+            self.vehicle_ids = list(vehicles.get_ids())
 
             if initial_config.shuffle:
                 random.shuffle(self.vehicle_ids)
 
-            # add the initial positions of vehicles to the xml file
+            vtypes = [E("vType", id=veh_type, minGap="0", accel="100",
+                        decel="100") for veh_type in vehicles.types]
+
+            # the initial positions of vehicles, generated one at a time
             positions = initial_config.positions
             lanes = initial_config.lanes
-            for i, id in enumerate(self.vehicle_ids):
-                veh_type = vehicles.get_state(id, "type")
-                edge, pos = positions[i]
-                lane = lanes[i]
-                indx_type = [i for i in range(len(type_list)) if type_list[i] == veh_type][0]
-                type_depart_speed = vehicles.get_initial_speed(id)
-                routes.append(self._vehicle(
-                    veh_type, "route" + edge, depart="0", id=id,
-                    color="1,0.0,0.0", departSpeed=str(type_depart_speed),
-                    departPos=str(pos), departLane=str(lane)))
-
-            printxml(routes, self.cfg_path + self.roufn)
+            departures = (
+                (id, vehicles.get_state(id, "type"), "route" + positions[i][0],
+                 str(positions[i][1]),
+                 dict(depart="0", color="1,0.0,0.0",
+                      departSpeed=str(vehicles.get_initial_speed(id)),
+                      departLane=str(lanes[i])))
+                for i, id in enumerate(self.vehicle_ids))
+
+            names = self.write_routes(vtypes, departures,
+                                      flows=initial_config.flows)
+            if names:
+                self.vehicle_ids = [names.get(id, id)
+                                    for id in self.vehicle_ids]
+                self.rename_vehicles(vehicles, names)
+
+    def write_routes(self, vtypes, departures, flows=False):
+        """
+        Writes the .rou.xml file of the scenario. Elements are streamed to
+        disk one at a time, so that the xml tree of the file is never held in
+        memory.
+
+        Parameters
+        ----------
+        vtypes: list of lxml Element
+            vType elements of the types of vehicles
+        departures: iterable of tuple
+            (id, type, route, departPos, attributes) of every vehicle, in
+            order of departure, where attributes is a dict of the other
+            attributes of the vehicle element (depart, departSpeed, ...)
+        flows: bool, optional
+            if True, vehicles sharing their type, route, and departure
+            attributes (depart, departLane, departSpeed, ...) are written as a
+            single flow element, named after the first vehicle of the group.
+            Their departure positions are not kept: sumo inserts all vehicles
+            of the flow at once, at free positions of the first edge of their
+            route, and names them "<flow id>.<index>".
+
+        Returns
+        -------
+        dict
+            ids assigned by sumo to the vehicles written as flows (key = id of
+            the vehicle in departures, value = id of the vehicle in sumo)
+        """
+        names = dict()
+        if flows:
+            departures = self._group_departures(departures)
+        else:
+            departures = ([departure] for departure in departures)
+
+        xsi = "http://www.w3.org/2001/XMLSchema-instance"
+        attrib = {"{%s}noNamespaceSchemaLocation" % xsi:
+                  "http://sumo.dlr.de/xsd/routes_file.xsd"}
+
+        with open(self.cfg_path + self.roufn, "wb") as f:
+            with etree.xmlfile(f, encoding="UTF-8") as xf:
+                xf.write_declaration()
+                with xf.element("routes", attrib, nsmap={"xsi": xsi}):
+                    for vtype in vtypes:
+                        xf.write("\n  ")
+                        xf.write(vtype)
+
+                    for group in departures:
+                        id, veh_type, route, pos, attributes = group[0]
+                        xf.write("\n  ")
+                        if len(group) == 1:
+                            xf.write(self._vehicle(veh_type, route, pos,
+                                                   id=id, **attributes))
+                            continue
+
+                        attributes = dict(attributes)
+                        depart = attributes.pop("depart", "0")
+                        xf.write(self._flow(
+                            id, len(group), veh_type, route, begin=depart,
+                            end=depart, departPos="free", **attributes))
+                        for i, departure in enumerate(group):
+                            names[departure[0]] = "%s.%d" % (id, i)
+                    xf.write("\n")
+            f.write(b"\n")
+
+        return names
+
+    @staticmethod
+    def _group_departures(departures):
+        """
+        Groups the departures of vehicles sharing their type, route, and
+        departure attributes, regardless of their departure positions. Groups
+        are returned as lists of departures, in order of first departure.
+        """
+        groups = OrderedDict()
+        for departure in departures:
+            id, veh_type, route, pos, attributes = departure
+            key = (veh_type, route, tuple(sorted(attributes.items())))
+            groups.setdefault(key, []).append(departure)
+
+        return list(groups.values())
+
+    @staticmethod
+    def rename_vehicles(vehicles, names):
+        """
+        Renames vehicles in the vehicles class, keeping their order and types.
+
+        Parameters
+        ----------
+        vehicles: Vehicles type
+            see flow/core/vehicles.py
+        names: dict
+            new ids of the renamed vehicles (key = current id)
+        """
+        veh_ids = list(vehicles.get_ids())
+        veh_types = [vehicles.get_state(veh_id, "type") for veh_id in veh_ids]
+        vehicles.remove(veh_ids)
+        for veh_id, veh_type in zip(veh_ids, veh_types):
+            vehicles.add(names.get(veh_id, veh_id), veh_type)
 
     def specify_nodes(self, net_params):
         """
@@ -0,0 +1,137 @@
+"""
+Spatial index of the vehicles in each lane of the network.
+
+Lane-changing controllers need the leaders and followers of vehicles in lanes
+other than their own, as well as the vehicles within some distance of them,
+which sumo does not provide without a traci command per vehicle and per lane.
+The LaneIndex instead sorts the positions of all vehicles in each lane once,
+after which these neighbor queries are answered by binary search.
+
+Positions are the 1-dimensional positions of the vehicles in the network (see
+Scenario.get_x), and lanes are identified by their lane index, so that the
+leader of the vehicle at the front of a lane is the vehicle at the back of the
+same lane, as in a ring.
+"""
+import bisect
+
+import numpy as np
+
+
+class LaneIndex:
+
+    def __init__(self, ids, x, lanes, length):
+        """
+        Sorts the vehicles of each lane by position.
+
+        Attributes
+        ----------
+        ids: list of str
+            ids of the vehicles
+        x: numpy array of float
+            positions of the vehicles, in [0, length)
+        lanes: numpy array of int
+            lane indices of the vehicles
+        length: float
+            length of the network, after which positions wrap around
+        """
+        self.length = length
+
+        # positions and ids of the vehicles of each lane, sorted by position
+        self.lane_x = dict()
+        self.lane_ids = dict()
+
+        # position, lane, and rank within its lane of each vehicle
+        self.x = dict()
+        self.lane = dict()
+        self.rank = dict()
+
+        if len(ids) == 0:
+            return
+
+        x = np.asarray(x, dtype=float)
+        lanes = np.asarray(lanes, dtype=int)
+        order = np.lexsort((x, lanes))
+        sorted_ids = [ids[i] for i in order]
+        sorted_x = x[order].tolist()
+        sorted_lanes = lanes[order].tolist()
+
+        # start and end of each lane in the sorted vehicles
+        bounds = np.flatnonzero(np.diff(lanes[order])) + 1
+        starts = [0] + bounds.tolist()
+        ends = bounds.tolist() + [len(order)]
+
+        for start, end in zip(starts, ends):
+            lane = sorted_lanes[start]
+            self.lane_x[lane] = sorted_x[start:end]
+            self.lane_ids[lane] = sorted_ids[start:end]
+            for rank, veh_id in enumerate(self.lane_ids[lane]):
+                self.x[veh_id] = sorted_x[start + rank]
+                self.lane[veh_id] = lane
+                self.rank[veh_id] = rank
+
+    def get_leader(self, veh_id, lane):
+        """
+        Returns the id of the first vehicle ahead of a vehicle in a lane (the
+        lane of the vehicle or any other lane), or None if the lane does not
+        contain any other vehicle. In lanes other than its own, a vehicle
+        located at the same position as veh_id is considered its leader.
+        """
+        ids = self.lane_ids.get(lane)
+        if not ids:
+            return None
+
+        if lane == self.lane[veh_id]:
+            i = self.rank[veh_id] + 1
+        else:
+            i = bisect.bisect_left(self.lane_x[lane], self.x[veh_id])
+
+        leader = ids[i % len(ids)]
+        return leader if leader != veh_id else None
+
+    def get_follower(self, veh_id, lane):
+        """
+        Returns the id of the first vehicle behind a vehicle in a lane (the
+        lane of the vehicle or any other lane), or None if the lane does not
+        contain any other vehicle.
+        """
+        ids = self.lane_ids.get(lane)
+        if not ids:
+            return None
+
+        if lane == self.lane[veh_id]:
+            i = self.rank[veh_id] - 1
+        else:
+            i = bisect.bisect_left(self.lane_x[lane], self.x[veh_id]) - 1
+
+        follower = ids[i % len(ids)]
+        return follower if follower != veh_id else None
+
+    def get_range(self, veh_id, lane, dx_back, dx_forward):
+        """
+        Returns the ids of the vehicles in a lane located between dx_back
+        meters behind and dx_forward meters ahead of a vehicle (inclusive),
+        from back to front, excluding the vehicle itself.
+        """
+        ids = self.lane_ids.get(lane)
+        if not ids:
+            return []
+
+        if dx_back + dx_forward >= self.length:
+            # the range covers the whole lane; start from the back of the
+            # range
+            x = self.lane_x[lane]
+            i = bisect.bisect_left(x, (self.x[veh_id] - dx_back) % self.length)
+            in_range = ids[i:] + ids[:i]
+        else:
+            x = self.lane_x[lane]
+            low = (self.x[veh_id] - dx_back) % self.length
+            high = (self.x[veh_id] + dx_forward) % self.length
+            if low <= high:
+                in_range = ids[bisect.bisect_left(x, low):
+                               bisect.bisect_right(x, high)]
+            else:
+                # the range wraps around the end of the network
+                in_range = ids[bisect.bisect_left(x, low):] + \
+                    ids[:bisect.bisect_right(x, high)]
+
+        return [other_id for other_id in in_range if other_id != veh_id]
@@ -0,0 +1,639 @@
+"""
+Pure-python stand-in for a TraCI connection to a running SUMO instance.
+
+The mock implements the subset of the traci.vehicle, traci.simulation,
+traci.lane, traci.junction, and traci.trafficlights domains used by the
+environments, including variable, leader, lane, and context subscriptions.
+Vehicles move with simple deterministic kinematics along the one-dimensional
+coordinate system of the scenario (see Scenario.get_x and Scenario.get_edge),
+which is treated as a closed loop of length scenario.length. This is exact
+for ring roads, and a reasonable approximation for other closed networks (e.g.
+figure eight).
+
+The mock is meant for benchmarking and testing the python-side of the
+environments on machines without SUMO, and is not a replacement for SUMO's
+car-following and lane-changing dynamics:
+ - vehicles keep their speed unless a new speed is requested via slowDown
+ - vehicles never collide: speeds are capped so that a vehicle does not pass
+   its leader within a step
+ - lane changes requested via changeLane are performed at the next step
+ - vehicles only leave the network when removed with vehicle.remove, after
+   which they are reported as arrived at the next step
+ - states saved with simulation.saveState are kept in memory, and no file is
+   written
+"""
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from traci import constants as tc
+
+from flow.core.util import get_loop_leaders
+
+# default length of vehicles in sumo (in meters)
+DEFAULT_LENGTH = 5.
+
+# default maximum speed of vehicles in sumo (in m/s)
+DEFAULT_MAX_SPEED = 70.
+
+# id of the only junction in the network
+JUNCTION_ID = "mock"
+
+# phases and programs of traffic lights, as in the definitions returned by
+# traci.trafficlights.getCompleteRedYellowGreenDefinition (durations in s)
+Phase = namedtuple("Phase", ["duration", "state"])
+Logic = namedtuple("Logic", ["programID", "type", "currentPhaseIndex",
+                             "phases"])
+
+
+class MockTraCIConnection:
+    def __init__(self, scenario, time_step):
+        """
+        Creates a mock connection whose initial state matches the routes file
+        generated for the scenario: all vehicles depart at the first
+        simulation step with the starting positions, lanes, and speeds
+        specified by the scenario.
+
+        Parameters
+        ----------
+        scenario: Scenario type
+            see flow/scenarios/base_scenario.py
+        time_step: float
+            seconds per simulation step
+        """
+        self.vehicle = _VehicleDomain(self)
+        self.junction = _JunctionDomain(self)
+        self.simulation = _SimulationDomain(self)
+        self.lane = _LaneDomain(self)
+        self.trafficlights = _TrafficLightDomain(self)
+
+        self.scenario = scenario
+        self.time_step = time_step
+        self.length = scenario.length
+        self.time = 0  # current simulation time (in ms)
+
+        lanes = getattr(scenario, "lanes", 1)
+        self.num_lanes = max(lanes.values()) if isinstance(lanes, dict) \
+            else lanes
+
+        # lengths of the edges in the network, from their starting positions
+        edges, starts = zip(*scenario.total_edgestarts)
+        ends = list(starts[1:]) + [self.length]
+        self.edge_lengths = dict(
+            (edge, end - start) for edge, start, end in zip(edges, starts, ends))
+
+        # edges of every route, and first edge of every route (keyed by route
+        # id)
+        self.route_edges = dict(
+            ("route%s" % edge, route)
+            for edge, route in scenario.generator.rts.items())
+        self.route_starts = dict(
+            (route_id, route[0])
+            for route_id, route in self.route_edges.items())
+
+        # ids of vehicles in the network, and their index in the state arrays
+        self.ids = []
+        self.ids_index = dict()
+        self.x = np.zeros(0)
+        self.lane_index = np.zeros(0, dtype=int)
+        self.speed = np.zeros(0)
+        self.veh_length = np.zeros(0)
+        self.max_speed = np.zeros(0)
+        self.routes = dict()
+        self.types = dict()
+
+        # maximum speeds set by the user (key = vehicle id). These may be set
+        # before a vehicle is inserted in the network
+        self.max_speeds = dict()
+
+        # commands applied during the next simulation step
+        self.requested_speeds = dict()
+        self.requested_lanes = dict()
+
+        # vehicles to be inserted during the next simulation step, as tuples
+        # (veh_id, type_id, route_id, edge, lane, pos, speed)
+        self.pending = []
+
+        # ids of the vehicles inserted and removed during the last simulation
+        # step, and of the vehicles removed since then
+        self.departed = []
+        self.arrived = []
+        self.removed = []
+
+        # subscribed variables (key = vehicle id) and leader subscription
+        # distances (key = vehicle id)
+        self.subscriptions = OrderedDict()
+        self.leader_subscriptions = dict()
+
+        # variables subscribed by context subscriptions (key = junction id)
+        self.context_subscriptions = dict()
+
+        # subscribed variables (key = lane id)
+        self.lane_subscriptions = OrderedDict()
+
+        # subscribed variables of the simulation
+        self.simulation_subscriptions = []
+
+        # traffic lights added with add_traffic_light (key = traffic light
+        # id), and their subscribed variables (key = traffic light id)
+        self.traffic_lights = dict()
+        self.tls_subscriptions = OrderedDict()
+
+        # snapshots of the simulation saved with simulation.saveState (key =
+        # file name). The mock keeps them in memory instead of writing them
+        self.saved_states = dict()
+
+        # leader data and edges of the current step, computed when needed
+        self._leaders = None
+        self._edges = None
+
+        vehicles = scenario.vehicles
+        initial_config = scenario.initial_config
+        for i, veh_id in enumerate(scenario.generator.vehicle_ids):
+            edge, pos = initial_config.positions[i]
+            self.pending.append(
+                (veh_id, vehicles.get_state(veh_id, "type"), "route" + edge,
+                 edge, int(initial_config.lanes[i]), float(pos),
+                 float(vehicles.get_initial_speed(veh_id))))
+
+    def simulationStep(self, step=0):
+        """
+        Advances the simulation by one time step.
+        """
+        dt = self.time_step
+
+        # perform requested lane changes
+        for veh_id, lane in self.requested_lanes.items():
+            if veh_id in self.ids_index:
+                self.lane_index[self.ids_index[veh_id]] = \
+                    min(max(lane, 0), self.num_lanes - 1)
+        self._leaders = None
+
+        # perform requested speed changes, and cap speeds so that vehicles do
+        # not pass their leaders
+        for veh_id, speed in self.requested_speeds.items():
+            if veh_id in self.ids_index:
+                self.speed[self.ids_index[veh_id]] = speed
+        leader, headway = self.get_leaders()
+        safe_speed = np.where(leader >= 0, np.maximum(headway, 0) / dt, np.inf)
+        self.speed = np.minimum(np.clip(self.speed, 0, self.max_speed),
+                                safe_speed)
+
+        self.x = np.mod(self.x + self.speed * dt, self.length)
+
+        self.requested_speeds.clear()
+        self.requested_lanes.clear()
+
+        # insert pending vehicles
+        for veh_id, type_id, route_id, edge, lane, pos, speed in self.pending:
+            self._insert(veh_id, type_id, route_id,
+                         self.scenario.get_x(edge, pos), lane, speed)
+        self.departed = [veh[0] for veh in self.pending]
+        self.pending = []
+        self.arrived = self.removed
+        self.removed = []
+
+        self.time += int(round(1000 * dt))
+
+        # switch the phases of traffic lights
+        for tls in self.traffic_lights.values():
+            while tls["next_switch"] <= self.time:
+                tls["phase"] = (tls["phase"] + 1) % len(tls["phases"])
+                tls["next_switch"] += \
+                    int(round(1000 * tls["phases"][tls["phase"]].duration))
+        self._leaders = None
+        self._edges = None
+
+    def close(self, wait=True):
+        pass
+
+    def save_state(self, filename):
+        """
+        Stores a snapshot of the state of all vehicles and of the simulation
+        time.
+        """
+        self.saved_states[filename] = (
+            list(self.ids), self.x.copy(), self.lane_index.copy(),
+            self.speed.copy(), self.veh_length.copy(), self.max_speed.copy(),
+            dict(self.routes), dict(self.types), dict(self.max_speeds),
+            list(self.pending), self.time,
+            dict((tls_id, dict(tls))
+                 for tls_id, tls in self.traffic_lights.items()))
+
+    def load_state(self, filename):
+        """
+        Restores a snapshot stored by save_state. Commands that were requested
+        but not yet applied are discarded.
+        """
+        ids, x, lane_index, speed, veh_length, max_speed, routes, types, \
+            max_speeds, pending, time, traffic_lights = \
+            self.saved_states[filename]
+        self.ids = list(ids)
+        self.ids_index = dict((v, i) for i, v in enumerate(self.ids))
+        self.x = x.copy()
+        self.lane_index = lane_index.copy()
+        self.speed = speed.copy()
+        self.veh_length = veh_length.copy()
+        self.max_speed = max_speed.copy()
+        self.routes = dict(routes)
+        self.types = dict(types)
+        self.max_speeds = dict(max_speeds)
+        self.pending = list(pending)
+        self.time = time
+        self.traffic_lights = dict(
+            (tls_id, dict(tls)) for tls_id, tls in traffic_lights.items())
+        self.requested_speeds.clear()
+        self.requested_lanes.clear()
+        self.departed = []
+        self.arrived = []
+        self.removed = []
+        self._leaders = None
+        self._edges = None
+
+    def add_traffic_light(self, tls_id, controlled_lanes, phases):
+        """
+        Adds a traffic light to the network, which starts the first phase of
+        its program. The networks of the mock do not contain traffic lights
+        otherwise.
+
+        Parameters
+        ----------
+        tls_id: str
+            id of the traffic light
+        controlled_lanes: list of str
+            lane controlled by each link (signal index) of the traffic light
+        phases: list of tuple
+            durations (in s) and red-yellow-green states of the phases of the
+            program of the traffic light
+        """
+        phases = [Phase(float(duration), state) for duration, state in phases]
+
+        # the time of the next switch is kept in ms, as the simulation time,
+        # and reported in s (see _TrafficLightDomain.getNextSwitch)
+        self.traffic_lights[tls_id] = {
+            "program": "0", "phases": phases,
+            "controlled_lanes": list(controlled_lanes), "phase": 0,
+            "next_switch": self.time + int(round(1000 * phases[0].duration))}
+
+    def get_leaders(self):
+        """
+        Returns the index of the leader of every vehicle (or -1 if a vehicle
+        is alone in its lane) and the gap between the vehicle and its leader.
+        """
+        if self._leaders is None:
+            self._leaders = get_loop_leaders(
+                self.x, self.lane_index, self.veh_length, self.length)
+        return self._leaders
+
+    def get_edges(self):
+        """
+        Returns the edge and relative position of every vehicle.
+        """
+        if self._edges is None:
+            self._edges = list(zip(*self.scenario.get_edge_array(self.x)))
+        return self._edges
+
+    def _insert(self, veh_id, type_id, route_id, x, lane, speed):
+        self.ids_index[veh_id] = len(self.ids)
+        self.ids.append(veh_id)
+        self.x = np.append(self.x, np.mod(x, self.length))
+        self.lane_index = np.append(self.lane_index, lane)
+        self.speed = np.append(self.speed, speed)
+        self.veh_length = np.append(self.veh_length, DEFAULT_LENGTH)
+        self.max_speed = np.append(
+            self.max_speed, self.max_speeds.get(veh_id, DEFAULT_MAX_SPEED))
+        self.routes[veh_id] = route_id
+        self.types[veh_id] = type_id
+        self._leaders = None
+        self._edges = None
+
+    def _remove(self, veh_id):
+        if veh_id not in self.ids_index:
+            # the vehicle may not have been inserted yet
+            pending = [veh[0] for veh in self.pending]
+            del self.pending[pending.index(veh_id)]
+            return
+
+        indx = self.ids_index[veh_id]
+        keep = np.arange(len(self.ids)) != indx
+        del self.ids[indx]
+        self.ids_index = dict((v, i) for i, v in enumerate(self.ids))
+        self.x = self.x[keep]
+        self.lane_index = self.lane_index[keep]
+        self.speed = self.speed[keep]
+        self.veh_length = self.veh_length[keep]
+        self.max_speed = self.max_speed[keep]
+        self.max_speeds.pop(veh_id, None)
+        del self.routes[veh_id]
+        del self.types[veh_id]
+        self.subscriptions.pop(veh_id, None)
+        self.leader_subscriptions.pop(veh_id, None)
+        self.removed.append(veh_id)
+        self._leaders = None
+        self._edges = None
+
+
+class _VehicleDomain:
+    """
+    Mock of the traci.vehicle domain.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+
+    def _index(self, vehID):
+        return self._connection.ids_index[vehID]
+
+    def getIDList(self):
+        return list(self._connection.ids)
+
+    def getRoadID(self, vehID):
+        return self._connection.get_edges()[self._index(vehID)][0]
+
+    def getLanePosition(self, vehID):
+        return self._connection.get_edges()[self._index(vehID)][1]
+
+    def getLaneIndex(self, vehID):
+        return int(self._connection.lane_index[self._index(vehID)])
+
+    def getLaneID(self, vehID):
+        return "%s_%d" % (self.getRoadID(vehID), self.getLaneIndex(vehID))
+
+    def getSpeed(self, vehID):
+        return float(self._connection.speed[self._index(vehID)])
+
+    def getLength(self, vehID):
+        return float(self._connection.veh_length[self._index(vehID)])
+
+    def getPosition(self, vehID):
+        indx = self._index(vehID)
+        return (float(self._connection.x[indx]),
+                float(self._connection.lane_index[indx]))
+
+    def getRouteID(self, vehID):
+        return self._connection.routes[vehID]
+
+    def getTypeID(self, vehID):
+        return self._connection.types[vehID]
+
+    def getRoute(self, vehID):
+        return self._connection.route_edges[self._connection.routes[vehID]]
+
+    def getLeader(self, vehID, dist=0.):
+        leader, headway = self._connection.get_leaders()
+        indx = self._index(vehID)
+        if leader[indx] < 0 or headway[indx] > dist:
+            return None
+        return self._connection.ids[leader[indx]], float(headway[indx])
+
+    def subscribe(self, vehID, varIDs=(tc.VAR_ROAD_ID, tc.VAR_LANEPOSITION),
+                  begin=0, end=2**31 - 1):
+        self._connection.subscriptions.setdefault(vehID, [])
+        for var in varIDs:
+            if var not in self._connection.subscriptions[vehID]:
+                self._connection.subscriptions[vehID].append(var)
+
+    def subscribeLeader(self, vehID, dist=0., begin=0, end=2**31 - 1):
+        self._connection.subscriptions.setdefault(vehID, [])
+        self._connection.leader_subscriptions[vehID] = dist
+
+    def get_variables(self, veh_id, var_ids):
+        """
+        Returns the values of the requested variables of a vehicle, keyed by
+        variable id.
+        """
+        getters = {tc.VAR_ROAD_ID: self.getRoadID,
+                   tc.VAR_LANEPOSITION: self.getLanePosition,
+                   tc.VAR_LANE_INDEX: self.getLaneIndex,
+                   tc.VAR_LANE_ID: self.getLaneID,
+                   tc.VAR_SPEED: self.getSpeed,
+                   tc.VAR_ROUTE_ID: self.getRouteID}
+        return dict((var, getters[var](veh_id)) for var in var_ids)
+
+    def getSubscriptionResults(self, vehID=None):
+        results = dict()
+        for sub_id, var_ids in self._connection.subscriptions.items():
+            if sub_id not in self._connection.ids_index:
+                continue
+            results[sub_id] = self.get_variables(sub_id, var_ids)
+            if sub_id in self._connection.leader_subscriptions:
+                results[sub_id][tc.VAR_LEADER] = self.getLeader(
+                    sub_id, self._connection.leader_subscriptions[sub_id])
+
+        if vehID is None:
+            return results
+        return results.get(vehID)
+
+    def slowDown(self, vehID, speed, duration):
+        self._connection.requested_speeds[vehID] = speed
+
+    def setSpeed(self, vehID, speed):
+        self._connection.requested_speeds[vehID] = speed
+
+    def changeLane(self, vehID, laneIndex, duration):
+        self._connection.requested_lanes[vehID] = laneIndex
+
+    def setRoute(self, vehID, edgeList):
+        self._connection.routes[vehID] = edgeList
+
+    def setMaxSpeed(self, vehID, speed):
+        self._connection.max_speeds[vehID] = speed
+        if vehID in self._connection.ids_index:
+            self._connection.max_speed[self._index(vehID)] = speed
+
+    def setColor(self, vehID, color):
+        pass
+
+    def setSpeedMode(self, vehID, sm):
+        pass
+
+    def setLaneChangeMode(self, vehID, lcm):
+        pass
+
+    def remove(self, vehID, reason=tc.REMOVE_VAPORIZED):
+        self._connection._remove(vehID)
+
+    def addFull(self, vehID, routeID, typeID="DEFAULT_VEHTYPE", depart=None,
+                departLane="first", departPos="base", departSpeed="0",
+                **kwargs):
+        edge = self._connection.route_starts[routeID]
+        lane = 0 if departLane == "first" else int(departLane)
+        pos = 0. if departPos == "base" else float(departPos)
+        self._connection.pending.append(
+            (vehID, typeID, routeID, edge, lane, pos, float(departSpeed)))
+
+
+class _JunctionDomain:
+    """
+    Mock of the traci.junction domain. The network contains a single junction,
+    whose context subscriptions cover all vehicles in the network.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+
+    def getIDList(self):
+        return [JUNCTION_ID]
+
+    def subscribeContext(self, objectID, domain, dist, varIDs=(),
+                         begin=0, end=2**31 - 1):
+        if domain != tc.CMD_GET_VEHICLE_VARIABLE:
+            raise ValueError("The mock only supports context subscriptions "
+                             "to vehicle variables.")
+        self._connection.context_subscriptions[objectID] = list(varIDs)
+
+    def getContextSubscriptionResults(self, objectID=None):
+        var_ids = self._connection.context_subscriptions.get(objectID)
+        if var_ids is None or not self._connection.ids:
+            return None
+        return dict(
+            (veh_id, self._connection.vehicle.get_variables(veh_id, var_ids))
+            for veh_id in self._connection.ids)
+
+
+class _SimulationDomain:
+    """
+    Mock of the traci.simulation domain.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+
+    def getCurrentTime(self):
+        return self._connection.time
+
+    def getStartingTeleportNumber(self):
+        # vehicles never collide, and are consequently never teleported
+        return 0
+
+    def getEndingTeleportNumber(self):
+        return 0
+
+    def getMinExpectedNumber(self):
+        return len(self._connection.ids) + len(self._connection.pending)
+
+    def getDepartedIDList(self):
+        return list(self._connection.departed)
+
+    def getArrivedIDList(self):
+        return list(self._connection.arrived)
+
+    def subscribe(self, varIDs=(tc.VAR_DEPARTED_VEHICLES_IDS,), begin=0,
+                  end=2**31 - 1):
+        if any(var not in (tc.VAR_TIME_STEP, tc.VAR_DEPARTED_VEHICLES_IDS,
+                           tc.VAR_ARRIVED_VEHICLES_IDS) for var in varIDs):
+            raise ValueError("The mock only supports simulation subscriptions "
+                             "to the time and to the ids of departed and "
+                             "arrived vehicles.")
+        self._connection.simulation_subscriptions = list(varIDs)
+
+    def getSubscriptionResults(self):
+        results = dict()
+        for var in self._connection.simulation_subscriptions:
+            if var == tc.VAR_TIME_STEP:
+                results[var] = self.getCurrentTime()
+            elif var == tc.VAR_DEPARTED_VEHICLES_IDS:
+                results[var] = self.getDepartedIDList()
+            else:
+                results[var] = self.getArrivedIDList()
+        return results
+
+    def saveState(self, fileName):
+        self._connection.save_state(fileName)
+
+    def loadState(self, fileName):
+        self._connection.load_state(fileName)
+
+
+class _LaneDomain:
+    """
+    Mock of the traci.lane domain. Lane ids are of the form "edge_index".
+    """
+    def __init__(self, connection):
+        self._connection = connection
+
+    def getLength(self, lane_id):
+        return self._connection.edge_lengths[lane_id.rsplit("_", 1)[0]]
+
+    def getLastStepVehicleIDs(self, lane_id):
+        edge, lane = lane_id.rsplit("_", 1)
+        edges = self._connection.get_edges()
+        return [veh_id for i, veh_id in enumerate(self._connection.ids)
+                if edges[i][0] == edge
+                and self._connection.lane_index[i] == int(lane)]
+
+    def subscribe(self, lane_id, varIDs=(tc.LAST_STEP_VEHICLE_ID_LIST,),
+                  begin=0, end=2**31 - 1):
+        if any(var != tc.LAST_STEP_VEHICLE_ID_LIST for var in varIDs):
+            raise ValueError("The mock only supports lane subscriptions to "
+                             "the ids of the vehicles in the lane.")
+        self._connection.lane_subscriptions[lane_id] = list(varIDs)
+
+    def getSubscriptionResults(self, laneID=None):
+        subscriptions = self._connection.lane_subscriptions
+        results = dict(
+            (lane_id, dict((var, self.getLastStepVehicleIDs(lane_id))
+                           for var in var_ids))
+            for lane_id, var_ids in subscriptions.items())
+
+        if laneID is None:
+            return results
+        return results.get(laneID)
+
+
+class _TrafficLightDomain:
+    """
+    Mock of the traci.trafficlights domain, for the traffic lights added with
+    MockTraCIConnection.add_traffic_light.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+
+    def getIDList(self):
+        return list(self._connection.traffic_lights.keys())
+
+    def getRedYellowGreenState(self, tlsID):
+        tls = self._connection.traffic_lights[tlsID]
+        return tls["phases"][tls["phase"]].state
+
+    def getPhase(self, tlsID):
+        return self._connection.traffic_lights[tlsID]["phase"]
+
+    def getNextSwitch(self, tlsID):
+        # as in sumo 1.0 and later, whose phase durations are also in s
+        return self._connection.traffic_lights[tlsID]["next_switch"] / 1000
+
+    def getProgram(self, tlsID):
+        return self._connection.traffic_lights[tlsID]["program"]
+
+    def getControlledLanes(self, tlsID):
+        return list(self._connection.traffic_lights[tlsID]["controlled_lanes"])
+
+    def getCompleteRedYellowGreenDefinition(self, tlsID):
+        tls = self._connection.traffic_lights[tlsID]
+        return [Logic(tls["program"], 0, tls["phase"], list(tls["phases"]))]
+
+    def setRedYellowGreenState(self, tlsID, state):
+        # as in sumo, the traffic light switches to a program of a single
+        # phase, which lasts until the state is set again
+        tls = self._connection.traffic_lights[tlsID]
+        tls["program"] = "online"
+        tls["phases"] = [Phase(1e6, state)]
+        tls["phase"] = 0
+        tls["next_switch"] = self._connection.time + int(1e9)
+
+    def setPhaseDuration(self, tlsID, phaseDuration):
+        self._connection.traffic_lights[tlsID]["next_switch"] = \
+            self._connection.time + int(round(1000 * phaseDuration))
+
+    def subscribe(self, tlsID, varIDs=(tc.TL_CURRENT_PHASE,), begin=0,
+                  end=2**31 - 1):
+        self._connection.tls_subscriptions[tlsID] = list(varIDs)
+
+    def getSubscriptionResults(self, tlsID=None):
+        getters = {tc.TL_RED_YELLOW_GREEN_STATE: self.getRedYellowGreenState,
+                   tc.TL_CURRENT_PHASE: self.getPhase,
+                   tc.TL_NEXT_SWITCH: self.getNextSwitch}
+        results = dict(
+            (tls_id, dict((var, getters[var](tls_id)) for var in var_ids))
+            for tls_id, var_ids in self._connection.tls_subscriptions.items())
+
+        if tlsID is None:
+            return results
+        return results.get(tlsID)
@@ -1,9 +1,13 @@
 """
 This script contains of series of reward functions that can be used to train autonomous vehicles
+
+The rewards of all agents are computed at once, by stacking the states of the
+agents and applying the kernels of flow/core/rewards.py along their last axis.
 """
 
 import numpy as np
-import pdb
+
+from flow.core import rewards
 
 
 def desired_velocity(state=None, actions=None, **kwargs):
@@ -20,64 +24,84 @@ def desired_velocity(state=None, actions=None, **kwargs):
 
     Note: state[0] MUST BE VELOCITY
     """
-    rewards = []
-    # Net effect of this will be duplicating a bunch of the rewards
-    for i in range(len(state)):
-        veh_state = correct_state_space(state[i])
-        num_vehicles = len(veh_state)
-        vel = veh_state[:,0]
-
-        if any(vel < -100) or kwargs["fail"]:
-            rewards.append(0.0)
-            continue
+    if kwargs["fail"] or len(state) == 0:
+        return [0.0] * len(state)
 
-        max_cost = np.array([kwargs["target_velocity"]] * num_vehicles)
-        max_cost = np.linalg.norm(max_cost)
+    return per_agent(rewards.velocity_reward, agent_speeds(state),
+                     kwargs["target_velocity"])
 
-        cost = vel - kwargs["target_velocity"]
-        cost = np.linalg.norm(cost)
-
-        rewards.append(max(max_cost - cost, 0))
-    return rewards
 
 def min_delay(state=None, actions=None, **kwargs):
     """
-    A reward function used to encourage minimization of total delay in the 
-    system. Distance travelled is used as a scaled value of delay. 
-    
+    A reward function used to encourage minimization of total delay in the
+    system. Distance travelled is used as a scaled value of delay.
+
     This function measures the deviation of a system of vehicles
     from all the vehicles smoothly travelling at a fixed speed to their destinations.
 
     Note: state[0] MUST BE VELOCITY
     """
-    rewards = []
-    for i in range(len(state)):
-        veh_state = correct_state_space(state[i])
-        vel = veh_state[:,0]
-
-        if any(vel < -100) or kwargs["fail"]:
-            rewards.append(0.0)
-            continue
+    if kwargs["fail"] or len(state) == 0:
+        return [0.0] * len(state)
 
-        v_top = kwargs["target_velocity"]
-        time_step = kwargs["time_step"]
+    return per_agent(rewards.delay_reward, agent_speeds(state),
+                     kwargs["target_velocity"], kwargs["time_step"])
 
-        max_cost = time_step*sum(vel.shape)
-        cost = time_step*sum((v_top - vel)/v_top)
 
-        rewards.append(max(max_cost - cost, 0))
-    return rewards
+def distance_traveled(state=None, actions=None, **kwargs):
+    """
+    A reward function used to encourage vehicles to travel as far as possible,
+    measured as the total distance traveled by the vehicles observed by each
+    agent during the last step.
 
+    Note: state[0] MUST BE VELOCITY
+    """
+    if kwargs["fail"] or len(state) == 0:
+        return [0.0] * len(state)
 
-def distance_traveled(state=None, actions=None, **kwargs):
-    # TODO
-    pass
+    return per_agent(rewards.distance_reward, agent_speeds(state),
+                     kwargs["time_step"])
 
 
 def emission(state=None, actions=None, **kwargs):
-    # TODO
-    pass
+    """
+    A reward function used to encourage the minimization of emissions, as a
+    penalty on the total emissions of the vehicles during the last step,
+    shared by all agents.
 
-# TODO(Eugene): this is unnecessary now, remove this
-def correct_state_space(state):
-    return np.asarray(state).T
\ No newline at end of file
+    The emission rates of the vehicles (e.g. their CO2 emissions, as reported
+    by sumo) are not part of the state, and must be provided under "emissions"
+    in kwargs.
+    """
+    if kwargs["fail"] or len(state) == 0:
+        return [0.0] * len(state)
+
+    penalty = rewards.emission_penalty(kwargs["emissions"],
+                                       kwargs["time_step"])
+    return [float(penalty)] * len(state)
+
+
+def agent_speeds(state):
+    """
+    Stacks the speeds of the vehicles in the states of all agents, as an array
+    of shape (num_agents, num_vehicles). No copy is made if the states are
+    already stacked in an array.
+
+    Note: state[i][0] MUST BE VELOCITY
+    """
+    return np.asarray(state, dtype=float)[:, 0]
+
+
+def per_agent(kernel, values, *args):
+    """
+    Applies a reward kernel (see flow/core/rewards.py) to the values of each
+    agent, and returns the list of the rewards of the agents.
+
+    If all agents share the same values (i.e. values is a broadcast view of
+    the values of a single agent, see SimpleMultiAgentAccelerationEnvironment
+    .get_state), the reward is only computed once.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.strides[0] == 0:
+        return [float(kernel(values[0], *args))] * len(values)
+    return np.asarray(kernel(values, *args), dtype=float).tolist()
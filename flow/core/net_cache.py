@@ -0,0 +1,213 @@
+"""
+Content-addressed cache of the network (.net.xml) files produced by netconvert.
+
+Networks are identified by a hash of the inputs given to netconvert (the
+contents of the node, edge, type, and connection files, and the netconvert
+options), so that identical networks generated by different scenarios or
+processes are only converted once. The cache directory may be shared by
+several processes:
+ - files are added to the cache by renaming complete files into place, so
+   that a partially written network is never read
+ - the generation of a network is guarded by a lock file, so that processes
+   requesting the same missing network wait for the first one to generate it,
+   instead of all calling netconvert
+ - the least recently used networks are removed once the cache exceeds its
+   maximum number of networks, along with their lock files. Lock files are
+   removed while holding the lock, and processes that were waiting on a
+   removed lock file lock the new file instead
+"""
+import contextlib
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+from flow.core.util import ensure_dir
+
+try:
+    import fcntl
+except ImportError:
+    # file locks are not available on this platform; concurrent processes
+    # may then generate the same network more than once
+    fcntl = None
+
+
+class NetCache:
+
+    def __init__(self, cache_dir, max_size=32):
+        """
+        Cache of network files stored in a directory.
+
+        Attributes
+        ----------
+        cache_dir: str
+            directory containing the cached networks
+        max_size: int, optional
+            maximum number of networks kept in the cache; defaults to 32
+        """
+        self.cache_dir = ensure_dir(cache_dir)
+        self.max_size = max_size
+
+    @staticmethod
+    def key(*contents):
+        """
+        Returns the key of a network, given the inputs used to generate it.
+
+        Parameters
+        ----------
+        contents: bytes or str
+            contents of the input files and options of netconvert, in a fixed
+            order
+
+        Returns
+        -------
+        str
+            hexadecimal digest of the inputs
+        """
+        digest = hashlib.sha1()
+        for content in contents:
+            if not isinstance(content, bytes):
+                content = str(content).encode("utf-8")
+            # the length of each input is included, so that different splits
+            # of the same bytes do not collide
+            digest.update(str(len(content)).encode("utf-8") + b":")
+            digest.update(content)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".net.xml")
+
+    def _lock_path(self, key):
+        return os.path.join(self.cache_dir, key + ".lock")
+
+    def fetch(self, key, dest):
+        """
+        Copies the network with the given key to dest, if it is in the cache.
+
+        Returns
+        -------
+        bool
+            True if the network was found in the cache
+        """
+        path = self._path(key)
+        try:
+            self._copy(path, dest)
+        except (IOError, OSError):
+            return False
+
+        # mark the network as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        logging.debug(" Reusing cached network %s", path)
+        return True
+
+    def store(self, key, src):
+        """
+        Adds the network file src to the cache, and evicts the least recently
+        used networks if the cache is full.
+        """
+        self._copy(src, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used networks in excess of max_size, and
+        their lock files (unless the network is being generated by another
+        process).
+        """
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".net.xml"):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                # removed by another process
+                pass
+
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_size)]:
+            key = os.path.basename(path)[:-len(".net.xml")]
+            with self.lock(key, blocking=False) as locked:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                if locked:
+                    try:
+                        os.remove(self._lock_path(key))
+                    except OSError:
+                        pass
+
+    @contextlib.contextmanager
+    def lock(self, key, blocking=True):
+        """
+        Context manager holding an exclusive lock on a network of the cache,
+        shared by all processes using the cache directory.
+
+        Parameters
+        ----------
+        key: str
+            key of the network
+        blocking: bool, optional
+            whether to wait for the lock if it is held by another process (or
+            by another lock of this process); otherwise, the context is
+            entered without the lock
+
+        Yields
+        ------
+        bool
+            True if the lock is held
+        """
+        if fcntl is None:
+            yield False
+            return
+
+        path = self._lock_path(key)
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        while True:
+            f = open(path, "a")
+            try:
+                fcntl.flock(f, flags)
+            except (IOError, OSError):
+                f.close()
+                f = None
+                break
+
+            # the lock file may have been removed by evict while waiting for
+            # the lock, in which case the new file is locked instead
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                    break
+            except OSError:
+                pass
+            f.close()
+
+        if f is None:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+    @staticmethod
+    def _copy(src, dest):
+        # copy to a temporary file in the destination directory, which is then
+        # atomically renamed into place
+        dest_dir = os.path.dirname(os.path.abspath(dest))
+        fd, tmp = tempfile.mkstemp(dir=dest_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dest)
+        except BaseException:
+            os.remove(tmp)
+            raise
@@ -0,0 +1,132 @@
+"""
+Ordering of the vehicles by position, maintained from one step to the next.
+
+Environments sort their vehicles by position at every step (see
+SumoEnvironment.sort_by_position). Vehicles move very little during a step,
+and rarely overtake each other, so the order of the previous step is almost
+always still sorted, or nearly so. The IncrementalOrdering accordingly keeps
+the permutation sorting the vehicles, checks whether it still sorts the new
+positions (in linear time), and only repairs it with a stable sort of the
+nearly sorted positions otherwise, instead of sorting from scratch.
+"""
+import numpy as np
+
+
+class IncrementalOrdering:
+
+    def __init__(self, ids):
+        """
+        Maintains the order of a set of vehicles, which may change with
+        reindex.
+
+        Attributes
+        ----------
+        ids: numpy ndarray of str
+            ids of the vehicles, in the order of the keys given to update
+        index: numpy ndarray of int
+            permutation of all vehicles sorting their keys, or None before the
+            first update
+        sorted_index: numpy ndarray of int
+            indices of the sorted vehicles, excluding the vehicles with a
+            negative group
+        num_sorts: int
+            number of times the order was not sorted anymore, and was repaired
+        """
+        self.ids = np.array(ids, dtype=object)
+        self.index = None
+        self.sorted_index = np.zeros(0, dtype=int)
+        self.num_sorts = 0
+
+    def reset(self):
+        """
+        Forgets the current order, so that the next update sorts the vehicles
+        from scratch.
+        """
+        self.index = None
+
+    def reindex(self, ids, new_index):
+        """
+        Follows the vehicles after vehicles entered or left the network. The
+        remaining vehicles keep their order, and the vehicles that entered
+        are placed after them, so that the next update only repairs the
+        order locally.
+
+        Parameters
+        ----------
+        ids: list of str
+            ids of the vehicles in the network
+        new_index: numpy array of int
+            new index (in ids) of every vehicle previously in the ordering, or
+            -1 if it left the network. Vehicles of ids that are not the new
+            index of a previous vehicle entered the network
+        """
+        self.ids = np.array(ids, dtype=object)
+        if self.index is None:
+            return
+
+        index = new_index[self.index]
+        index = index[index >= 0]
+        entered = np.ones(len(ids), dtype=bool)
+        entered[index] = False
+        self.index = np.concatenate((index, np.flatnonzero(entered)))
+
+    def update(self, keys, groups=None):
+        """
+        Sorts the vehicles by key, or by group and then by key, starting from
+        the order of the previous update. Ties are kept in their previous
+        order.
+
+        Parameters
+        ----------
+        keys: numpy array of float
+            sorting key (e.g. position) of each vehicle
+        groups: numpy array of int, optional
+            group (e.g. section of the network) of each vehicle. Vehicles are
+            sorted by increasing group first, and vehicles with a negative
+            group are excluded from sorted_index
+
+        Returns
+        -------
+        numpy ndarray of int
+            see sorted_index
+        """
+        keys = np.asarray(keys, dtype=float)
+        groups = None if groups is None else np.asarray(groups, dtype=int)
+
+        if self.index is None or len(self.index) != len(keys):
+            self.index = np.arange(len(keys))
+            self._repair(keys, groups)
+        elif not self._is_sorted(keys, groups):
+            self._repair(keys, groups)
+
+        if groups is None:
+            self.sorted_index = self.index
+        else:
+            self.sorted_index = self.index[groups[self.index] >= 0]
+
+        return self.sorted_index
+
+    def get_sorted_ids(self):
+        """
+        Returns the ids of the vehicles in sorted_index, as an array.
+        """
+        return self.ids[self.sorted_index]
+
+    def _is_sorted(self, keys, groups):
+        sorted_keys = keys[self.index]
+        ordered = sorted_keys[1:] >= sorted_keys[:-1]
+        if groups is not None:
+            sorted_groups = groups[self.index]
+            ordered = (sorted_groups[1:] > sorted_groups[:-1]) | \
+                ((sorted_groups[1:] == sorted_groups[:-1]) & ordered)
+        return bool(np.all(ordered))
+
+    def _repair(self, keys, groups):
+        # the stable sort of nearly sorted data performs few comparisons, and
+        # keeps vehicles with equal keys in their previous order
+        if groups is None:
+            order = np.argsort(keys[self.index], kind="mergesort")
+        else:
+            order = np.lexsort((keys[self.index], groups[self.index]))
+        self.index = self.index[order]
+        self.num_sorts += 1
@@ -10,7 +10,18 @@ class SumoParams():
                  human_speed_mode='no_collide',
                  rl_lane_change_mode="no_lat_collide",
                  human_lane_change_mode="no_lat_collide",
-                 sumo_binary="sumo"):
+                 sumo_binary="sumo",
+                 sim_backend="traci",
+                 subscription_mode=None,
+                 reset_mode="readd",
+                 pool_size=1,
+                 trajectory_path=None,
+                 trajectory_fields=None,
+                 trajectory_period=1,
+                 dynamic_vehicles=False,
+                 step_profile=False,
+                 step_profile_size=10000,
+                 step_trace_path=None):
         """
         Parameters used to pass the time step and sumo-specified safety
         modes, which constrain the dynamics of vehicles in the network to
@@ -62,6 +73,83 @@ class SumoParams():
             specifies whether to visualize the rollout(s). May be:
                 - 'sumo-gui' to run the experiment with the gui
                 - 'sumo' to run without the gui (default)
+        sim_backend: str, optional
+            simulation backend used by the environment. May be:
+                - 'traci' to run the experiment in sumo (default)
+                - 'traci_pool' to run the experiment in sumo processes that
+                  are launched ahead of time, and reused once the
+                  environment is terminated or restarted (see
+                  flow/core/sumo_pool.py)
+                - 'mock' to run the experiment in a pure-python stand-in for
+                  sumo, with simplified vehicle dynamics. Used for
+                  benchmarking and testing without sumo (see
+                  flow/core/mock_traci.py)
+        subscription_mode: str, optional
+            specifies how the states of vehicles are collected from sumo at
+            every step. May be:
+                - 'vehicle' to subscribe to the states and leaders of each
+                  vehicle individually (default, unless reset_mode is
+                  'state'). Note that these subscriptions are lost when a
+                  vehicle leaves the network
+                - 'context' to use a single context subscription that covers
+                  all vehicles in the network, including newly inserted ones.
+                  In this mode, the leader of a vehicle is the next vehicle in
+                  the same lane along the one-dimensional representation of
+                  the network (see Scenario.get_x). This mode is accordingly
+                  only supported in single ring roads (see
+                  Scenario.single_ring). It is required when reset_mode is
+                  'state', and is then the default
+        reset_mode: str, optional
+            specifies how vehicles are returned to their initial states upon
+            reset. May be:
+                - 'readd' to remove every vehicle from the network and add it
+                  back at its initial position (default)
+                - 'state' to save the state of the simulation at the start of
+                  the first rollout, and load it back upon reset (see sumo's
+                  simulation.saveState and simulation.loadState). This
+                  requires a constant number of messages to sumo, instead of
+                  several messages per vehicle, and requires context
+                  subscriptions (see subscription_mode). Since the leaders
+                  of vehicles are then computed from their positions, this
+                  mode is only supported in single ring roads (see
+                  Scenario.single_ring, e.g. LoopScenario). The 'readd' mode
+                  is used whenever vehicle_arrangement_shuffle or
+                  starting_position_shuffle are set
+        pool_size: int, optional
+            number of sumo processes launched ahead of time when using the
+            'traci_pool' simulation backend; defaults to 1
+        trajectory_path: str, optional
+            Path to the folder in which to record the trajectories of the
+            vehicles from within flow, one sub-folder of .npy files per
+            episode (see flow/core/trajectory.py). This is a faster
+            alternative to the emission output of sumo, which remains
+            available through emission_path. Trajectories are not recorded
+            if this value is not specified
+        trajectory_fields: list of str, optional
+            states of the vehicles to record in trajectory_path; defaults to
+            all the fields in flow.core.trajectory.FIELDS
+        trajectory_period: int, optional
+            number of steps in between two recorded steps; defaults to 1
+        dynamic_vehicles: bool, optional
+            determines if vehicles entering and leaving the network during a
+            rollout (e.g. from inflows, or upon reaching the end of their
+            routes) are added to and removed from the vehicles class, as
+            reported by sumo's lists of departed and arrived vehicles. Vehicles
+            of types that were not added to the vehicles class are controlled
+            by sumo. False by default, in which case the vehicles in the
+            network are the ones specified by the scenario
+        step_profile: bool, optional
+            determines if the time spent in every phase of the steps of the
+            environment is measured, and made available through
+            get_step_profile (see flow/core/profiler.py); False by default
+        step_profile_size: int, optional
+            number of steps whose timings are kept when profiling; defaults
+            to 10000
+        step_trace_path: str, optional
+            Path to the folder in which to write the timings of the steps of
+            every episode as a trace in the trace event format of Chrome.
+            Setting this value also profiles the steps. Traces are not
+            written if this value is not specified
         """
         self.port = port
         self.time_step = time_step
@@ -73,6 +161,20 @@ class SumoParams():
         self.rl_lane_change_mode = rl_lane_change_mode
         self.human_lane_change_mode = human_lane_change_mode
         self.sumo_binary = sumo_binary
+        self.sim_backend = sim_backend
+        if subscription_mode is None:
+            subscription_mode = "context" if reset_mode == "state" \
+                else "vehicle"
+        self.subscription_mode = subscription_mode
+        self.reset_mode = reset_mode
+        self.pool_size = pool_size
+        self.trajectory_path = trajectory_path
+        self.trajectory_fields = trajectory_fields
+        self.trajectory_period = trajectory_period
+        self.dynamic_vehicles = dynamic_vehicles
+        self.step_profile = step_profile
+        self.step_profile_size = step_profile_size
+        self.step_trace_path = step_trace_path
 
 
 class EnvParams:
@@ -84,7 +186,8 @@ class EnvParams:
                  shared_policy=False,
                  additional_params=None,
                  max_deacc=-6,
-                 max_acc=3):
+                 max_acc=3,
+                 batch_controllers=True):
         """
         Provides several environment and experiment-specific parameters. This
         includes specifying the parameters of the action space and relevant
@@ -108,6 +211,10 @@ class EnvParams:
         additional_params: dict, optional
             Specify additional environment params for a specific environment
             configuration
+        batch_controllers: bool, optional
+            compute the accelerations of all flow-controlled vehicles at once
+            (see flow/controllers/batch_controller.py) instead of calling the
+            get_action method of each controller; defaults to True
         """
         self.fail_safe = longitudinal_fail_safe
         self.max_speed = max_speed
@@ -117,6 +224,7 @@ class EnvParams:
         self.additional_params = additional_params
         self.max_deacc = max_deacc
         self.max_acc = max_acc
+        self.batch_controllers = batch_controllers
 
     def get_additional_param(self, key):
         return self.additional_params[key]
@@ -147,7 +255,9 @@ class NetParams:
                  no_internal_links=True,
                  lanes=1,
                  speed_limit=55,
-                 additional_params=None):
+                 additional_params=None,
+                 net_cache_dir=None,
+                 net_cache_size=32):
         """
         Network configuration parameters
 
@@ -171,6 +281,15 @@ class NetParams:
         additional_params: dict, optional
             network specific parameters; see each subclass for a description of
             what is needed
+        net_cache_dir: str, optional
+            directory of a cache of the networks generated by netconvert,
+            which may be shared by several processes. Networks whose node,
+            edge, type, and connection files match a cached network are copied
+            from the cache instead of being generated again (see
+            flow/core/net_cache.py). No cache is used by default
+        net_cache_size: int, optional
+            maximum number of networks kept in the cache, after which the
+            least recently used networks are removed; defaults to 32
         """
         self.net_path = net_path
         self.cfg_path = cfg_path
@@ -178,6 +297,8 @@ class NetParams:
         self.lanes = lanes
         self.speed_limit = speed_limit
         self.additional_params = additional_params
+        self.net_cache_dir = net_cache_dir
+        self.net_cache_size = net_cache_size
 
 
 class InitialConfig:
@@ -193,6 +314,7 @@ class InitialConfig:
                  distribution_length=None,
                  positions=None,
                  lanes=None,
+                 flows=False,
                  additional_params=None):
         """
         Parameters that affect the positioning of vehicle in the network at
@@ -224,6 +346,15 @@ class InitialConfig:
         lanes: list, optional
             used if the user would like to specify user-generated initial
             positions.
+        flows: bool, optional
+            specifies whether vehicles sharing their type, route, lane, speed,
+            and departure time are written to the routes file as a single
+            flow, which shrinks the file for homogeneous demand. Sumo inserts
+            the vehicles of a flow at free positions of the first edge of
+            their route, which must have room for all of them, rather than at
+            the positions generated by the scenario. These vehicles are
+            renamed in the Vehicles class with the ids sumo assigns them
+            ("<flow id>.<index>").
         additional_params: dict, optional
             some other network-specific params
         """
@@ -237,6 +368,7 @@ class InitialConfig:
         self.distribution_length = distribution_length
         self.positions = positions
         self.lanes = lanes
+        self.flows = flows
         if additional_params is None:
             self.additional_params = dict()
         else:
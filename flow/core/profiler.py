@@ -0,0 +1,193 @@
+"""
+Timings of the phases of the steps of an environment.
+
+The StepProfiler measures the time spent in each phase of
+SumoEnvironment._step (see PHASES), from the time elapsed between consecutive
+calls to lap. The timings of the last steps are kept in fixed-size arrays used
+as a ring buffer, from which percentiles of the duration of every phase are
+computed (see SumoEnvironment.get_step_profile). The steps of every episode may
+also be exported as a trace in the trace event format of Chrome, which can be
+opened in chrome://tracing or https://ui.perfetto.dev.
+
+Environments that are not profiled do not create a profiler, and only check
+that none is set at every phase.
+"""
+import json
+import os
+from collections import OrderedDict
+from time import perf_counter
+
+import numpy as np
+
+# phases of a step, in the order in which they are performed
+PHASES = ["controllers", "lane_changes", "routing", "rl_actions",
+          "additional_command", "simulation_step", "subscriptions",
+          "headways", "sort_by_position", "recording", "get_state",
+          "compute_reward"]
+
+
+class StepProfiler:
+
+    def __init__(self, capacity=10000, trace_path=None, name="profile"):
+        """
+        Collects the durations of the phases of the last steps of an
+        environment.
+
+        Attributes
+        ----------
+        capacity: int, optional
+            number of steps whose timings are kept
+        trace_path: str, optional
+            directory in which a trace of the steps of every episode is
+            written, in files named "<name>-step-trace-<episode>.json". Only
+            the last capacity steps of an episode are part of its trace. No
+            trace is written if this value is not specified
+        name: str, optional
+            name of the profiled experiment (e.g. the name of the scenario)
+        """
+        if capacity < 1:
+            raise ValueError("The capacity of the profiler must be a positive "
+                             "number of steps")
+
+        self.capacity = capacity
+        self.trace_path = trace_path
+        self.name = name
+        self.episode = 0
+        self.phase_index = dict(
+            (phase, i) for i, phase in enumerate(PHASES))
+
+        # duration of every phase at each of the last steps, and time from the
+        # start of the step to the start of the phase (nan if the phase was
+        # not performed), in s. The step number i is stored in row
+        # i % capacity
+        self.durations = np.zeros((capacity, len(PHASES)))
+        self.offsets = np.zeros((capacity, len(PHASES)))
+        self.step_starts = np.zeros(capacity)
+        self.step_durations = np.zeros(capacity)
+
+        # number of steps profiled so far, and before the current episode
+        self.num_steps = 0
+        self.episode_start = 0
+
+        # timings of the current step, copied to the arrays at its end
+        self._start = 0.
+        self._mark = 0.
+        self._durations = None
+        self._offsets = None
+
+    def start_step(self):
+        """
+        Starts timing a step.
+        """
+        self._start = self._mark = perf_counter()
+        self._durations = [0.] * len(PHASES)
+        self._offsets = [None] * len(PHASES)
+
+    def lap(self, phase):
+        """
+        Attributes the time elapsed since the last call to start_step or lap
+        to a phase of the current step.
+
+        Parameters
+        ----------
+        phase: str
+            one of PHASES
+        """
+        now = perf_counter()
+        i = self.phase_index[phase]
+        if self._offsets[i] is None:
+            self._offsets[i] = self._mark - self._start
+        self._durations[i] += now - self._mark
+        self._mark = now
+
+    def end_step(self):
+        """
+        Stores the timings of the current step in the ring buffer.
+        """
+        row = self.num_steps % self.capacity
+        self.step_durations[row] = perf_counter() - self._start
+        self.step_starts[row] = self._start
+        self.durations[row] = self._durations
+        self.offsets[row] = [np.nan if offset is None else offset
+                             for offset in self._offsets]
+        self.num_steps += 1
+
+    def get_profile(self, percentiles=(50, 90, 99)):
+        """
+        Returns percentiles of the durations of the phases of the last
+        profiled steps.
+
+        Parameters
+        ----------
+        percentiles: list of float, optional
+            percentiles to compute, between 0 and 100
+
+        Returns
+        -------
+        collections.OrderedDict
+            key = phase (see PHASES), or "step" for the entire step
+            value = numpy array of the percentiles of the durations of the
+            phase, in s. The dictionary is empty if no step was profiled
+        """
+        n = min(self.num_steps, self.capacity)
+        profile = OrderedDict()
+        if n == 0:
+            return profile
+
+        values = np.percentile(self.durations[:n], percentiles, axis=0)
+        for i, phase in enumerate(PHASES):
+            profile[phase] = values[:, i]
+        profile["step"] = np.percentile(self.step_durations[:n], percentiles)
+
+        return profile
+
+    def flush(self):
+        """
+        Writes the trace of the steps profiled since the last flush (if a
+        trace_path was specified), and starts a new episode.
+
+        Returns
+        -------
+        str
+            path of the trace, or None if no trace was written
+        """
+        first = max(self.episode_start, self.num_steps - self.capacity)
+        steps = np.arange(first, self.num_steps)
+        episode_start = self.episode_start
+        self.episode_start = self.num_steps
+
+        if len(steps) == 0:
+            return None
+        self.episode += 1
+        if self.trace_path is None:
+            return None
+
+        rows = steps % self.capacity
+        t0 = self.step_starts[rows[0]]
+        events = []
+        for step, row in zip(steps, rows):
+            start = self.step_starts[row] - t0
+            events.append(_event("step", start, self.step_durations[row],
+                                 step - episode_start))
+            for i, phase in enumerate(PHASES):
+                if not np.isnan(self.offsets[row, i]):
+                    events.append(_event(
+                        phase, start + self.offsets[row, i],
+                        self.durations[row, i], step - episode_start))
+
+        if not os.path.exists(self.trace_path):
+            os.makedirs(self.trace_path)
+        filename = os.path.join(
+            self.trace_path,
+            "%s-step-trace-%d.json" % (self.name, self.episode - 1))
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+        return filename
+
+
+def _event(name, start, duration, step):
+    """Returns a complete event of the trace event format (times in s)."""
+    return {"name": name, "cat": "step", "ph": "X", "pid": 0, "tid": 0,
+            "ts": 1e6 * float(start), "dur": 1e6 * float(duration),
+            "args": {"step": int(step)}}
@@ -1,5 +1,12 @@
 """
 This script contains of series of reward functions that can be used to train autonomous vehicles
+
+The reward functions taking an environment read the columnar states of the
+vehicles (see flow/core/vehicles.py), and compute the reward with one of the
+kernels below. Kernels take arrays of states, and compute a reward in a single
+numpy pass: for an array of shape (num_vehicles,), they return a scalar, and
+for an array of shape (num_agents, num_vehicles), they return the reward of
+each agent. Environments may accordingly compose them directly.
 """
 
 import numpy as np
@@ -21,79 +28,192 @@ def desired_velocity(env, fail=False):
            state of the system.
     :param fail {bool} - specifies if any crash or other failure occurred in the system
     """
-    vel = np.array(env.vehicles.get_speed())
-    num_vehicles = env.vehicles.num_vehicles
-
-    if any(vel < -100) or fail:
+    if fail:
         return 0.
 
-    max_cost = np.array([env.env_params.additional_params["target_velocity"]] * num_vehicles)
-    max_cost = np.linalg.norm(max_cost)
-
-    cost = vel - env.env_params.additional_params["target_velocity"]
-    cost = np.linalg.norm(cost)
-
-    return max(max_cost - cost, 0)
+    return velocity_reward(env.vehicles.get_speed(),
+                           env.env_params.additional_params["target_velocity"])
 
 
 def min_delay(state=None, actions=None, **kwargs):
     """
-    A reward function used to encourage minimization of total delay in the 
-    system. Distance travelled is used as a scaled value of delay. 
-    
+    A reward function used to encourage minimization of total delay in the
+    system. Distance travelled is used as a scaled value of delay.
+
     This function measures the deviation of a system of vehicles
     from all the vehicles smoothly travelling at a fixed speed to their destinations.
 
     Note: state[0] MUST BE VELOCITY
     """
+    if kwargs["fail"]:
+        return 0.
 
-    vel = state[0]
+    return delay_reward(state[0], kwargs["target_velocity"],
+                        kwargs["time_step"])
 
-    if any(vel < -100) or kwargs["fail"]:
-        return 0.
-    v_top = kwargs["target_velocity"]
-    time_step = kwargs["time_step"]
 
-    max_cost = time_step*sum(vel.shape)
-    cost = time_step*sum((v_top - vel)/v_top)
+def distance_traveled(env, fail=False):
+    """
+    A reward function used to encourage vehicles to travel as far as possible.
+
+    :param env {SumoEnvironment type} - the environment variable, which contains information on the current
+           state of the system.
+    :param fail {bool} - specifies if any crash or other failure occurred in the system
+    :return: the total distance traveled by all vehicles during the last step
+    """
+    if fail:
+        return 0.
 
-    return max(max_cost - cost, 0)
+    return distance_reward(env.vehicles.get_speed(), env.time_step)
 
 
 def punish_small_rl_headways(vehicles, rl_ids, headway_threshold, penalty_gain=1, penalty_exponent=1):
     """
     A reward function used to train rl vehicles to avoid small headways.
 
-    :param vehicles {dict} - contains the state of all vehicles in the network (generally self.vehicles)
+    :param vehicles {Vehicles type} - contains the state of all vehicles in the network (generally self.vehicles)
     :param rl_ids: {list} - list of ids for rl vehicles in the network (generally self.rl_ids)
     :param headway_threshold {float} - the maximum headway allowed for rl vehicles before being penalized
     :param penalty_gain {float} - sets the penalty for each rl vehicle between 0 and this value
     :param penalty_exponent {float} - used to allow exponential punishing of smaller headways
     :return: a (non-negative) penalty on rl vehicles whose headway is below the headway_threshold
     """
-    headway_penalty = 0
-    for veh_id in rl_ids:
-        if vehicles[veh_id]["headway"] < headway_threshold:
-            headway_penalty += (((headway_threshold - vehicles[veh_id]["headway"]) / headway_threshold)
-                                ** penalty_exponent) * penalty_gain
+    return headway_penalty(vehicles.get_headway(rl_ids), headway_threshold,
+                           penalty_gain, penalty_exponent)
 
-    # in order to keep headway penalty (and thus reward function) positive
-    max_headway_penalty = len(rl_ids) * penalty_gain
 
-    return max_headway_penalty - headway_penalty
+def punish_rl_lane_changes(vehicles, rl_ids, timer, penalty=1):
+    """
+    A reward function that minimizes lane changes by producing a penalty every time an rl vehicle performs one.
+
+    :param vehicles {Vehicles type} - contains the state of all vehicles in the network (generally self.vehicles)
+    :param rl_ids: {list} - list of ids for rl vehicles in the network (generally self.rl_ids)
+    :param timer {int} - current time step of the environment (generally self.timer)
+    :param penalty {float} - penalty imposed on the reward function every time a lane change is performed
+    :return: a (non-positive) penalty on the rl vehicles that changed lanes during the current step
+    """
+    return lane_change_penalty(vehicles.get_state(rl_ids, "last_lc"), timer,
+                               penalty)
 
 
-def punish_rl_lane_changes(vehicles, rl_ids, penalty=1):
+def velocity_reward(speeds, target_velocity):
     """
-    A reward function that minimizes lane changes by producing a penalty every time an rl vehicle performs one.
+    Kernel of desired_velocity: the norm of the deviation of the speeds from
+    the target velocity, subtracted from its value when all vehicles are
+    stopped, and bounded below by zero. The reward is zero whenever a speed is
+    invalid (below -100, as reported by sumo for vehicles that are not in the
+    network).
+
+    :param speeds {numpy array} - speeds of the vehicles, of shape (num_vehicles,) or (num_agents, num_vehicles)
+    :param target_velocity {float} - desired velocity of the vehicles
+    :return: the reward, or the reward of each agent
+    """
+    speeds = np.asarray(speeds, dtype=float)
+
+    # the norm of a vector of num_vehicles target velocities
+    max_cost = max_velocity_cost(target_velocity, speeds.shape[-1])
+    cost = np.linalg.norm(speeds - target_velocity, axis=-1)
+
+    reward = np.maximum(max_cost - cost, 0)
+    reward = np.where(np.any(speeds < -100, axis=-1), 0., reward)
+    return reward[()]
+
+
+def max_velocity_cost(target_velocity, num_vehicles):
+    """
+    Deviation of num_vehicles stopped vehicles from the target velocity, i.e.
+    the maximum cost in velocity_reward.
+    """
+    return abs(target_velocity) * np.sqrt(num_vehicles)
+
+
+def delay_reward(speeds, target_velocity, time_step):
+    """
+    Kernel of min_delay: the delay of the vehicles with respect to vehicles
+    travelling at the target velocity during a time step, subtracted from its
+    value when all vehicles are stopped, and bounded below by zero.
+
+    :param speeds {numpy array} - speeds of the vehicles, of shape (num_vehicles,) or (num_agents, num_vehicles)
+    :param target_velocity {float} - desired velocity of the vehicles
+    :param time_step {float} - duration of a time step
+    :return: the reward, or the reward of each agent
+    """
+    speeds = np.asarray(speeds, dtype=float)
+
+    max_cost = time_step * speeds.shape[-1]
+    cost = time_step * np.sum((target_velocity - speeds) / target_velocity,
+                              axis=-1)
+
+    reward = np.maximum(max_cost - cost, 0)
+    reward = np.where(np.any(speeds < -100, axis=-1), 0., reward)
+    return reward[()]
 
-    :param vehicles {dict} - contains the state of all vehicles in the network (generally self.vehicles)
-    :param penalty {float} - penalty imposed on the reward function every time a
-    :return:
+
+def distance_reward(speeds, time_step):
+    """
+    Kernel of distance_traveled: the total distance traveled by the vehicles
+    during a time step.
+
+    :param speeds {numpy array} - speeds of the vehicles, of shape (num_vehicles,) or (num_agents, num_vehicles)
+    :param time_step {float} - duration of a time step
+    :return: the reward, or the reward of each agent
     """
-    total_lane_change_penalty = 0
-    for veh_id in rl_ids:
-        if vehicles[veh_id]["last_lc"] == self.timer:  # FIXME
-            total_lane_change_penalty -= penalty
+    speeds = np.asarray(speeds, dtype=float)
+    return (time_step * np.sum(speeds, axis=-1))[()]
+
 
-    return total_lane_change_penalty
+def emission_penalty(emissions, time_step):
+    """
+    Kernel of emission rewards: the total emissions of the vehicles during a
+    time step, as a (non-positive) penalty.
+
+    :param emissions {numpy array} - emission rates of the vehicles (e.g. the CO2 emissions reported by sumo, in
+           mg/s), of shape (num_vehicles,) or (num_agents, num_vehicles)
+    :param time_step {float} - duration of a time step
+    :return: the penalty, or the penalty of each agent
+    """
+    emissions = np.asarray(emissions, dtype=float)
+    return (-time_step * np.sum(emissions, axis=-1))[()]
+
+
+def headway_penalty(headways, headway_threshold, penalty_gain=1,
+                    penalty_exponent=1):
+    """
+    Kernel of punish_small_rl_headways: a penalty growing as the headways fall
+    below the threshold, subtracted from its maximum value so that it remains
+    non-negative.
+
+    :param headways {numpy array} - headways of the penalized vehicles, of shape (num_vehicles,) or
+           (num_agents, num_vehicles)
+    :param headway_threshold {float} - the maximum headway allowed before being penalized
+    :param penalty_gain {float} - sets the penalty for each vehicle between 0 and this value
+    :param penalty_exponent {float} - used to allow exponential punishing of smaller headways
+    :return: the penalty, or the penalty of each agent
+    """
+    headways = np.asarray(headways, dtype=float)
+
+    small = headways < headway_threshold
+    shortfall = np.where(small, headway_threshold - headways, 0) / \
+        headway_threshold
+    penalty = penalty_gain * np.sum(
+        np.where(small, shortfall ** penalty_exponent, 0), axis=-1)
+
+    # in order to keep headway penalty (and thus reward function) positive
+    max_penalty = headways.shape[-1] * penalty_gain
+
+    return (max_penalty - penalty)[()]
+
+
+def lane_change_penalty(last_lc, timer, penalty=1):
+    """
+    Kernel of punish_rl_lane_changes: a penalty for every vehicle that changed
+    lanes during the current time step.
+
+    :param last_lc {numpy array} - time steps of the last lane changes of the penalized vehicles, of shape
+           (num_vehicles,) or (num_agents, num_vehicles)
+    :param timer {int} - current time step
+    :param penalty {float} - penalty imposed for every lane change
+    :return: the (non-positive) penalty, or the penalty of each agent
+    """
+    last_lc = np.asarray(last_lc, dtype=float)
+    return (-penalty * np.sum(last_lc == timer, axis=-1))[()]
@@ -0,0 +1,80 @@
+"""
+Streaming statistics of quantities recorded at every time step of rollouts.
+
+Evaluating a policy over many long rollouts does not require storing every
+observation: the mean and variance of the observations at each time step,
+across rollouts, are instead updated after every rollout with Welford's
+online algorithm, in memory that does not grow with the number of rollouts.
+"""
+import numpy as np
+
+
+class RunningStats:
+
+    def __init__(self, max_length, size=None):
+        """
+        Per time step mean and variance of a quantity, across rollouts.
+
+        Rollouts may be shorter than max_length (e.g. if they are terminated
+        early by a crash), in which case the time steps they do not reach do
+        not contribute to the statistics of these time steps.
+
+        Attributes
+        ----------
+        max_length: int
+            maximum number of time steps of a rollout
+        size: int, optional
+            size of the quantity at every time step (e.g. the size of the
+            observations). The quantity is a scalar if not specified
+        count: numpy ndarray of int
+            number of rollouts that reached each time step
+        """
+        shape = (max_length,) if size is None else (max_length, size)
+        self.max_length = max_length
+        self.count = np.zeros(max_length, dtype=int)
+        self._mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    def update(self, values):
+        """
+        Adds the values of a rollout to the statistics.
+
+        Parameters
+        ----------
+        values: array_like
+            values at each time step of the rollout, of shape (length,) or
+            (length, size), with length at most max_length
+        """
+        values = np.asarray(values, dtype=float)
+        length = len(values)
+        if length > self.max_length:
+            raise ValueError("Rollout of length %d is longer than the maximum "
+                             "length %d" % (length, self.max_length))
+
+        self.count[:length] += 1
+        count = self._expand(self.count[:length])
+        mean = self._mean[:length]
+        delta = values - mean
+        mean += delta / count
+        self._m2[:length] += delta * (values - mean)
+
+    @property
+    def mean(self):
+        """
+        Mean at each time step, or nan for the time steps no rollout reached.
+        """
+        with np.errstate(invalid="ignore"):
+            return np.where(self._expand(self.count) > 0, self._mean, np.nan)
+
+    @property
+    def variance(self):
+        """
+        Variance (normalized by the number of rollouts) at each time step, or
+        nan for the time steps no rollout reached.
+        """
+        count = self._expand(self.count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, self._m2 / count, np.nan)
+
+    def _expand(self, count):
+        return count.reshape(count.shape + (1,) * (self._mean.ndim - 1))
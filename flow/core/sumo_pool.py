@@ -0,0 +1,201 @@
+"""
+Pool of sumo processes launched ahead of time, from which environments are
+handed out ready traci connections.
+
+Starting sumo requires spawning a process, waiting for it to load the network,
+and connecting to it with traci, which is repeated every time an environment
+is created or restarted. A SumoProcessPool instead launches several sumo
+processes for a given set of command line arguments in the background, and
+recycles the processes of terminated environments by reloading their
+simulations (see traci's load command) instead of killing them. Processes that
+crashed, or whose connections were lost, are detected upon acquisition and
+release, and replaced with new processes.
+
+Pools are not thread-safe; environments in different processes (e.g. parallel
+samplers) each use their own pools.
+"""
+import atexit
+import logging
+import subprocess
+import sys
+
+import sumolib
+import traci
+
+from flow.core.command_batcher import restore_connection
+
+
+class SumoProcessPool:
+
+    def __init__(self, sumo_call, size=1):
+        """
+        Launches "size" sumo processes with the given command line arguments.
+
+        Attributes
+        ----------
+        sumo_call: list of str
+            sumo binary and command line arguments used to launch every
+            process in the pool, excluding the --remote-port argument
+        size: int, optional
+            number of processes launched ahead of time, and maximum number of
+            recycled processes kept ready in the pool; defaults to 1
+        idle: list of tuple
+            processes ready to be handed out, as tuples (process, port,
+            connection), where connection is None if no connection has been
+            established with the process yet
+        busy: dict
+            processes handed out to environments, as tuples (process, port)
+            keyed by the id of their connections
+        """
+        self.sumo_call = list(sumo_call)
+        self.size = size
+        self.idle = []
+        self.busy = dict()
+
+        for _ in range(size):
+            self.idle.append(self._launch())
+
+    def _launch(self):
+        port = sumolib.miscutils.getFreeSocketPort()
+        logging.info(" Launching pooled SUMO on port %d", port)
+        process = subprocess.Popen(
+            self.sumo_call + ["--remote-port", str(port)],
+            stdout=sys.stdout, stderr=sys.stderr)
+        return process, port, None
+
+    @staticmethod
+    def _kill(process, connection):
+        if connection is not None:
+            try:
+                connection.close(False)
+            except Exception:
+                pass
+        if process.poll() is None:
+            process.kill()
+
+    @staticmethod
+    def _is_alive(process, connection):
+        if process.poll() is not None:
+            return False
+        if connection is not None:
+            try:
+                connection.simulation.getCurrentTime()
+            except Exception:
+                return False
+        return True
+
+    def health_check(self):
+        """
+        Replaces the idle processes that terminated (e.g. crashed), or whose
+        connections were lost.
+        """
+        for i, (process, port, connection) in enumerate(self.idle):
+            if not self._is_alive(process, connection):
+                logging.warning(" Pooled SUMO on port %d is not responding, "
+                                "respawning", port)
+                self._kill(process, connection)
+                self.idle[i] = self._launch()
+
+    def acquire(self):
+        """
+        Returns a connection to a sumo process of the pool, at the start of
+        its simulation. If no process is ready, a new process is launched.
+
+        Returns
+        -------
+        connection: traci.connection.Connection type
+            connection to the sumo process
+        port: int
+            port of the sumo process
+        """
+        self.health_check()
+        if not self.idle:
+            self.idle.append(self._launch())
+
+        # processes that are already connected were recycled, and are ready
+        # to be used immediately
+        connected = [i for i, entry in enumerate(self.idle)
+                     if entry[2] is not None]
+        process, port, connection = self.idle.pop(
+            connected[0] if connected else 0)
+
+        if connection is None:
+            logging.debug(" Initializing TraCI on port %d!", port)
+            connection = traci.connect(port, numRetries=100, proc=process)
+
+        self.busy[id(connection)] = (process, port)
+
+        return connection, port
+
+    def release(self, connection):
+        """
+        Returns the process of a connection to the pool, after undoing the
+        changes made to the connection by its environment and reloading its
+        simulation. Processes that cannot be reloaded are replaced with new
+        processes, and processes in excess of the size of the pool are closed.
+
+        Parameters
+        ----------
+        connection: traci.connection.Connection type
+            connection returned by acquire
+        """
+        process, port = self.busy.pop(id(connection))
+
+        if len(self.idle) >= self.size:
+            self._kill(process, connection)
+            return
+
+        restore_connection(connection)
+        try:
+            connection.load(self.sumo_call[1:])
+        except Exception:
+            logging.warning(" Pooled SUMO on port %d could not be reloaded, "
+                            "respawning", port)
+            self._kill(process, connection)
+            self.idle.append(self._launch())
+            return
+
+        self.idle.append((process, port, connection))
+
+    def close(self):
+        """
+        Kills all processes of the pool, including the ones handed out.
+        """
+        for process, port, connection in self.idle:
+            self._kill(process, connection)
+        for process, port in self.busy.values():
+            self._kill(process, None)
+        self.idle = []
+        self.busy = dict()
+
+
+# pools of sumo processes, keyed by their command line arguments
+_POOLS = dict()
+
+
+def get_pool(sumo_call, size=1):
+    """
+    Returns the pool of sumo processes with the given command line arguments,
+    and creates it if needed.
+
+    Parameters
+    ----------
+    sumo_call: list of str
+        sumo binary and command line arguments, excluding --remote-port
+    size: int, optional
+        number of processes kept ready in the pool, if the pool is created
+    """
+    key = tuple(sumo_call)
+    if key not in _POOLS:
+        _POOLS[key] = SumoProcessPool(sumo_call, size)
+    return _POOLS[key]
+
+
+@atexit.register
+def close_pools():
+    """
+    Kills the processes of all pools.
+    """
+    for pool in _POOLS.values():
+        pool.close()
+    _POOLS.clear()
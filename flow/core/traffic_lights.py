@@ -0,0 +1,243 @@
+"""
+Cached schedule of the phases of a traffic light.
+
+Features such as the time remaining until a traffic light turns red for a
+vehicle, or until it next turns green, only depend on the lane of the vehicle,
+the current phase of the traffic light, and the time until its next switch.
+The TrafficLightTracker reads the program of the traffic light once, and
+precomputes these features for every approaching lane and every phase of the
+program. At each step, it then reads the state of the traffic light from a
+single subscription, after which the features of all vehicles are gathered
+from the precomputed tables at once.
+
+Times of the next switch of traffic lights are reported in ms by traci
+versions prior to sumo 1.0, and in s since then. The unit is identified from
+the program of the traffic light, whose phase durations follow the same
+convention (see get_program).
+
+A phase is green for a lane if all the links from the lane controlled by the
+traffic light are green (i.e. "G" or "g") during the phase. Consecutive green
+phases of a lane form a single green period.
+"""
+import numpy as np
+from traci import constants as tc
+
+# variables of the traffic light subscribed by the tracker
+TLS_VARIABLES = [tc.TL_RED_YELLOW_GREEN_STATE, tc.TL_CURRENT_PHASE,
+                 tc.TL_NEXT_SWITCH]
+
+
+class TrafficLightTracker:
+
+    def __init__(self, traci_connection, tls_id, lanes=None):
+        """
+        Reads the program of a traffic light, and subscribes to its state.
+
+        Attributes
+        ----------
+        traci_connection: traci connection
+            connection to the simulation containing the traffic light
+        tls_id: str
+            id of the traffic light
+        lanes: list of str, optional
+            ids of the lanes approaching the traffic light, in the order of
+            their codes in get_green_times. Defaults to all the lanes
+            controlled by the traffic light.
+        """
+        self.traci_connection = traci_connection
+        self.tls_id = tls_id
+
+        tls = traci_connection.trafficlights
+        controlled_lanes = tls.getControlledLanes(tls_id)
+        if lanes is None:
+            lanes = sorted(set(controlled_lanes))
+        self.lanes = list(lanes)
+
+        definition = tls.getCompleteRedYellowGreenDefinition(tls_id)
+        durations, states = get_program(definition, tls.getProgram(tls_id))
+        self.durations = np.array(durations, dtype=float)
+        self.states = states
+
+        # number of units of the times of the next switch per second
+        self.switch_scale = 1. if _in_seconds(definition) else 1000.
+
+        # first phase of the program with every state, used to identify the
+        # phase when the traffic light does not follow its program
+        self.phase_index = dict()
+        for phase, state in enumerate(states):
+            self.phase_index.setdefault(state, phase)
+
+        # whether each phase is green for each lane
+        self.green = np.zeros((len(self.lanes), len(states)), dtype=bool)
+        for i, lane_id in enumerate(self.lanes):
+            links = [link for link, lane in enumerate(controlled_lanes)
+                     if lane == lane_id]
+            if len(links) == 0:
+                raise ValueError("Lane {0} is not controlled by traffic light "
+                                 "{1}.".format(lane_id, tls_id))
+            for phase, state in enumerate(states):
+                self.green[i, phase] = all(state[link] in "Gg"
+                                           for link in links)
+
+        self.has_green = np.any(self.green, axis=1)
+        self.green_extension, self.next_green = self.__schedule()
+
+        # phase of the traffic light (or -1 if its state is not part of the
+        # program) and time until its next switch (in s), as of the last call
+        # to update
+        self.phase = -1
+        self.remaining = 0.
+
+        tls.subscribe(tls_id, TLS_VARIABLES)
+
+    def __schedule(self):
+        """
+        Computes, for every lane and phase, the time from the end of the phase
+        to the end of the green period of the lane if the phase is green, and
+        to the start of the next green period of the lane otherwise (in s).
+        """
+        num_phases = len(self.durations)
+        green_extension = np.zeros(self.green.shape)
+        next_green = np.zeros(self.green.shape)
+
+        for i in range(len(self.lanes)):
+            if not self.has_green[i] or np.all(self.green[i]):
+                continue
+
+            green = self.green[i]
+            for phase in range(num_phases):
+                # phases following the current one, over one cycle
+                following = (phase + 1 + np.arange(num_phases - 1)) % \
+                    num_phases
+                starts = green[following] & ~green[following - 1]
+                elapsed = np.concatenate(
+                    ([0.], np.cumsum(self.durations[following])))
+
+                next_green[i, phase] = elapsed[np.argmax(starts)] \
+                    if np.any(starts) else elapsed[-1]
+                if green[phase]:
+                    ends = ~green[following]
+                    green_extension[i, phase] = elapsed[np.argmax(ends)]
+
+        return green_extension, next_green
+
+    def update(self, current_time):
+        """
+        Reads the state of the traffic light, once per simulation step.
+
+        Parameters
+        ----------
+        current_time: int
+            current simulation time, in ms (see
+            SumoEnvironment.get_current_time)
+        """
+        results = self.traci_connection.trafficlights.getSubscriptionResults(
+            self.tls_id)
+        if not results:
+            tls = self.traci_connection.trafficlights
+            results = {
+                tc.TL_RED_YELLOW_GREEN_STATE:
+                    tls.getRedYellowGreenState(self.tls_id),
+                tc.TL_CURRENT_PHASE: tls.getPhase(self.tls_id),
+                tc.TL_NEXT_SWITCH: tls.getNextSwitch(self.tls_id)}
+
+        state = results[tc.TL_RED_YELLOW_GREEN_STATE]
+        phase = results[tc.TL_CURRENT_PHASE]
+        if phase >= len(self.states) or self.states[phase] != state:
+            phase = self.phase_index.get(state, -1)
+        self.phase = phase
+
+        self.remaining = results[tc.TL_NEXT_SWITCH] / self.switch_scale - \
+            current_time / 1000
+
+    def get_green_times(self, lane_codes):
+        """
+        Returns the time remaining in the green period of the lane of each
+        vehicle (zero if the light is not green for the lane), and the time
+        until the next green period of the lane starts.
+
+        If the state of the traffic light is not part of its program, or a
+        lane is never green, both times are zero.
+
+        Parameters
+        ----------
+        lane_codes: numpy array of int
+            indices of the lanes of the vehicles in self.lanes
+
+        Returns
+        -------
+        remaining_green: numpy array of float
+            remaining green time of each vehicle, in s
+        next_green: numpy array of float
+            time until the next green period of each vehicle, in s
+        """
+        lane_codes = np.asarray(lane_codes, dtype=int)
+        if self.phase < 0:
+            return np.zeros(len(lane_codes)), np.zeros(len(lane_codes))
+
+        green = self.green[lane_codes, self.phase]
+        remaining_green = np.where(
+            green, self.remaining + self.green_extension[lane_codes,
+                                                         self.phase], 0.)
+        next_green = np.where(
+            self.has_green[lane_codes],
+            self.remaining + self.next_green[lane_codes, self.phase], 0.)
+
+        return remaining_green, next_green
+
+
+def get_program(definition, program_id=None):
+    """
+    Extracts the phases of a program from the complete definition of a
+    traffic light, as returned by getCompleteRedYellowGreenDefinition.
+
+    Parameters
+    ----------
+    definition: list of traci Logic objects
+        programs of the traffic light
+    program_id: str, optional
+        id of the program. Defaults to the first program.
+
+    Returns
+    -------
+    durations: list of float
+        durations of the phases, in s
+    states: list of str
+        red-yellow-green states of the phases
+    """
+    programs = [logic for logic in definition
+                if _program_id(logic) == program_id] or list(definition)
+    if len(programs) == 0:
+        raise ValueError("The traffic light has no program.")
+
+    durations, states = [], []
+    for phase in _phases(programs[0]):
+        # traci versions prior to sumo 1.0 report durations in ms
+        if _phase_in_seconds(phase):
+            durations.append(float(phase.duration))
+            states.append(phase.state)
+        else:
+            durations.append(phase._duration / 1000)
+            states.append(phase._phaseDef)
+
+    return durations, states
+
+
+def _in_seconds(definition):
+    """
+    Returns whether the traci version of a definition reports times in s.
+    """
+    phases = [phase for logic in definition for phase in _phases(logic)]
+    return len(phases) == 0 or _phase_in_seconds(phases[0])
+
+
+def _phase_in_seconds(phase):
+    return hasattr(phase, "duration")
+
+
+def _program_id(logic):
+    return getattr(logic, "programID", getattr(logic, "_subID", None))
+
+
+def _phases(logic):
+    return getattr(logic, "phases", None) or getattr(logic, "_phases")
@@ -0,0 +1,251 @@
+"""
+In-process recording of the trajectories of the vehicles in the network.
+
+Sumo can write the trajectories of the vehicles to an emission file (see the
+emission_path attribute of SumoParams), which is expensive for sumo to write
+and for us to parse back (see flow/core/emission.py). The TrajectoryRecorder
+instead appends the states of the vehicles already collected by the
+environment at every step to growable numpy buffers, and writes them to .npy
+files at the end of every episode, which can be memory mapped back with
+load_trajectory.
+
+The states of all vehicles at a recorded step form consecutive rows of the
+per-vehicle fields, starting at offsets[i] for the i-th recorded step, so that
+vehicles entering or leaving the network do not require any padding. Vehicles
+and edges are stored as integer codes into the ids and edges arrays.
+"""
+import os
+
+import numpy as np
+
+# fields that may be recorded, and their types. rl_action is recorded once per
+# step (as the flattened actions of the rl agent), and all other fields once
+# per vehicle
+FIELDS = {"speed": np.float64,
+          "absolute_position": np.float64,
+          "edge": np.int32,
+          "lane": np.int32,
+          "headway": np.float64,
+          "rl_action": np.float64}
+
+
+class TrajectoryRecorder:
+
+    def __init__(self, path, name, fields=None, sampling_period=1,
+                 initial_capacity=4096):
+        """
+        Records the states of the vehicles in an environment every
+        sampling_period steps.
+
+        Attributes
+        ----------
+        path: str
+            directory in which the recorded episodes are written, in
+            sub-directories named "<name>-trajectory-<episode>"
+        name: str
+            name of the recorded experiment (e.g. the name of the scenario)
+        fields: list of str, optional
+            fields to record (see FIELDS), default is all fields
+        sampling_period: int, optional
+            number of steps in between two recorded steps
+        initial_capacity: int, optional
+            number of rows preallocated for each per-vehicle field. Buffers
+            double in size whenever they are full
+        """
+        if fields is None:
+            fields = sorted(FIELDS)
+        for field in fields:
+            if field not in FIELDS:
+                raise ValueError("Unknown trajectory field: %s. Expected one "
+                                 "of %s" % (field, sorted(FIELDS)))
+        if sampling_period < 1:
+            raise ValueError("The sampling period must be a positive number "
+                             "of steps")
+
+        self.path = path
+        self.name = name
+        self.fields = list(fields)
+        self.sampling_period = sampling_period
+        self.initial_capacity = initial_capacity
+        self.episode = 0
+
+        # codes of the vehicle ids and edges seen so far
+        self.id_codes = dict()
+        self.edge_codes = dict()
+
+        self._clear()
+
+    def _clear(self):
+        """Empties the buffers, at the start of an episode."""
+        self.num_samples = 0
+        self.num_rows = 0
+        self._time = _Buffer(np.float64, 64)
+        self._step = _Buffer(np.int64, 64)
+        self._offsets = _Buffer(np.int64, 64)
+        self._vehicle = _Buffer(np.int32, self.initial_capacity)
+        self._buffers = dict(
+            (field, _Buffer(FIELDS[field], self.initial_capacity))
+            for field in self.fields if field != "rl_action")
+        self._actions = None
+
+        # ids and edges of the last recorded step, and their codes, which are
+        # reused as long as the vehicles and their edges do not change
+        self._last_ids = None
+        self._last_id_codes = None
+        self._last_edges = None
+        self._last_edge_codes = None
+
+    def record(self, env, rl_actions=None):
+        """
+        Records the current states of the vehicles of an environment, if the
+        current step of the environment is a multiple of the sampling period.
+
+        Parameters
+        ----------
+        env: SumoEnvironment type
+            environment whose vehicles are recorded
+        rl_actions: list or numpy ndarray, optional
+            actions of the rl agent during the step
+        """
+        if env.timer % self.sampling_period != 0:
+            return
+
+        vehicles = env.vehicles
+
+        self._time.append([env.timer * env.time_step])
+        self._step.append([env.timer])
+        self._offsets.append([self.num_rows])
+
+        ids = vehicles.get_ids()
+        if ids != self._last_ids:
+            self._last_ids = list(ids)
+            self._last_id_codes = self._encode(ids, self.id_codes)
+        self._vehicle.append(self._last_id_codes)
+
+        for field, buffer in self._buffers.items():
+            if field == "edge":
+                edges = vehicles.get_edge()
+                if edges != self._last_edges:
+                    self._last_edges = list(edges)
+                    self._last_edge_codes = \
+                        self._encode(edges, self.edge_codes)
+                buffer.append(self._last_edge_codes)
+            else:
+                buffer.append(vehicles.get_state("all", field))
+
+        if "rl_action" in self.fields:
+            actions = np.zeros(0) if rl_actions is None else \
+                np.asarray(rl_actions, dtype=float).ravel()
+            if self._actions is None:
+                self._actions = _Buffer(np.float64, 64, width=len(actions))
+            elif len(actions) != self._actions.width:
+                raise ValueError("Expected %d rl actions, but received %d"
+                                 % (self._actions.width, len(actions)))
+            self._actions.append(actions[np.newaxis])
+
+        self.num_samples += 1
+        self.num_rows += len(ids)
+
+    def flush(self):
+        """
+        Writes the steps recorded since the last flush to the directory of a
+        new episode, and empties the buffers.
+
+        Returns
+        -------
+        str
+            directory of the episode, or None if no step was recorded
+        """
+        if self.num_samples == 0:
+            return None
+
+        directory = os.path.join(
+            self.path, "%s-trajectory-%d" % (self.name, self.episode))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._offsets.append([self.num_rows])
+        arrays = {"time": self._time.view(),
+                  "step": self._step.view(),
+                  "offsets": self._offsets.view(),
+                  "vehicle": self._vehicle.view(),
+                  "ids": _decode(self.id_codes),
+                  "edges": _decode(self.edge_codes)}
+        for field, buffer in self._buffers.items():
+            arrays[field] = buffer.view()
+        if self._actions is not None:
+            arrays["rl_action"] = self._actions.view()
+
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, name + ".npy"), array)
+
+        self.episode += 1
+        self._clear()
+
+        return directory
+
+    @staticmethod
+    def _encode(names, codes):
+        """Returns the codes of a list of names, adding new names."""
+        for name in names:
+            if name not in codes:
+                codes[name] = len(codes)
+        return np.array([codes[name] for name in names], dtype=np.int32)
+
+
+def load_trajectory(directory, mmap_mode="r"):
+    """
+    Loads an episode written by a TrajectoryRecorder.
+
+    Parameters
+    ----------
+    directory: str
+        directory of the episode
+    mmap_mode: str, optional
+        memory mapping mode of the arrays (see numpy.load), default is
+        read-only
+
+    Returns
+    -------
+    dict of numpy ndarray
+        recorded arrays, keyed by their names (the recorded fields, as well as
+        "time", "step", "offsets", "vehicle", "ids", and "edges")
+    """
+    arrays = dict()
+    for filename in os.listdir(directory):
+        if filename.endswith(".npy"):
+            arrays[filename[:-4]] = np.load(os.path.join(directory, filename),
+                                            mmap_mode=mmap_mode)
+    return arrays
+
+
+def _decode(codes):
+    names = sorted(codes, key=codes.get)
+    return np.array(names, dtype=np.str_) if names else np.zeros(0, dtype="U1")
+
+
+class _Buffer:
+
+    def __init__(self, dtype, capacity, width=None):
+        """
+        Array to which rows are appended, doubling its capacity whenever it is
+        full.
+        """
+        self.width = width
+        shape = (capacity,) if width is None else (capacity, width)
+        self.data = np.zeros(shape, dtype=dtype)
+        self.size = 0
+
+    def append(self, values):
+        n = len(values)
+        if self.size + n > len(self.data):
+            capacity = max(2 * len(self.data), self.size + n)
+            data = np.zeros((capacity,) + self.data.shape[1:],
+                            dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+        self.data[self.size:self.size + n] = values
+        self.size += n
+
+    def view(self):
+        return self.data[:self.size]
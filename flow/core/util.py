@@ -1,10 +1,8 @@
 import errno
 import os
-import csv
+import numpy as np
 from lxml import etree
 
-import xml.etree.ElementTree as ET
-
 E = etree.Element
 
 
@@ -30,7 +28,58 @@ def ensure_dir(path):
     return path
 
 
-def emission_to_csv(emission_path, output_path=None):
+def get_loop_leaders(x, lanes, lengths, loop_length):
+    """
+    Computes the leaders and headways of vehicles in a closed loop, in which
+    the leader of a vehicle is the next vehicle in the same lane.
+
+    Parameters
+    ----------
+    x: numpy array of float
+        positions of the vehicles in the loop, in [0, loop_length)
+    lanes: numpy array of int
+        lanes of the vehicles
+    lengths: numpy array of float
+        lengths of the vehicles
+    loop_length: float
+        length of the loop
+
+    Returns
+    -------
+    leader: numpy array of int
+        index of the leader of each vehicle, or -1 if a vehicle is alone in
+        its lane
+    headway: numpy array of float
+        distance between the front of each vehicle and the back of its
+        leader (zero for vehicles without a leader)
+    """
+    n = len(x)
+    leader = -np.ones(n, dtype=int)
+    headway = np.zeros(n)
+    if n == 0:
+        return leader, headway
+
+    # sort vehicles by lane, and then by position
+    order = np.lexsort((x, lanes))
+    new_lane = lanes[order][1:] != lanes[order][:-1]
+
+    # the leader of the last vehicle in a lane is the first vehicle in the
+    # same lane
+    nxt = np.roll(order, -1)
+    nxt[np.append(new_lane, True)] = order[np.append(True, new_lane)]
+
+    leader[order] = nxt
+    leader[leader == np.arange(n)] = -1
+
+    has_leader = leader >= 0
+    headway[has_leader] = np.mod(
+        x[leader[has_leader]] - lengths[leader[has_leader]] - x[has_leader],
+        loop_length)
+
+    return leader, headway
+
+
+def emission_to_csv(emission_path, output_path=None, chunk_size=100000):
     """
     Converts an emission file generated by sumo during an computational
     experiment into a csv file.
@@ -42,10 +91,16 @@ def emission_to_csv(emission_path, output_path=None):
     output_path: str
         path to the csv file that will be generated, default is the same
         directory as the emission file, with the same name
+    chunk_size: int, optional
+        number of records sorted in memory at a time. The emission file is
+        parsed incrementally and sorted with an external merge sort, so that
+        the memory usage does not grow with the size of the file (see
+        flow.core.emission)
 
     Yields
     ------
-    A csv file with all the information from the emission file
+    A csv file with all the information from the emission file, sorted by
+    vehicle id
 
     Note
     ----
@@ -53,52 +108,7 @@ def emission_to_csv(emission_path, output_path=None):
     means tha some data, such as absolute position, is not immediately available
     from the emission file, but can be recreated.
     """
-    parser = etree.XMLParser(recover=True)
-    tree = ET.parse(emission_path, parser=parser)
-    root = tree.getroot()
-
-    # parse the xml data into a dict
-    out_data = []
-    for time in root.findall('timestep'):
-        t = float(time.attrib['time'])
-
-        for car in time:
-            out_data.append(dict())
-            try:
-                out_data[-1]['time'] = t
-                out_data[-1]['CO'] = float(car.attrib['CO'])
-                out_data[-1]['y'] = float(car.attrib['y'])
-                out_data[-1]['CO2'] = float(car.attrib['CO2'])
-                out_data[-1]['electricity'] = float(car.attrib['electricity'])
-                out_data[-1]['type'] = car.attrib['type']
-                out_data[-1]['id'] = car.attrib['id']
-                out_data[-1]['eclass'] = car.attrib['eclass']
-                out_data[-1]['waiting'] = float(car.attrib['waiting'])
-                out_data[-1]['NOx'] = float(car.attrib['NOx'])
-                out_data[-1]['fuel'] = float(car.attrib['fuel'])
-                out_data[-1]['HC'] = float(car.attrib['HC'])
-                out_data[-1]['x'] = float(car.attrib['x'])
-                out_data[-1]['route'] = car.attrib['route']
-                out_data[-1]['relative_position'] = float(car.attrib['pos'])
-                out_data[-1]['noise'] = float(car.attrib['noise'])
-                out_data[-1]['angle'] = float(car.attrib['angle'])
-                out_data[-1]['PMx'] = float(car.attrib['PMx'])
-                out_data[-1]['speed'] = float(car.attrib['speed'])
-                out_data[-1]['edge_id'] = car.attrib['lane'].rpartition('_')[0]
-                out_data[-1]['lane_number'] = car.attrib['lane'].rpartition('_')[-1]
-            except KeyError:
-                del out_data[-1]
-
-    # sort the elements of the dictionary by the vehicle id
-    out_data = sorted(out_data, key=lambda k: k['id'])
-
-    # default output path
-    if output_path is None:
-        output_path = emission_path[:-3] + 'csv'
-
-    # output the dict data into a csv file
-    keys = out_data[0].keys()
-    with open(output_path, 'w') as output_file:
-        dict_writer = csv.DictWriter(output_file, keys)
-        dict_writer.writeheader()
-        dict_writer.writerows(out_data)
+    from flow.core.emission import convert_emission
+
+    return convert_emission(emission_path, output_path, output_format="csv",
+                            chunk_size=chunk_size)
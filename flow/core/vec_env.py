@@ -0,0 +1,328 @@
+"""
+Vectorized runner stepping several environments in parallel worker processes.
+
+Each worker process creates its own environment, and consequently its own sumo
+instance (on its own port). Actions, rewards, and episode terminations are
+exchanged with the workers over pipes, while observations are written by the
+workers directly into a buffer of shared memory (a memory-mapped file), and are
+never pickled.
+
+Environments are reset automatically by their workers at the end of an
+episode. In this case, the observation returned for the environment is the
+first observation of the next episode, and the last observation of the
+finished episode is stored under "terminal_observation" in its info
+dictionary.
+
+Exceptions raised by an environment in its worker are sent back with their
+traceback, and raised as a RuntimeError by the VecEnv, after which the worker
+exits.
+
+Only environments whose observations are arrays of fixed shape (i.e. single
+agent environments with a fixed number of vehicles) are supported.
+"""
+import multiprocessing
+import os
+import tempfile
+import traceback
+from multiprocessing.connection import wait
+
+import numpy as np
+
+
+def _worker(remote, parent_remote, index, env_fn):
+    """
+    Runs an environment in a worker process, performing the commands received
+    through the remote end of a pipe. Every reply is sent as ("ok", result),
+    or as ("error", traceback) if the environment raised an exception.
+
+    Parameters
+    ----------
+    remote: multiprocessing.Connection type
+        end of the pipe used by the worker
+    parent_remote: multiprocessing.Connection type
+        end of the pipe used by the VecEnv, closed in the worker
+    index: int
+        index of the environment in the VecEnv
+    env_fn: function
+        function (with no arguments) creating the environment
+    """
+    parent_remote.close()
+    env = None
+    try:
+        env = env_fn()
+        observation = np.asarray(env.reset(), dtype=np.float64)
+        remote.send(("ok", observation.shape))
+
+        # open the buffer of observations allocated by the VecEnv, once the
+        # shapes of the observations of all environments are known
+        setup = remote.recv()
+        if setup is None:
+            return
+        filename, shape = setup
+        buffer = np.memmap(filename, dtype=np.float64, mode="r+", shape=shape)
+        obs = buffer[index]
+        obs[...] = observation
+
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                observation, reward, done, info = env.step(data)
+                if done:
+                    info = dict(info)
+                    info["terminal_observation"] = np.asarray(observation)
+                    observation = env.reset()
+                obs[...] = observation
+                remote.send(("ok", (reward, done, info)))
+            elif cmd == "reset":
+                obs[...] = env.reset()
+                remote.send(("ok", None))
+            elif cmd == "close":
+                break
+            else:
+                raise ValueError("Unknown command: %s" % cmd)
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        remote.send(("error", traceback.format_exc()))
+    finally:
+        if env is not None:
+            env.terminate()
+        remote.close()
+
+
+def _result(env_id, reply):
+    """
+    Returns the result of a reply of a worker, or raises the exception raised
+    by its environment.
+    """
+    status, data = reply
+    if status == "error":
+        raise RuntimeError("Environment %d raised an exception:\n%s"
+                           % (env_id, data))
+    return data
+
+
+class VecEnv:
+
+    def __init__(self, env_fns):
+        """
+        Creates one worker process per environment, and waits for all
+        environments to be ready.
+
+        Environments may be stepped synchronously (see step), in which case
+        all environments perform an action before returning, or
+        asynchronously (see step_async), in which case the results of the
+        environments that are ready first are returned, while the other
+        environments keep stepping.
+
+        Attributes
+        ----------
+        env_fns: list of function
+            functions (with no arguments) creating the environments. These are
+            called in the worker processes
+        num_envs: int
+            number of environments
+        observations: numpy ndarray
+            last observations of all environments, stored in shared memory
+            with shape (num_envs, ...)
+        """
+        self.num_envs = len(env_fns)
+        self.closed = False
+
+        self.remotes, self.processes = [], []
+        for index, env_fn in enumerate(env_fns):
+            remote, work_remote = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker, args=(work_remote, remote, index, env_fn))
+            process.daemon = True
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+        replies = [remote.recv() for remote in self.remotes]
+        try:
+            shapes = [_result(env_id, reply)
+                      for env_id, reply in enumerate(replies)]
+            if any(shape != shapes[0] for shape in shapes):
+                raise ValueError("All environments must have observations of "
+                                 "the same shape, got: %s" % shapes)
+        except (RuntimeError, ValueError):
+            for remote in self.remotes:
+                try:
+                    remote.send(None)
+                except BrokenPipeError:
+                    pass
+            for process in self.processes:
+                process.join()
+            self.closed = True
+            raise
+
+        # buffer of observations shared with the workers, placed in memory if
+        # possible
+        shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        fd, self.filename = tempfile.mkstemp(prefix="flow_vec_env_",
+                                             dir=shm_dir)
+        os.close(fd)
+        shape = (self.num_envs,) + tuple(shapes[0])
+        self.observations = np.memmap(self.filename, dtype=np.float64,
+                                      mode="w+", shape=shape)
+        for remote in self.remotes:
+            remote.send((self.filename, shape))
+
+        # environments that were sent an action and did not reply yet
+        self.pending = set()
+
+    def send(self, actions, env_ids=None):
+        """
+        Sends actions to a set of environments, without waiting for them to
+        be performed.
+
+        Parameters
+        ----------
+        actions: list or numpy ndarray
+            actions of each environment in env_ids
+        env_ids: list of int, optional
+            indices of the environments; defaults to all environments
+        """
+        if env_ids is None:
+            env_ids = range(self.num_envs)
+        for env_id, action in zip(env_ids, actions):
+            if env_id in self.pending:
+                raise ValueError("Environment %d is still performing its "
+                                 "previous action" % env_id)
+            self.remotes[env_id].send(("step", action))
+            self.pending.add(env_id)
+
+    def recv(self, min_ready=None):
+        """
+        Waits for environments to perform the actions sent to them. If an
+        environment raised an exception, a RuntimeError containing its
+        traceback is raised once the replies are received.
+
+        Parameters
+        ----------
+        min_ready: int, optional
+            minimum number of environments to wait for; defaults to all
+            environments with pending actions
+
+        Returns
+        -------
+        env_ids: numpy ndarray of int
+            indices of the environments that performed their actions, in
+            increasing order
+        observations: numpy ndarray
+            new observations of these environments
+        rewards: numpy ndarray of float
+            rewards of these environments
+        dones: numpy ndarray of bool
+            whether the episodes of these environments ended (in which case
+            the environments were reset)
+        infos: list of dict
+            info dictionaries of these environments
+        """
+        if min_ready is None:
+            min_ready = len(self.pending)
+
+        results = dict()
+        remotes = dict((self.remotes[i], i) for i in self.pending)
+        while remotes and (len(results) < min_ready or not results):
+            for remote in wait(list(remotes)):
+                results[remotes.pop(remote)] = remote.recv()
+
+        self.pending.difference_update(results)
+        results = dict((i, _result(i, reply)) for i, reply in results.items())
+
+        env_ids = np.array(sorted(results), dtype=int)
+        rewards = np.array([results[i][0] for i in env_ids], dtype=float)
+        dones = np.array([results[i][1] for i in env_ids], dtype=bool)
+        infos = [results[i][2] for i in env_ids]
+
+        return env_ids, np.array(self.observations[env_ids]), rewards, \
+            dones, infos
+
+    def step(self, actions):
+        """
+        Performs one step in all environments, and waits for all of them.
+
+        Parameters
+        ----------
+        actions: list or numpy ndarray
+            actions of all environments, with shape (num_envs, ...)
+
+        Returns
+        -------
+        observations: numpy ndarray
+            new observations of all environments, with shape (num_envs, ...)
+        rewards: numpy ndarray of float
+            rewards of all environments
+        dones: numpy ndarray of bool
+            whether the episodes of the environments ended
+        infos: list of dict
+            info dictionaries of all environments
+        """
+        # the results of actions sent by step_async are discarded
+        if self.pending:
+            self.recv()
+        self.send(actions)
+        return self.recv()[1:]
+
+    def step_async(self, actions):
+        """
+        Sends actions to all environments that are not stepping, and returns
+        the results of the environments that are ready first (at least one).
+        Environments that are still stepping ignore their new actions.
+
+        Parameters
+        ----------
+        actions: list or numpy ndarray
+            actions of all environments, with shape (num_envs, ...)
+
+        Returns
+        -------
+        env_ids, observations, rewards, dones, infos:
+            see recv
+        """
+        ready = [i for i in range(self.num_envs) if i not in self.pending]
+        self.send([actions[i] for i in ready], ready)
+        return self.recv(min_ready=1)
+
+    def reset(self):
+        """
+        Resets all environments, after waiting for pending actions.
+
+        Returns
+        -------
+        numpy ndarray
+            initial observations of all environments, with shape
+            (num_envs, ...)
+        """
+        if self.pending:
+            self.recv()
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        replies = [remote.recv() for remote in self.remotes]
+        for env_id, reply in enumerate(replies):
+            _result(env_id, reply)
+        return np.array(self.observations)
+
+    def close(self):
+        """
+        Terminates the environments and their worker processes, and frees the
+        shared memory.
+        """
+        if self.closed:
+            return
+        for env_id, remote in enumerate(self.remotes):
+            try:
+                if env_id in self.pending:
+                    remote.recv()
+                remote.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for process in self.processes:
+            process.join()
+        self.pending.clear()
+        self.observations = None
+        os.remove(self.filename)
+        self.closed = True
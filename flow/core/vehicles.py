@@ -2,6 +2,20 @@ from flow.controllers.base_controller import SumoController
 from flow.controllers.rlcontroller import RLController
 
 import collections
+import numpy as np
+
+# states that are stored in columnar (array) form, and their data types. All
+# other states are stored in a per-vehicle dictionary.
+COLUMNS = collections.OrderedDict([("speed", float),
+                                   ("position", float),
+                                   ("lane", int),
+                                   ("headway", float),
+                                   ("absolute_position", float),
+                                   ("last_lc", float)])
+
+# states containing the controllers of the vehicles, which are instantiated
+# from the controllers of the type of a vehicle when first requested
+CONTROLLERS = ("acc_controller", "lane_changer", "router")
 
 
 class Vehicles:
@@ -10,22 +24,58 @@ class Vehicles:
         Base vehicle class used to describe the state of all vehicles in the
         network. State information on the vehicles for a given time step can be
         set or retreived from this class.
+
+        Frequently accessed numerical states (see COLUMNS) are stored as numpy
+        arrays, with the i-th element of each array corresponding to the i-th
+        vehicle in get_ids(). Requesting these states for "all" vehicles
+        returns a view of the underlying array, so no copy is made. The arrays
+        should accordingly be treated as read-only by the caller; use the setter
+        methods to modify them.
+
+        Vehicles may enter and leave the network during a rollout (see add and
+        remove). The arrays then only hold the vehicles currently in the
+        network, and the vehicles after a removed vehicle move up in the
+        arrays, keeping their order.
         """
         self.__ids = []  # stores the ids of all vehicles
         self.__controlled_ids = []  # stores the ids of flow-controlled vehicles
         self.__sumo_ids = []  # stores the ids of sumo-controlled vehicles
         self.__rl_ids = []  # stores the ids of rllab-controlled vehicles
 
-        # vehicles: Key = Vehicle ID, Value = Dictionary describing the vehicle
+        # maps the id of a vehicle to its index in the state arrays
+        self.__ids_index = dict()
+
+        # vehicles: Key = Vehicle ID, Value = Dictionary describing the
+        # non-columnar states of the vehicle
         # Ordered dictionary used to keep neural net inputs in order
         self.__vehicles = collections.OrderedDict()
 
+        # controllers and initial speed of each type of vehicle: Key = type,
+        # Value = Dictionary of (class, parameters) tuples of the controllers
+        # of the type. The controllers of a vehicle are only instantiated the
+        # first time they are requested
+        self.__type_params = dict()
+
+        # columnar states: Key = state name, Value = array of states for all
+        # vehicles. Only the first num_vehicles elements of the arrays are
+        # used, the remaining ones are kept for vehicles added later on
+        self.__columns = dict(
+            (name, np.zeros(0, dtype=dtype)) for name, dtype in COLUMNS.items())
+
+        # indices of the leader and follower of each vehicle (-1 if the
+        # vehicle does not have a leader/follower)
+        self.__leader = np.zeros(0, dtype=int)
+        self.__follower = np.zeros(0, dtype=int)
+
         self.num_vehicles = 0  # total number of vehicles in the network
         self.num_rl_vehicles = 0  # number of rl vehicles in the network
         self.num_types = 0  # number of unique types of vehicles in the network
         self.types = []  # types of vehicles in the network
         self.initial_speeds = []  # speed of vehicles at the start of a rollout
 
+    def __contains__(self, veh_id):
+        return veh_id in self.__ids_index
+
     def add_vehicles(self,
                      veh_id,
                      acceleration_controller,
@@ -34,12 +84,15 @@ class Vehicles:
                      initial_speed=0,
                      num_vehicles=1):
         """
-        Adds a sequence of vehicles to the list of vehicles in the network.
+        Adds a type of vehicles, and a sequence of vehicles of this type, to
+        the list of vehicles in the network. Additional vehicles of this type
+        may be added later on with the add method.
 
         Parameters
         ----------
         veh_id: str
-            base vehicle ID for the vehicles (will be appended by a number)
+            base vehicle ID for the vehicles (will be appended by a number),
+            and type of the vehicles
         acceleration_controller: tup
             1st element: flow-specified acceleration controller
             2nd element: controller parameters (may be set to None to maintain
@@ -63,92 +116,237 @@ class Vehicles:
         if not acceleration_controller:
             raise ValueError("No acceleration controller is specified.")
 
-        for i in range(num_vehicles):
-            vehID = veh_id + '_%d' % i
+        self.__type_params[veh_id] = {
+            "acc_controller": acceleration_controller,
+            "lane_changer": lane_change_controller,
+            "router": routing_controller,
+            "initial_speed": initial_speed}
 
-            # add the vehicle to the list of vehicle ids
-            self.__ids.append(vehID)
+        for i in range(num_vehicles):
+            self.add(veh_id + '_%d' % i, veh_id)
 
-            self.__vehicles[vehID] = dict()
+        # increase the number of unique types of vehicles in the network, and
+        # add the type to the list of types
+        self.num_types += 1
+        self.types.append(veh_id)
 
-            # specify the type
-            self.__vehicles[vehID]["type"] = veh_id
+    def add(self, veh_id, veh_type):
+        """
+        Adds a single vehicle of a type specified with add_vehicles to the
+        network, e.g. when the vehicle departs from an inflow. The vehicle is
+        given the last index in the state arrays, whose capacity is doubled
+        when full.
 
-            # specify the acceleration controller class
-            self.__vehicles[vehID]["acc_controller"] = \
-                acceleration_controller[0](veh_id=vehID,
-                                           **acceleration_controller[1])
+        Parameters
+        ----------
+        veh_id: str
+            vehicle identifier
+        veh_type: str
+            type of the vehicle
+
+        Raises
+        ------
+        ValueError
+            If the type of the vehicle is unknown, or if a vehicle with the
+            same id is already in the network.
+        """
+        if veh_type not in self.__type_params:
+            raise ValueError("Unknown vehicle type: %s" % veh_type)
+
+        if veh_id in self.__ids_index:
+            raise ValueError("Vehicle %s is already in the network." % veh_id)
+
+        indx = self.num_vehicles
+        if indx == len(self.__leader):
+            self.__resize(max(2 * indx, 1))
+
+        # add the vehicle to the list of vehicle ids
+        self.__ids_index[veh_id] = indx
+        self.__ids.append(veh_id)
+
+        # the states of vehicles previously stored at this index are cleared
+        for column in self.__columns.values():
+            column[indx] = 0
+        self.__leader[indx] = -1
+        self.__follower[indx] = -1
+
+        # specify the type and the speed of the vehicle at the start of a
+        # rollout. Controllers are added when first requested
+        params = self.__type_params[veh_type]
+        self.__vehicles[veh_id] = {"type": veh_type,
+                                   "initial_speed": params["initial_speed"]}
+
+        # determine the type of vehicle, and append it to its respective id
+        # list
+        if params["acc_controller"][0] == SumoController:
+            self.__sumo_ids.append(veh_id)
+        elif params["acc_controller"][0] == RLController:
+            self.__rl_ids.append(veh_id)
+        else:
+            self.__controlled_ids.append(veh_id)
 
-            # specify the lane-changing controller class
-            if lane_change_controller is not None:
-                self.__vehicles[vehID]["lane_changer"] = \
-                    lane_change_controller[0](veh_id=vehID,
-                                              **lane_change_controller[1])
-            else:
-                self.__vehicles[vehID]["lane_changer"] = None
+        # update the variables for the number of vehicles in the network
+        self.num_vehicles = len(self.__ids)
+        self.num_rl_vehicles = len(self.__rl_ids)
 
-            # specify the routing controller class
-            if routing_controller is not None:
-                self.__vehicles[vehID]["router"] = \
-                    routing_controller[0](veh_id=vehID,
-                                          router_params=routing_controller[1])
-            else:
-                self.__vehicles[vehID]["router"] = None
+    def remove(self, veh_id):
+        """
+        Removes vehicles from the network, e.g. when they arrive at the end of
+        their routes.
 
-            # specify the speed of vehicles at the start of a rollout
-            self.__vehicles[vehID]["initial_speed"] = initial_speed
+        The states of the remaining vehicles are moved up in the state arrays
+        in a single pass, so that they remain stored in the first num_vehicles
+        elements of the arrays, in the same order as before the removal, and
+        the arrays are shrunk once they are mostly empty.
 
-            # determine the type of vehicle, and append it to its respective
-            # id list
-            if acceleration_controller[0] == SumoController:
-                self.__sumo_ids.append(vehID)
-            elif acceleration_controller[0] == RLController:
-                self.__rl_ids.append(vehID)
-            else:
-                self.__controlled_ids.append(vehID)
+        Parameters
+        ----------
+        veh_id: str or list of str
+            id of the vehicle, or ids of the vehicles to be removed
+
+        Returns
+        -------
+        numpy array of int
+            new index of each vehicle that was in the network before the
+            removal, or -1 if it was removed
+        """
+        veh_ids = [veh_id] if isinstance(veh_id, str) else list(veh_id)
+        n = self.num_vehicles
+        if len(veh_ids) == 0:
+            return np.arange(n)
+
+        keep = np.ones(n, dtype=bool)
+        removed = set(veh_ids)
+        removed_types = set()
+        for vehID in removed:
+            keep[self.__ids_index.pop(vehID)] = False
+            removed_types.add(self.__vehicles.pop(vehID)["type"])
+
+        # new index of the vehicle at every original index (with an extra
+        # element mapping the index -1 of missing leaders/followers onto
+        # itself)
+        m = int(np.count_nonzero(keep))
+        new_index = -np.ones(n + 1, dtype=int)
+        new_index[:n][keep] = np.arange(m)
+
+        for column in self.__columns.values():
+            column[:m] = column[:n][keep]
+        self.__leader[:m] = new_index[self.__leader[:n][keep]]
+        self.__follower[:m] = new_index[self.__follower[:n][keep]]
+
+        # the lists of ids are updated in place, as they are shared with the
+        # environment, and only the vehicles after the first removed one
+        # change index
+        first = int(np.argmin(keep))
+        self.__ids[first:] = [vehID for vehID in self.__ids[first:]
+                              if vehID not in removed]
+        for indx in range(first, m):
+            self.__ids_index[self.__ids[indx]] = indx
+
+        acc_classes = set(self.__type_params[veh_type]["acc_controller"][0]
+                          for veh_type in removed_types)
+        if SumoController in acc_classes:
+            self.__sumo_ids[:] = [vehID for vehID in self.__sumo_ids
+                                  if vehID not in removed]
+        if RLController in acc_classes:
+            self.__rl_ids[:] = [vehID for vehID in self.__rl_ids
+                                if vehID not in removed]
+        if acc_classes - {SumoController, RLController}:
+            self.__controlled_ids[:] = [vehID for vehID
+                                        in self.__controlled_ids
+                                        if vehID not in removed]
 
         # update the variables for the number of vehicles in the network
         self.num_vehicles = len(self.__ids)
         self.num_rl_vehicles = len(self.__rl_ids)
 
-        # increase the number of unique types of vehicles in the network, and
-        # add the type to the list of types
-        self.num_types += 1
-        self.types.append(veh_id)
+        if m < len(self.__leader) // 4:
+            self.__resize(2 * m)
+
+        return new_index[:n]
+
+    def __resize(self, capacity):
+        """
+        Changes the number of vehicles that the state arrays can hold, keeping
+        the states of the vehicles in the network.
+        """
+        n = self.num_vehicles
+        for name, dtype in COLUMNS.items():
+            column = np.zeros(capacity, dtype=dtype)
+            column[:n] = self.__columns[name][:n]
+            self.__columns[name] = column
+
+        leader = -np.ones(capacity, dtype=int)
+        leader[:n] = self.__leader[:n]
+        self.__leader = leader
+
+        follower = -np.ones(capacity, dtype=int)
+        follower[:n] = self.__follower[:n]
+        self.__follower = follower
 
     def set_speed(self, veh_id, speed):
-        self.__vehicles[veh_id]["speed"] = speed
+        self.__set_column("speed", veh_id, speed)
 
     def set_absolute_position(self, veh_id, absolute_position):
-        self.__vehicles[veh_id]["absolute_position"] = absolute_position
+        self.__set_column("absolute_position", veh_id, absolute_position)
 
     def set_position(self, veh_id, position):
-        self.__vehicles[veh_id]["position"] = position
+        self.__set_column("position", veh_id, position)
 
     def set_edge(self, veh_id, edge):
         self.__vehicles[veh_id]["edge"] = edge
 
     def set_lane(self, veh_id, lane):
-        self.__vehicles[veh_id]["lane"] = lane
+        self.__set_column("lane", veh_id, lane)
 
     def set_route(self, veh_id, route):
         self.__vehicles[veh_id]["route"] = route
 
     def set_leader(self, veh_id, leader):
-        self.__vehicles[veh_id]["leader"] = leader
+        self.__leader[self.__ids_index[veh_id]] = \
+            self.__ids_index.get(leader, -1) if leader else -1
 
     def set_follower(self, veh_id, follower):
-        self.__vehicles[veh_id]["follower"] = follower
+        self.__follower[self.__ids_index[veh_id]] = \
+            self.__ids_index.get(follower, -1) if follower else -1
 
     def set_headway(self, veh_id, headway):
-        self.__vehicles[veh_id]["headway"] = headway
+        self.__set_column("headway", veh_id, headway)
+
+    def set_headway_data(self, leader_index, headway):
+        """
+        Updates the leaders and headways of all vehicles at once, and derives
+        the followers of all vehicles from their leaders.
+
+        Parameters
+        ----------
+        leader_index: numpy array of int
+            index of the leader of each vehicle in get_ids(), or -1 if a
+            vehicle does not have a leader
+        headway: numpy array of float
+            headway of each vehicle in get_ids()
+        """
+        n = self.num_vehicles
+        has_leader = leader_index >= 0
+
+        self.__leader[:n] = leader_index
+        self.__columns["headway"][:n] = headway
+        self.__follower[:n] = -1
+        self.__follower[leader_index[has_leader]] = np.arange(n)[has_leader]
 
     def set_state(self, veh_id, state_name, state):
         """
         Generic set function. Updates the state *state_name* of the vehicle with
         id *veh_id* with the value *state*.
         """
-        self.__vehicles[veh_id][state_name] = state
+        if state_name in self.__columns:
+            self.__set_column(state_name, veh_id, state)
+        elif state_name == "leader":
+            self.set_leader(veh_id, state)
+        elif state_name == "follower":
+            self.set_follower(veh_id, state)
+        else:
+            self.__vehicles[veh_id][state_name] = state
 
     def get_ids(self):
         return self.__ids
@@ -162,6 +360,24 @@ class Vehicles:
     def get_rl_ids(self):
         return self.__rl_ids
 
+    def get_index(self, veh_id="all"):
+        """
+        Returns the index of the specified vehicle(s) in the columnar state
+        arrays.
+
+        Accepts as input:
+        - id of a specific vehicle
+        - list or array of vehicle ids
+        - "all", in which case the indices of all vehicles are provided
+        """
+        if isinstance(veh_id, (list, tuple, np.ndarray)):
+            return np.fromiter((self.__ids_index[vehID] for vehID in veh_id),
+                               dtype=int, count=len(veh_id))
+        elif veh_id == "all":
+            return np.arange(self.num_vehicles)
+        else:
+            return self.__ids_index[veh_id]
+
     def get_initial_speed(self, veh_id):
         return self.__vehicles[veh_id]["initial_speed"]
 
@@ -171,15 +387,10 @@ class Vehicles:
 
         Accepts as input:
         - id of a specific vehicle
-        - list of vehicle ids
-        - "all", in which case a list of all the specified state is provided
+        - list or array of vehicle ids
+        - "all", in which case an array of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["speed"] for vehID in veh_id]
-        if veh_id == "all":
-            return [self.__vehicles[vehID]["speed"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["speed"]
+        return self.__get_column("speed", veh_id)
 
     def get_absolute_position(self, veh_id="all"):
         """
@@ -188,15 +399,10 @@ class Vehicles:
 
         Accepts as input:
         - id of a specific vehicle
-        - list of vehicle ids
-        - "all", in which case a list of all the specified state is provided
+        - list or array of vehicle ids
+        - "all", in which case an array of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["absolute_position"] for vehID in veh_id]
-        elif veh_id == "all":
-            return [self.__vehicles[vehID]["absolute_position"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["absolute_position"]
+        return self.__get_column("absolute_position", veh_id)
 
     def get_position(self, veh_id="all"):
         """
@@ -205,15 +411,10 @@ class Vehicles:
 
         Accepts as input:
         - id of a specific vehicle
-        - list of vehicle ids
-        - "all", in which case a list of all the specified state is provided
+        - list or array of vehicle ids
+        - "all", in which case an array of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["position"] for vehID in veh_id]
-        elif veh_id == "all":
-            return [self.__vehicles[vehID]["position"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["position"]
+        return self.__get_column("position", veh_id)
 
     def get_edge(self, veh_id="all"):
         """
@@ -225,12 +426,7 @@ class Vehicles:
         - list of vehicle ids
         - "all", in which case a list of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["edge"] for vehID in veh_id]
-        elif veh_id == "all":
-            return [self.__vehicles[vehID]["edge"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["edge"]
+        return self.__get_dict_state("edge", veh_id)
 
     def get_lane(self, veh_id="all"):
         """
@@ -238,15 +434,10 @@ class Vehicles:
 
         Accepts as input:
         - id of a specific vehicle
-        - list of vehicle ids
-        - "all", in which case a list of all the specified state is provided
+        - list or array of vehicle ids
+        - "all", in which case an array of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["lane"] for vehID in veh_id]
-        elif veh_id == "all":
-            return [self.__vehicles[vehID]["lane"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["lane"]
+        return self.__get_column("lane", veh_id)
 
     def get_acc_controller(self, veh_id="all"):
         """
@@ -257,12 +448,7 @@ class Vehicles:
         - list of vehicle ids
         - "all", in which case a list of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["acc_controller"] for vehID in veh_id]
-        elif veh_id == "all":
-            return [self.__vehicles[vehID]["acc_controller"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["acc_controller"]
+        return self.__get_controllers("acc_controller", veh_id)
 
     def get_lane_changing_controller(self, veh_id="all"):
         """
@@ -273,12 +459,7 @@ class Vehicles:
         - list of vehicle ids
         - "all", in which case a list of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["lane_changer"] for vehID in veh_id]
-        elif veh_id == "all":
-            return [self.__vehicles[vehID]["lane_changer"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["lane_changer"]
+        return self.__get_controllers("lane_changer", veh_id)
 
     def get_routing_controller(self, veh_id="all"):
         """
@@ -289,12 +470,7 @@ class Vehicles:
         - list of vehicle ids
         - "all", in which case a list of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["router"] for vehID in veh_id]
-        elif veh_id == "all":
-            return [self.__vehicles[vehID]["router"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["router"]
+        return self.__get_controllers("router", veh_id)
 
     def get_route(self, veh_id="all"):
         """
@@ -305,12 +481,7 @@ class Vehicles:
         - list of vehicle ids
         - "all", in which case a list of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["route"] for vehID in veh_id]
-        elif veh_id == "all":
-            return [self.__vehicles[vehID]["route"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["route"]
+        return self.__get_dict_state("route", veh_id)
 
     def get_leader(self, veh_id="all"):
         """
@@ -321,12 +492,7 @@ class Vehicles:
         - list of vehicle ids
         - "all", in which case a list of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["leader"] for vehID in veh_id]
-        elif veh_id == "all":
-            return [self.__vehicles[vehID]["leader"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["leader"]
+        return self.__get_neighbor(self.__leader, veh_id)
 
     def get_follower(self, veh_id="all"):
         """
@@ -337,12 +503,31 @@ class Vehicles:
         - list of vehicle ids
         - "all", in which case a list of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["follower"] for vehID in veh_id]
-        elif veh_id == "all":
-            return [self.__vehicles[vehID]["follower"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["follower"]
+        return self.__get_neighbor(self.__follower, veh_id)
+
+    def get_leader_index(self, veh_id="all"):
+        """
+        Returns the index (see get_index) of the leader of the specified
+        vehicle(s), or -1 if a vehicle does not have a leader.
+
+        Accepts as input:
+        - id of a specific vehicle
+        - list or array of vehicle ids
+        - "all", in which case an array of all the leader indices is provided
+        """
+        return self.__get_array(self.__leader, veh_id)
+
+    def get_follower_index(self, veh_id="all"):
+        """
+        Returns the index (see get_index) of the follower of the specified
+        vehicle(s), or -1 if a vehicle does not have a follower.
+
+        Accepts as input:
+        - id of a specific vehicle
+        - list or array of vehicle ids
+        - "all", in which case an array of all the follower indices is provided
+        """
+        return self.__get_array(self.__follower, veh_id)
 
     def get_headway(self, veh_id="all"):
         """
@@ -350,15 +535,10 @@ class Vehicles:
 
         Accepts as input:
         - id of a specific vehicle
-        - list of vehicle ids
-        - "all", in which case a list of all the specified state is provided
+        - list or array of vehicle ids
+        - "all", in which case an array of all the specified state is provided
         """
-        if isinstance(veh_id, list):
-            return [self.__vehicles[vehID]["headway"] for vehID in veh_id]
-        elif veh_id == "all":
-            return [self.__vehicles[vehID]["headway"] for vehID in self.__ids]
-        else:
-            return self.__vehicles[veh_id]["headway"]
+        return self.__get_column("headway", veh_id)
 
     def get_state(self, veh_id, state_name):
         """
@@ -369,16 +549,90 @@ class Vehicles:
         - id of a specific vehicle
         - list of vehicle ids
         - "all", in which case a list of all the specified state is provided
+          (or an array, if the state is stored in columnar form)
+        """
+        if state_name in self.__columns:
+            return self.__get_column(state_name, veh_id)
+        elif state_name == "leader":
+            return self.get_leader(veh_id)
+        elif state_name == "follower":
+            return self.get_follower(veh_id)
+        elif state_name in CONTROLLERS:
+            return self.__get_controllers(state_name, veh_id)
+        else:
+            return self.__get_dict_state(state_name, veh_id)
+
+    def get_full_state(self, veh_id):
         """
-        if isinstance(veh_id, list):
+        Return a dict of all state variables of a specific vehicle. Note that
+        this is a copy of the state; modifying it does not affect the vehicle.
+        """
+        full_state = dict(self.__vehicles[veh_id])
+        for name in CONTROLLERS:
+            full_state[name] = self.__get_controller(name, veh_id)
+        indx = self.__ids_index[veh_id]
+        for name, column in self.__columns.items():
+            full_state[name] = column[indx]
+        full_state["leader"] = self.get_leader(veh_id)
+        full_state["follower"] = self.get_follower(veh_id)
+        return full_state
+
+    def __get_column(self, state_name, veh_id):
+        return self.__get_array(self.__columns[state_name], veh_id)
+
+    def __get_array(self, column, veh_id):
+        if isinstance(veh_id, (list, tuple, np.ndarray)):
+            return column[self.get_index(veh_id)]
+        elif veh_id == "all":
+            return column[:self.num_vehicles]
+        else:
+            return column[self.__ids_index[veh_id]]
+
+    def __set_column(self, state_name, veh_id, state):
+        column = self.__columns[state_name]
+        if isinstance(veh_id, (list, tuple, np.ndarray)):
+            column[self.get_index(veh_id)] = state
+        elif veh_id == "all":
+            column[:self.num_vehicles] = state
+        else:
+            column[self.__ids_index[veh_id]] = state
+
+    def __get_neighbor(self, column, veh_id):
+        indices = self.__get_array(column, veh_id)
+        if isinstance(indices, np.ndarray):
+            return [self.__ids[i] if i >= 0 else None for i in indices]
+        else:
+            return self.__ids[indices] if indices >= 0 else None
+
+    def __get_dict_state(self, state_name, veh_id):
+        if isinstance(veh_id, (list, tuple, np.ndarray)):
             return [self.__vehicles[vehID][state_name] for vehID in veh_id]
-        if veh_id == "all":
-            return [self.__vehicles[vehID][state_name] for vehID in self.__ids]
+        elif veh_id == "all":
+            return [self.__vehicles[vehID][state_name]
+                    for vehID in self.__ids]
         else:
             return self.__vehicles[veh_id][state_name]
 
-    def get_full_state(self, veh_id):
-        """
-        Return a dict of all state variables of a specific vehicle:
-        """
-        return self.__vehicles[veh_id]
+    def __get_controllers(self, state_name, veh_id):
+        if isinstance(veh_id, (list, tuple, np.ndarray)):
+            return [self.__get_controller(state_name, vehID)
+                    for vehID in veh_id]
+        elif veh_id == "all":
+            return [self.__get_controller(state_name, vehID)
+                    for vehID in self.__ids]
+        else:
+            return self.__get_controller(state_name, veh_id)
+
+    def __get_controller(self, state_name, veh_id):
+        state = self.__vehicles[veh_id]
+        if state_name not in state:
+            controller = self.__type_params[state["type"]][state_name]
+            if controller is None:
+                state[state_name] = None
+            elif state_name == "router":
+                state[state_name] = controller[0](veh_id=veh_id,
+                                                  router_params=controller[1])
+            else:
+                state[state_name] = controller[0](veh_id=veh_id,
+                                                  **controller[1])
+        return state[state_name]
@@ -1,10 +1,6 @@
 import logging
-import subprocess
-import sys
 from copy import deepcopy
-import time
 
-import traci
 from traci import constants as tc
 from rllab.core.serializable import Serializable
 from rllab.envs.base import Step
@@ -13,7 +9,20 @@ import gym
 import sumolib
 
 from flow.controllers.car_following_models import *
-from flow.core.util import ensure_dir
+from flow.controllers.base_controller import SumoController, \
+    safe_action_instantaneous, safe_velocity_action
+from flow.controllers.batch_controller import BatchController
+from flow.core.backends import get_backend
+from flow.core.command_batcher import CommandBatcher
+from flow.core.lane_index import LaneIndex
+from flow.core.ordering import IncrementalOrdering
+from flow.core.profiler import StepProfiler
+from flow.core.trajectory import TrajectoryRecorder
+from flow.core.util import ensure_dir, get_loop_leaders
+
+# range (in meters) of the context subscription used to collect the states of
+# all vehicles in the network, when requested
+CONTEXT_RANGE = 1e5
 
 COLORS = [(255, 0, 0, 0), (0, 255, 0, 0), (0, 0, 255, 0), (255, 255, 0, 0),
           (0, 255, 255, 0), (255, 0, 255, 0), (255, 255, 255, 0)]
@@ -67,6 +76,8 @@ class SumoEnvironment(gym.Env, Serializable):
         self.controlled_ids, self.sumo_ids, self.rl_ids = [], [], []
         self.state = None
         self.obs_var_labels = []
+        # spatial index of the vehicles in each lane (see lane_index)
+        self._lane_index = None
 
         # SUMO Params
         if sumo_params.port:
@@ -78,6 +89,30 @@ class SumoEnvironment(gym.Env, Serializable):
             sumo_params.vehicle_arrangement_shuffle
         self.starting_position_shuffle = sumo_params.starting_position_shuffle
         self.emission_path = sumo_params.emission_path
+        self.sim_backend = get_backend(sumo_params.sim_backend)
+        self.subscription_mode = sumo_params.subscription_mode
+        if self.subscription_mode not in ["vehicle", "context"]:
+            raise ValueError("Unknown subscription mode: %s"
+                             % self.subscription_mode)
+        # leaders are not subscribed to in the context mode, and are instead
+        # computed from the positions of the vehicles (see update_headways)
+        if self.subscription_mode == "context" and not scenario.single_ring:
+            raise ValueError("Context subscriptions are only supported in "
+                             "single ring roads")
+        self.reset_mode = sumo_params.reset_mode
+        if self.reset_mode not in ["readd", "state"]:
+            raise ValueError("Unknown reset mode: %s" % self.reset_mode)
+        # vehicles are re-created when a snapshot of the simulation is loaded,
+        # and would have to be subscribed to one by one. Context
+        # subscriptions, which are kept, are only supported in single ring
+        # roads
+        if self.reset_mode == "state" and not scenario.single_ring:
+            raise ValueError("Resetting from a snapshot of the simulation is "
+                             "only supported in single ring roads")
+        if self.reset_mode == "state" and self.subscription_mode == "vehicle":
+            raise ValueError("Resetting from a snapshot of the simulation "
+                             "requires context subscriptions")
+        self.dynamic_vehicles = sumo_params.dynamic_vehicles
 
         # path to the output (emission) file provided by sumo
         if self.emission_path:
@@ -88,6 +123,27 @@ class SumoEnvironment(gym.Env, Serializable):
         else:
             self.emission_out = None
 
+        # trajectories of the vehicles recorded from within flow, as an
+        # alternative to the emission output of sumo (see
+        # flow/core/trajectory.py)
+        if sumo_params.trajectory_path:
+            self.trajectory_recorder = TrajectoryRecorder(
+                sumo_params.trajectory_path, self.scenario.name,
+                fields=sumo_params.trajectory_fields,
+                sampling_period=sumo_params.trajectory_period)
+        else:
+            self.trajectory_recorder = None
+
+        # timings of the phases of every step, when requested (see
+        # flow/core/profiler.py)
+        if sumo_params.step_profile or sumo_params.step_trace_path:
+            self.step_profiler = StepProfiler(
+                capacity=sumo_params.step_profile_size,
+                trace_path=sumo_params.step_trace_path,
+                name=self.scenario.name)
+        else:
+            self.step_profiler = None
+
         self.fail_safe = env_params.fail_safe
         self.max_speed = env_params.max_speed
         self.lane_change_duration = \
@@ -113,7 +169,7 @@ class SumoEnvironment(gym.Env, Serializable):
         Restarts an already initialized environment. Used when visualizing a
         rollout.
         """
-        self.traci_connection.close(False)
+        self.sim_backend.close(self.traci_connection, False)
         if sumo_binary:
             self.sumo_binary = sumo_binary
 
@@ -131,35 +187,15 @@ class SumoEnvironment(gym.Env, Serializable):
         Starts a sumo instance using the configuration files created by the
         generator class. Also initializes a traci connection to interface with
         sumo from Python.
-        """
-        logging.info(" Starting SUMO on port " + str(self.port))
-        logging.debug(" Cfg file " + str(self.scenario.cfg))
-        logging.debug(" Emission file: " + str(self.emission_out))
-        logging.debug(" Time step: " + str(self.time_step))
-
-        # Opening the I/O thread to SUMO
-        cfg_file = self.scenario.cfg
-        # if "mode" in self.env_params and self.env_params["mode"] == "ec2":
-        #     cfg_file = "/root/code/rllab/" + cfg_file
-
-        sumo_call = [self.sumo_binary,
-                     "-c", cfg_file,
-                     "--remote-port", str(self.port),
-                     "--step-length", str(self.time_step)]
-        logging.info("Traci on port: ", self.port)
-        if self.emission_out:
-            sumo_call.append("--emission-output")
-            sumo_call.append(self.emission_out)
-
-        subprocess.Popen(sumo_call, stdout=sys.stdout, stderr=sys.stderr)
 
-        logging.debug(" Initializing TraCI on port " + str(self.port) + "!")
-
-        # wait a small period of time for the subprocess to activate before
-        # trying to connect with traci
-        time.sleep(0.02)
+        The simulation is started by the backend specified by "sim_backend" in
+        sumo_params (see flow/core/backends.py).
+        """
+        self.traci_connection = self.sim_backend.start(self)
 
-        self.traci_connection = traci.connect(self.port, numRetries=100)
+        # commands issued to vehicles during a step are sent to sumo together
+        # with the simulation step command (see flow/core/command_batcher.py)
+        self.command_batcher = CommandBatcher(self.traci_connection)
 
         self.traci_connection.simulationStep()
 
@@ -182,10 +218,23 @@ class SumoEnvironment(gym.Env, Serializable):
         """
         # collect the ids of vehicles in the network
         self.ids = self.vehicles.get_ids()
+        self.initial_ids = list(self.ids)
         self.controlled_ids = self.vehicles.get_controlled_ids()
         self.sumo_ids = self.vehicles.get_sumo_ids()
         self.rl_ids = self.vehicles.get_rl_ids()
 
+        # order of the vehicles by position, maintained across steps (see
+        # sort_by_position)
+        self.ordering = IncrementalOrdering(self.ids)
+
+        # engine used to compute the accelerations of all traci-controlled
+        # vehicles at once
+        if self.env_params.batch_controllers:
+            self.batch_controller = \
+                BatchController(self.vehicles, self.controlled_ids)
+        else:
+            self.batch_controller = None
+
         # dictionary of initial observations used while resetting vehicles after
         # each rollout
         self.initial_observations = dict.fromkeys(self.ids)
@@ -245,6 +294,8 @@ class SumoEnvironment(gym.Env, Serializable):
                 self.available_routes[self.initial_observations[veh_id]["edge"]]
             self.initial_observations[veh_id]["absolute_position"] = \
                 self.get_x_by_id(veh_id)
+            self.initial_observations[veh_id]["length"] = \
+                self.vehicles.get_state(veh_id, "length")
 
             # set speed mode
             self.set_speed_mode(veh_id)
@@ -266,6 +317,9 @@ class SumoEnvironment(gym.Env, Serializable):
         # collect list of sorted vehicle ids
         self.sorted_ids, self.sorted_extra_data = self.sort_by_position()
 
+        # the lane index is rebuilt from the new positions when next needed
+        self._lane_index = None
+
         # collect headway, leader id, and follower id data
         for veh_id in self.ids:
             headway = self.traci_connection.vehicle.getLeader(veh_id, 2000)
@@ -284,11 +338,40 @@ class SumoEnvironment(gym.Env, Serializable):
                                                                 "last_lc")
 
         # subscribe the requested states for traci-related speedups
-        for veh_id in self.ids:
-            self.traci_connection.vehicle.subscribe(
-                veh_id, [tc.VAR_LANE_INDEX, tc.VAR_LANEPOSITION,
-                         tc.VAR_ROAD_ID, tc.VAR_SPEED])
-            self.traci_connection.vehicle.subscribeLeader(veh_id, 2000)
+        if self.subscription_mode == "context":
+            # a single subscription around any junction covers all vehicles
+            # in the network, provided its range is large enough
+            self.context_junction = \
+                self.traci_connection.junction.getIDList()[0]
+            self.traci_connection.junction.subscribeContext(
+                self.context_junction, tc.CMD_GET_VEHICLE_VARIABLE,
+                CONTEXT_RANGE, [tc.VAR_LANE_INDEX, tc.VAR_LANEPOSITION,
+                                tc.VAR_ROAD_ID, tc.VAR_SPEED])
+        else:
+            for veh_id in self.ids:
+                self.traci_connection.vehicle.subscribe(
+                    veh_id, [tc.VAR_LANE_INDEX, tc.VAR_LANEPOSITION,
+                             tc.VAR_ROAD_ID, tc.VAR_SPEED])
+                self.traci_connection.vehicle.subscribeLeader(veh_id, 2000)
+
+        # simulation time (see get_current_time), and lists of the vehicles
+        # entering and leaving the network at every step
+        simulation_variables = [tc.VAR_TIME_STEP]
+        if self.dynamic_vehicles:
+            simulation_variables += [tc.VAR_DEPARTED_VEHICLES_IDS,
+                                     tc.VAR_ARRIVED_VEHICLES_IDS]
+        self.traci_connection.simulation.subscribe(simulation_variables)
+
+        # leaders and headways at the start of a rollout, restored upon reset
+        # when the initial state of the simulation is loaded from a snapshot
+        self.initial_headway_data = (self.vehicles.get_leader_index().copy(),
+                                     self.vehicles.get_headway().copy())
+
+        # save a snapshot of the simulation, which is loaded back upon reset
+        if self.reset_mode == "state":
+            self.state_file = self.scenario.generator.cfg_path + \
+                "%s-%d.state.xml" % (self.scenario.name, self.port)
+            self.traci_connection.simulation.saveState(self.state_file)
 
     def _step(self, rl_actions):
         """
@@ -314,27 +397,39 @@ class SumoEnvironment(gym.Env, Serializable):
         info: dictionary
             contains other diagnostic information from the previous action
         """
+        profiler = self.step_profiler
+        if profiler is not None:
+            profiler.start_step()
+
         self.timer += 1
+        self.command_batcher.reset_counts()
 
         # perform acceleration and (optionally) lane change actions for
         # traci-controlled human-driven vehicles
         if len(self.controlled_ids) > 0:
-            accel = []
-            for veh_id in self.controlled_ids:
-                # acceleration action
-                action = self.vehicles.get_acc_controller(veh_id).get_action(
-                    self)
-                accel.append(action)
+            # acceleration actions
+            if self.batch_controller is not None:
+                accel = self.batch_controller.get_actions(self)
+            else:
+                accel = [self.vehicles.get_acc_controller(veh_id).get_action(
+                    self) for veh_id in self.controlled_ids]
 
-                # lane changing action
-                lane_flag = 0
-                if type(self.scenario.lanes) is dict:
-                    if any(v > 1 for v in self.scenario.lanes.values()):
-                        lane_flag = 1
-                else:
-                    if self.scenario.lanes > 1:
-                        lane_flag = 1
+            self.apply_acceleration(self.controlled_ids, acc=accel)
 
+        if profiler is not None:
+            profiler.lap("controllers")
+
+        if len(self.controlled_ids) > 0:
+            # lane changing actions
+            lane_flag = 0
+            if type(self.scenario.lanes) is dict:
+                if any(v > 1 for v in self.scenario.lanes.values()):
+                    lane_flag = 1
+            else:
+                if self.scenario.lanes > 1:
+                    lane_flag = 1
+
+            for veh_id in self.controlled_ids:
                 if self.vehicles.get_lane_changing_controller(veh_id) \
                         is not None and lane_flag:
                     new_lane = \
@@ -342,8 +437,6 @@ class SumoEnvironment(gym.Env, Serializable):
                             veh_id).get_action(self)
                     self.apply_lane_change([veh_id], target_lane=[new_lane])
 
-            self.apply_acceleration(self.controlled_ids, acc=accel)
-
         # perform (optionally) lane change actions for sumo-controlled
         # human-driven vehicles
         if len(self.sumo_ids) > 0:
@@ -356,6 +449,9 @@ class SumoEnvironment(gym.Env, Serializable):
                         new_lane = lc_contr.get_action(self)
                         self.apply_lane_change([veh_id], target_lane=[new_lane])
 
+        if profiler is not None:
+            profiler.lap("lane_changes")
+
         # perform (optionally) routing actions for all vehicle in the network,
         # including rl vehicles
         routing_ids = []
@@ -368,73 +464,65 @@ class SumoEnvironment(gym.Env, Serializable):
 
         self.choose_routes(veh_ids=routing_ids, route_choices=routing_actions)
 
+        if profiler is not None:
+            profiler.lap("routing")
+
         self.apply_rl_actions(rl_actions)
 
+        if profiler is not None:
+            profiler.lap("rl_actions")
+
         self.additional_command()
 
+        if profiler is not None:
+            profiler.lap("additional_command")
+
         self.traci_connection.simulationStep()
+        logging.debug(" %d commands issued in %d round-trips with sumo",
+                      self.command_batcher.num_commands,
+                      self.command_batcher.round_trips)
+
+        if profiler is not None:
+            profiler.lap("simulation_step")
+
+        # add the vehicles that entered the network during the step, and remove
+        # the ones that left it
+        if self.dynamic_vehicles:
+            self.update_vehicle_set()
 
         # store new observations in the network after traci simulation step
-        network_observations = \
-            self.traci_connection.vehicle.getSubscriptionResults()
-        crash = False
-        for veh_id in self.ids:
-            prev_pos = self.get_x_by_id(veh_id)
-            prev_lane = self.vehicles.get_lane(veh_id)
-            try:
-                self.vehicles.set_position(
-                    veh_id, network_observations[veh_id][tc.VAR_LANEPOSITION])
-            except KeyError:
-                continue
-            self.vehicles.set_edge(
-                veh_id, network_observations[veh_id][tc.VAR_ROAD_ID])
-            self.vehicles.set_lane(
-                veh_id, network_observations[veh_id][tc.VAR_LANE_INDEX])
-            if network_observations[veh_id][tc.VAR_LANE_INDEX] != prev_lane \
-                    and veh_id in self.rl_ids:
-                self.vehicles.set_state(veh_id, "last_lc", self.timer)
-            self.vehicles.set_speed(
-                veh_id, network_observations[veh_id][tc.VAR_SPEED])
+        network_observations = self.get_network_observations()
 
-            try:
-                try:
-                    change = self.get_x_by_id(veh_id) - prev_pos
-                except:
-                    print(veh_id, prev_pos, self.vehicles.get_edge(veh_id), self.vehicles.get_position(veh_id))
-                if change < 0:
-                    change += self.scenario.length
-                new_abs_pos = self.vehicles.get_absolute_position(
-                    veh_id) + change
-                self.vehicles.set_absolute_position(veh_id, new_abs_pos)
-            except ValueError or TypeError:
-                self.vehicles.set_absolute_position(veh_id, -1001)
-
-            if self.vehicles.get_position(veh_id) < 0 or \
-                            self.vehicles.get_speed(veh_id) < 0:
-                crash = True
+        # crash encodes whether sumo experienced a crash
+        simulation = self.traci_connection.simulation
+        crash = self.update_vehicle_states(network_observations) \
+            or simulation.getEndingTeleportNumber() != 0 \
+            or simulation.getStartingTeleportNumber() != 0
 
-            # collect headway, leader id, and follower id data
-            headway_data = \
-                self.get_headway_dict(network_observations=network_observations)
+        if profiler is not None:
+            profiler.lap("subscriptions")
 
-            for veh_id in self.ids:
-                try:
-                    self.vehicles.set_headway(
-                        veh_id, headway_data[veh_id]["headway"])
-                    self.vehicles.set_leader(
-                        veh_id, headway_data[veh_id]["leader"])
-                    self.vehicles.set_follower(
-                        veh_id, headway_data[veh_id]["follower"])
-                except KeyError:
-                    # occurs in the case of crashes, so headway is assumed to
-                    # be very small
-                    self.vehicles.set_headway(veh_id, 1e-3)
-                    self.vehicles.set_leader(veh_id, None)
-                    self.vehicles.set_follower(veh_id, None)
+        # collect headway, leader id, and follower id data
+        self.update_headways(network_observations)
+
+        if profiler is not None:
+            profiler.lap("headways")
 
         # collect list of sorted vehicle ids
         self.sorted_ids, self.sorted_extra_data = self.sort_by_position()
 
+        # the lane index is rebuilt from the new positions when next needed
+        self._lane_index = None
+
+        if profiler is not None:
+            profiler.lap("sort_by_position")
+
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.record(self, rl_actions)
+
+            if profiler is not None:
+                profiler.lap("recording")
+
         # collect information of the state of the network based on the
         # environment class used
         if self.vehicles.num_rl_vehicles > 0:
@@ -449,11 +537,8 @@ class SumoEnvironment(gym.Env, Serializable):
 
         next_observation = list(self.state)
 
-        # crash encodes whether sumo experienced a crash
-        crash = \
-            crash \
-            or self.traci_connection.simulation.getEndingTeleportNumber() != 0 \
-            or self.traci_connection.simulation.getStartingTeleportNumber() != 0
+        if profiler is not None:
+            profiler.lap("get_state")
 
         # compute the reward
         if self.vehicles.num_rl_vehicles > 0:
@@ -461,6 +546,10 @@ class SumoEnvironment(gym.Env, Serializable):
         else:
             reward = 0
 
+        if profiler is not None:
+            profiler.lap("compute_reward")
+            profiler.end_step()
+
         # Are we in a multi-agent scenario? If so, the action space is a list.
         if self.multi_agent:
             done_n = self.vehicles.num_rl_vehicles * [0]
@@ -505,6 +594,19 @@ class SumoEnvironment(gym.Env, Serializable):
             the initial observation of the space. The initial reward is assumed
             to be zero.
         """
+        # write the trajectories recorded during the previous rollout
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.flush()
+
+        # write the trace of the steps of the previous rollout
+        if self.step_profiler is not None:
+            self.step_profiler.flush()
+
+        # return to the vehicles that were in the network at the start of the
+        # first rollout
+        if self.dynamic_vehicles:
+            self.restore_initial_vehicles()
+
         # reset the lists of the ids of vehicles in the network
         self.ids = self.vehicles.get_ids()
         self.controlled_ids = self.vehicles.get_controlled_ids()
@@ -586,14 +688,66 @@ class SumoEnvironment(gym.Env, Serializable):
         # reset the list of sorted vehicle ids
         self.sorted_ids, self.sorted_extra_data = self.sort_by_position()
 
+        # the lane index is rebuilt from the new positions when next needed
+        self._lane_index = None
+
+        # clear controller acceleration queue of traci-controlled vehicles
+        if self.batch_controller is not None:
+            self.batch_controller.reset_delay(self)
+        else:
+            for veh_id in self.controlled_ids:
+                self.vehicles.get_acc_controller(veh_id).reset_delay(self)
+
+        # snapshots of the simulation only contain the initial arrangement of
+        # the vehicles, and cannot be used if the arrangement is shuffled
+        if self.reset_mode == "state" and not \
+                (self.starting_position_shuffle or
+                 self.vehicle_arrangement_shuffle):
+            self.load_initial_state()
+        else:
+            self.readd_vehicles()
+
+        if self.multi_agent:
+            self.state = self.get_state()
+        else:
+            self.state = self.get_state().T
+
+        observation = list(self.state)
+        return observation
+
+    def load_initial_state(self):
+        """
+        Returns all vehicles to their initial states by loading the snapshot of
+        the simulation saved in setup_initial_state.
+        """
+        self.traci_connection.simulation.loadState(self.state_file)
+
+        # vehicles are re-created by sumo when a state is loaded, and the
+        # modes set with traci are re-issued. These commands do not return a
+        # value, and are all sent in a single message
+        for veh_id in self.ids:
+            self.command_batcher.defer(
+                self.traci_connection.vehicle.setColor,
+                veh_id, self.colors[self.vehicles.get_state(veh_id, 'type')])
+            self.command_batcher.defer(
+                self.traci_connection.vehicle.setMaxSpeed,
+                veh_id, self.max_speed)
+            self.command_batcher.defer(self.set_speed_mode, veh_id)
+            self.command_batcher.defer(self.set_lane_change_mode, veh_id)
+        self.command_batcher.flush()
+
+        leader_index, headway = self.initial_headway_data
+        self.vehicles.set_headway_data(leader_index.copy(), headway.copy())
+
+    def readd_vehicles(self):
+        """
+        Returns all vehicles to their initial states by removing them from the
+        network and adding them back with the states in self.initial_state.
+        """
         for veh_id in self.ids:
             type_id, route_id, lane_index, lane_pos, speed, pos = \
                 self.initial_state[veh_id]
 
-            # clear controller acceleration queue of traci-controlled vehicles
-            if veh_id in self.controlled_ids:
-                self.vehicles.get_acc_controller(veh_id).reset_delay(self)
-
             # clear vehicles from traci connection and re-introduce vehicles
             # with pre-defined initial position
             try:
@@ -634,13 +788,138 @@ class SumoEnvironment(gym.Env, Serializable):
                 self.vehicles.set_headway(veh_id, headway[1])
                 self.vehicles.set_follower(headway[0], veh_id)
 
-        if self.multi_agent:
-            self.state = self.get_state()
-        else:
-            self.state = self.get_state().T
+    def get_current_time(self):
+        """
+        Returns the simulation time as of the last simulation step, from the
+        subscription to the variables of the simulation, without sending a
+        message to sumo (unless no step was performed since the
+        subscription).
 
-        observation = list(self.state)
-        return observation
+        Returns
+        -------
+        int
+            simulation time, in ms
+        """
+        results = self.traci_connection.simulation.getSubscriptionResults()
+        if not results or tc.VAR_TIME_STEP not in results:
+            return self.traci_connection.simulation.getCurrentTime()
+        return results[tc.VAR_TIME_STEP]
+
+    def update_vehicle_set(self):
+        """
+        Adds the vehicles that departed during the last simulation step to the
+        vehicles class, and removes the vehicles that arrived, as reported by
+        the subscription to the departed and arrived vehicles of sumo.
+        """
+        results = self.traci_connection.simulation.getSubscriptionResults()
+        if not results:
+            return
+
+        arrived = [veh_id for veh_id in results[tc.VAR_ARRIVED_VEHICLES_IDS]
+                   if veh_id in self.vehicles]
+
+        # vehicles may depart and arrive during the same step
+        departed = set(results[tc.VAR_DEPARTED_VEHICLES_IDS]) - \
+            set(results[tc.VAR_ARRIVED_VEHICLES_IDS])
+        departed = [veh_id for veh_id in results[tc.VAR_DEPARTED_VEHICLES_IDS]
+                    if veh_id in departed and veh_id not in self.vehicles]
+        if len(arrived) == 0 and len(departed) == 0:
+            return
+
+        new_index = self.vehicles.remove(arrived)
+        for veh_id in arrived:
+            del self.prev_last_lc[veh_id]
+
+        for veh_id in departed:
+            self.add_departed_vehicle(veh_id)
+
+        self.reindex_vehicles(new_index)
+
+    def add_departed_vehicle(self, veh_id):
+        """
+        Adds a vehicle that entered the network to the vehicles class, with
+        its current states. Vehicles of types that are not in the vehicles
+        class are controlled by sumo.
+
+        Parameters
+        ----------
+        veh_id: str
+            vehicle identifier
+        """
+        vehicle = self.traci_connection.vehicle
+        veh_type = vehicle.getTypeID(veh_id)
+        if veh_type not in self.vehicles.types:
+            self.vehicles.add_vehicles(veh_type, (SumoController, {}),
+                                       num_vehicles=0)
+        if veh_type not in self.colors:
+            self.colors[veh_type] = COLORS[len(self.colors) % len(COLORS)]
+        self.vehicles.add(veh_id, veh_type)
+
+        self.vehicles.set_edge(veh_id, vehicle.getRoadID(veh_id))
+        self.vehicles.set_position(veh_id, vehicle.getLanePosition(veh_id))
+        self.vehicles.set_lane(veh_id, vehicle.getLaneIndex(veh_id))
+        self.vehicles.set_speed(veh_id, vehicle.getSpeed(veh_id))
+        self.vehicles.set_route(veh_id, vehicle.getRoute(veh_id))
+        self.vehicles.set_absolute_position(veh_id, self.get_x_by_id(veh_id))
+        self.vehicles.set_state(veh_id, "last_lc",
+                                -1 * self.lane_change_duration)
+        self.vehicles.set_state(veh_id, "length", vehicle.getLength(veh_id))
+        self.vehicles.set_state(veh_id, "max_speed", self.max_speed)
+        self.prev_last_lc[veh_id] = self.vehicles.get_state(veh_id, "last_lc")
+
+        # these commands do not return a value, and are sent to sumo with the
+        # next simulation step
+        self.command_batcher.defer(vehicle.setColor, veh_id,
+                                   self.colors[veh_type])
+        self.command_batcher.defer(self.set_speed_mode, veh_id)
+        self.command_batcher.defer(self.set_lane_change_mode, veh_id)
+
+        # subscriptions return a response, and cannot be deferred
+        if self.subscription_mode == "vehicle":
+            vehicle.subscribe(veh_id, [tc.VAR_LANE_INDEX, tc.VAR_LANEPOSITION,
+                                       tc.VAR_ROAD_ID, tc.VAR_SPEED])
+            vehicle.subscribeLeader(veh_id, 2000)
+
+    def restore_initial_vehicles(self):
+        """
+        Returns the vehicles class to the vehicles that were in the network at
+        the start of the first rollout, in their initial order, and removes
+        the vehicles that entered the network since then from sumo.
+        """
+        if self.ids == self.initial_ids:
+            return
+
+        for veh_id in self.ids:
+            if veh_id not in self.initial_state:
+                self.traci_connection.vehicle.remove(veh_id)
+        new_index = self.vehicles.remove(list(self.ids))
+
+        for veh_id in self.initial_ids:
+            self.vehicles.add(veh_id, self.initial_state[veh_id][0])
+            self.vehicles.set_state(
+                veh_id, "length", self.initial_observations[veh_id]["length"])
+            self.vehicles.set_state(veh_id, "max_speed", self.max_speed)
+
+        self.reindex_vehicles(new_index)
+
+    def reindex_vehicles(self, new_index):
+        """
+        Updates the ordering of the vehicles and the batched controllers,
+        which depend on the indices of the vehicles in the vehicles class,
+        after vehicles were added to or removed from the network. Vehicles
+        are only ever added after the remaining ones (see Vehicles.add and
+        Vehicles.remove).
+
+        Parameters
+        ----------
+        new_index: numpy array of int
+            new index of every vehicle previously in the network, or -1 if it
+            was removed (see Vehicles.remove)
+        """
+        self.ordering.reindex(self.ids, new_index)
+        if self.batch_controller is not None:
+            self.batch_controller.reindex(self.vehicles, self.controlled_ids,
+                                          new_index)
 
     def additional_command(self):
         """
@@ -673,37 +952,42 @@ class SumoEnvironment(gym.Env, Serializable):
         acc: numpy array or list of float
             requested accelerations from the vehicles
         """
-        for i, veh_id in enumerate(veh_ids):
-            acc_contr = self.vehicles.get_acc_controller(veh_id)
+        # the actions of rl vehicles in multi-agent environments are nested
+        if self.multi_agent:
+            rl_ids = set(self.rl_ids)
+            acc_arr = np.array([acc[i][0] if veh_id in rl_ids else acc[i]
+                                for i, veh_id in enumerate(veh_ids)],
+                               dtype=float)
+        else:
+            acc_arr = np.array(acc, dtype=float).reshape(len(veh_ids))
+
+        # the failsafes of all vehicles are computed at once (see the
+        # get_safe_action methods of BaseController for the scalar versions)
+        indices = self.vehicles.get_index(veh_ids)
+        speed = self.vehicles.get_speed()
+        this_vel = speed[indices]
+        if self.fail_safe in ['instantaneous', 'safe_velocity'] and \
+                self.vehicles.num_vehicles > 1:
+            leader = self.vehicles.get_leader_index()[indices]
+            headway = self.vehicles.get_headway()[indices]
             if self.fail_safe == 'instantaneous':
-                safe_acc = acc_contr.get_safe_action_instantaneous(self, acc[i])
-            elif self.fail_safe == 'safe_velocity':
-                safe_acc = acc_contr.get_safe_action(self, acc[i])
+                acc_arr = safe_action_instantaneous(
+                    acc_arr, this_vel, headway, leader >= 0, self.time_step)
             else:
-                # Test for multi-agent
-                if self.multi_agent and (veh_id in self.rl_ids):
-                    safe_acc = acc[i][0]
-                else:
-                    safe_acc = acc[i]
-
-            if self.multi_agent and (veh_id in self.rl_ids):
-                acc[i][0] = safe_acc
-            else:
-                acc[i] = safe_acc
+                delay = np.array(
+                    [contr.delay for contr in
+                     self.vehicles.get_acc_controller(veh_ids)], dtype=float)
+                acc_arr = safe_velocity_action(
+                    acc_arr, this_vel, np.append(speed, np.nan)[leader],
+                    headway, delay, leader >= 0, self.time_step)
 
         # issue traci command for requested acceleration
-        this_vel = np.array(self.vehicles.get_speed(veh_ids))
-        if self.multi_agent and (veh_id in self.rl_ids):
-            acc_arr = np.asarray([element2 for elem in acc for element in elem
-                                  for element2 in element])
-        else:
-            acc_arr = np.array(acc)
-
         requested_next_vel = this_vel + acc_arr * self.time_step
         actual_next_vel = requested_next_vel.clip(min=0)
 
         for i, vid in enumerate(veh_ids):
-            self.traci_connection.vehicle.slowDown(vid, actual_next_vel[i], 1)
+            self.command_batcher.defer(self.traci_connection.vehicle.slowDown,
+                                       vid, actual_next_vel[i], 1)
 
     def apply_lane_change(self, veh_ids, direction=None, target_lane=None):
         """
@@ -757,12 +1041,13 @@ class SumoEnvironment(gym.Env, Serializable):
         for i, vid in enumerate(veh_ids):
             if vid in self.rl_ids:
                 if target_lane[i] != current_lane[i]:
-                    self.traci_connection.vehicle.changeLane(vid, int(
-                        target_lane[i]), 100000)
+                    self.command_batcher.defer(
+                        self.traci_connection.vehicle.changeLane, vid,
+                        int(target_lane[i]), 100000)
             else:
-                self.traci_connection.vehicle.changeLane(vid,
-                                                         int(target_lane[i]),
-                                                         100000)
+                self.command_batcher.defer(
+                    self.traci_connection.vehicle.changeLane, vid,
+                    int(target_lane[i]), 100000)
 
     def choose_routes(self, veh_ids, route_choices):
         """
@@ -779,7 +1064,8 @@ class SumoEnvironment(gym.Env, Serializable):
         """
         for i, veh_id in enumerate(veh_ids):
             if route_choices[i] is not None:
-                self.traci_connection.vehicle.setRoute(
+                self.command_batcher.defer(
+                    self.traci_connection.vehicle.setRoute,
                     vehID=veh_id, edgeList=route_choices[i])
                 self.vehicles.set_route(veh_id, route_choices[i])
 
@@ -858,26 +1144,132 @@ class SumoEnvironment(gym.Env, Serializable):
 
         Parameters
         ----------
-        veh_id: string
-            vehicle identifier
+        veh_id: string or list of strings
+            vehicle identifier(s)
 
         Yields
         ------
-        float
-            position of a vehicle relative to a certain reference.
+        float or numpy array of float
+            position of a vehicle (or vehicles) relative to a certain
+            reference.
         """
+        if isinstance(veh_id, (list, tuple, np.ndarray)):
+            edges = self.vehicles.get_edge(veh_id)
+            x = self.scenario.get_x_array(
+                edges, self.vehicles.get_position(veh_id))
+            # occurs when a vehicle crashes is teleported for some other reason
+            x[np.array([edge == '' for edge in edges], dtype=bool)] = 0.
+            return x
+
         if self.vehicles.get_edge(veh_id) == '':
             # occurs when a vehicle crashes is teleported for some other reason
             return 0.
         return self.scenario.get_x(self.vehicles.get_edge(veh_id),
                                    self.vehicles.get_position(veh_id))
 
+    @property
+    def lane_index(self):
+        """
+        Spatial index of the vehicles in each lane, built from the positions
+        and lanes of the vehicles at the current step (see
+        flow/core/lane_index.py). The index is only built once per step, the
+        first time it is needed.
+        """
+        if self._lane_index is None:
+            x = np.mod(np.nan_to_num(self.get_x_by_id(self.ids)),
+                       self.scenario.length) if self.ids else []
+            self._lane_index = LaneIndex(self.ids, x, self.vehicles.get_lane(),
+                                         self.scenario.length)
+        return self._lane_index
+
+    def get_leading_car(self, veh_id, lane=None):
+        """
+        Returns the id of the vehicle ahead of a vehicle in a given lane.
+
+        Parameters
+        ----------
+        veh_id: str
+            vehicle identifier
+        lane: int, optional
+            lane index, defaults to the current lane of the vehicle
+
+        Returns
+        -------
+        str
+            id of the leading vehicle, or None if the lane does not contain
+            any other vehicle
+        """
+        if lane is None:
+            lane = self.vehicles.get_lane(veh_id)
+        return self.lane_index.get_leader(veh_id, lane)
+
+    def get_trailing_car(self, veh_id, lane=None):
+        """
+        Returns the id of the vehicle behind a vehicle in a given lane.
+
+        Parameters
+        ----------
+        veh_id: str
+            vehicle identifier
+        lane: int, optional
+            lane index, defaults to the current lane of the vehicle
+
+        Returns
+        -------
+        str
+            id of the trailing vehicle, or None if the lane does not contain
+            any other vehicle
+        """
+        if lane is None:
+            lane = self.vehicles.get_lane(veh_id)
+        return self.lane_index.get_follower(veh_id, lane)
+
+    def get_cars(self, veh_id, dxBack, dxForward, lane=None):
+        """
+        Returns the ids of the vehicles in a given lane located within some
+        distance of a vehicle.
+
+        Parameters
+        ----------
+        veh_id: str
+            vehicle identifier
+        dxBack: float
+            distance behind the vehicle
+        dxForward: float
+            distance ahead of the vehicle
+        lane: int, optional
+            lane index, defaults to the current lane of the vehicle
+
+        Returns
+        -------
+        list of str
+            ids of the vehicles in the range (excluding veh_id), from back to
+            front
+        """
+        if lane is None:
+            lane = self.vehicles.get_lane(veh_id)
+        return self.lane_index.get_range(veh_id, lane, dxBack, dxForward)
+
+    @property
+    def sorted_index(self):
+        """
+        Indices of the vehicles in sorted_ids within self.ids (and the state
+        arrays of the vehicles class), for sort_by_position methods that use
+        self.ordering.
+        """
+        return self.ordering.sorted_index
+
     def sort_by_position(self):
         """
         Sorts the vehicle ids of vehicles in the network by position.
         The base environment does this by sorting vehicles by their absolute
         position, as specified by the "get_x_by_id" function.
 
+        The order is maintained by self.ordering (see flow/core/ordering.py),
+        which only repairs the order of the previous step. Sub-classes
+        sorting vehicles differently may do the same by passing their own
+        keys (and groups) to self.ordering.update.
+
         Returns
         -------
         sorted_ids: list
@@ -887,52 +1279,169 @@ class SumoEnvironment(gym.Env, Serializable):
             data, such as positions. If no extra component is needed, a value
             of None should be returned
         """
-        sorted_indx = np.argsort(self.vehicles.get_absolute_position(self.ids))
-        sorted_ids = np.array(self.ids)[sorted_indx]
-        return sorted_ids, None
+        self.ordering.update(self.vehicles.get_absolute_position())
+        return self.ordering.get_sorted_ids(), None
 
-    def get_headway_dict(self, network_observations):
+    def get_network_observations(self):
         """
-        Collects the headways, leaders, and followers of all vehicles at once.
-        The base environment does by using traci calls.
+        Collects the subscribed states of all vehicles in the network.
+
+        Returns
+        -------
+        dictionary
+            key = vehicle IDs
+            elements = variable state properties of the vehicle
+        """
+        if self.subscription_mode == "context":
+            return self.traci_connection.junction.\
+                getContextSubscriptionResults(self.context_junction) or {}
+        else:
+            return self.traci_connection.vehicle.getSubscriptionResults()
+
+    def update_vehicle_states(self, network_observations):
+        """
+        Stores the observed positions, edges, lanes, and speeds of vehicles in
+        the vehicles class, and updates their absolute positions. Vehicles
+        without observations (e.g. vehicles that crashed) keep their previous
+        states.
 
         Parameters
         ----------
         network_observations: dictionary
             key = vehicle IDs
-            elements = variable state properties of the vehicle (including
-            headway)
+            elements = variable state properties of the vehicle
 
-        Yields
-        ------
-        dictionary
+        Returns
+        -------
+        bool
+            True if a vehicle is observed at a negative position or speed,
+            which occurs in the case of crashes
+        """
+        ids = [veh_id for veh_id in self.ids if veh_id in network_observations]
+        if len(ids) == 0:
+            return False
+        observations = [network_observations[veh_id] for veh_id in ids]
+
+        prev_x = self.get_x_by_id(ids)
+        prev_lane = self.vehicles.get_lane(ids)
+
+        position = np.array([obs[tc.VAR_LANEPOSITION] for obs in observations])
+        lane = np.array([obs[tc.VAR_LANE_INDEX] for obs in observations])
+        speed = np.array([obs[tc.VAR_SPEED] for obs in observations])
+        self.vehicles.set_position(ids, position)
+        self.vehicles.set_lane(ids, lane)
+        self.vehicles.set_speed(ids, speed)
+        for veh_id, obs in zip(ids, observations):
+            self.vehicles.set_edge(veh_id, obs[tc.VAR_ROAD_ID])
+
+        # store the time of lane changes performed by rl vehicles
+        rl_ids = set(self.rl_ids)
+        changed_lanes = [veh_id for i, veh_id in enumerate(ids)
+                         if lane[i] != prev_lane[i] and veh_id in rl_ids]
+        if len(changed_lanes) > 0:
+            self.vehicles.set_state(changed_lanes, "last_lc", self.timer)
+
+        # update the absolute positions of vehicles from the distance they
+        # traveled since the last step. Vehicles whose position cannot be
+        # computed are given an absolute position of -1001
+        x = self.get_x_by_id(ids)
+        change = x - prev_x
+        change[change < 0] += self.scenario.length
+        absolute_position = self.vehicles.get_absolute_position(ids) + change
+        absolute_position[np.isnan(change)] = -1001
+        self.vehicles.set_absolute_position(ids, absolute_position)
+
+        return bool(np.any(position < 0) or np.any(speed < 0))
+
+    def update_headways(self, network_observations):
+        """
+        Updates the headways, leaders, and followers of all vehicles at once.
+        The base environment does this by reading the leader subscriptions of
+        all vehicles in a single pass (or, if the "context" subscription mode
+        is used in a single ring road, by sorting vehicles in each lane by
+        position), and then
+        deriving the followers of all vehicles from their leaders.
+
+        Vehicles without a leader, or without observations (e.g. at the very
+        first time step after a reset, or in the case of crashes), are assumed
+        to have a very small headway.
+
+        Parameters
+        ----------
+        network_observations: dictionary
             key = vehicle IDs
-            elements = headway, leader id, and follower id for the vehicle
+            elements = variable state properties of the vehicle (including
+            headway)
         """
-        vehicles = dict.fromkeys(self.ids)
+        leader_index = -np.ones(self.vehicles.num_vehicles, dtype=int)
+        headway = 1e-3 * np.ones(self.vehicles.num_vehicles)
+
+        if self.subscription_mode == "context":
+            # leaders are not subscribed in this mode, and are instead
+            # computed from the positions of the observed vehicles
+            observed = np.array([veh_id in network_observations
+                                 for veh_id in self.ids], dtype=bool)
+            indices = np.flatnonzero(observed)
+            x = self.get_x_by_id([self.ids[i] for i in indices])
+            lengths = np.array(self.vehicles.get_state("all", "length"),
+                               dtype=float)[indices]
+            leader, gap = get_loop_leaders(
+                np.mod(np.nan_to_num(x), self.scenario.length),
+                self.vehicles.get_lane()[indices], lengths,
+                self.scenario.length)
+            has_leader = leader >= 0
+            leader_index[indices[has_leader]] = indices[leader[has_leader]]
+            headway[indices[has_leader]] = gap[has_leader]
+            self.vehicles.set_headway_data(leader_index, headway)
+            return
+
+        for i, veh_id in enumerate(self.ids):
+            try:
+                leader = network_observations[veh_id][tc.VAR_LEADER]
+            except KeyError:
+                continue
 
-        for veh_id in self.ids:
-            vehicles[veh_id] = dict()
+            if leader is None or not leader[0]:
+                continue
 
-        for veh_id in self.ids:
             try:
-                headway = network_observations[veh_id][tc.VAR_LEADER]
-                if headway is None:
-                    vehicles[veh_id]["leader"] = None
-                    vehicles[veh_id]["follower"] = None
-                    vehicles[veh_id]["headway"] = 1e-3
-                else:
-                    vehicles[veh_id]["headway"] = headway[1]
-                    vehicles[veh_id]["leader"] = headway[0]
-                    vehicles[headway[0]]["follower"] = veh_id
+                leader_index[i] = self.vehicles.get_index(leader[0])
             except KeyError:
-                # this is used to deal with the absence of network observations
-                # upon reset. It only applies for the very first time step
-                vehicles[veh_id]["leader"] = None
-                vehicles[veh_id]["follower"] = None
-                vehicles[veh_id]["headway"] = 1e-3
+                # the leader is not a vehicle in the network
+                continue
+            headway[i] = leader[1]
 
-        return vehicles
+        self.vehicles.set_headway_data(leader_index, headway)
+
+    def get_step_profile(self, percentiles=(50, 90, 99)):
+        """
+        Returns percentiles of the time spent in every phase of the last steps
+        of the environment. Steps are only profiled if step_profile (or
+        step_trace_path) is set in sumo_params.
+
+        Parameters
+        ----------
+        percentiles: list of float, optional
+            percentiles to compute, between 0 and 100
+
+        Returns
+        -------
+        collections.OrderedDict
+            key = phase of a step (see flow.core.profiler.PHASES), or "step"
+            for the entire step
+            value = numpy array of the percentiles of the durations of the
+            phase, in s
+
+        Raises
+        ------
+        ValueError
+            If the steps of the environment are not profiled.
+        """
+        if self.step_profiler is None:
+            raise ValueError("The steps of the environment are not profiled. "
+                             "Set step_profile in sumo_params to profile "
+                             "them.")
+        return self.step_profiler.get_profile(percentiles)
 
     def get_state(self):
         """
@@ -1003,10 +1512,14 @@ class SumoEnvironment(gym.Env, Serializable):
         experiment. Must be in Environment because the environment opens the
         TraCI connection.
         """
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.flush()
+        if self.step_profiler is not None:
+            self.step_profiler.flush()
         self._close()
 
     def _close(self):
-        self.traci_connection.close()
+        self.sim_backend.close(self.traci_connection)
 
     def _seed(self, seed=None):
         return []
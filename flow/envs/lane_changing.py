@@ -63,9 +63,8 @@ class SimpleLaneChangingAccelerationEnvironment(SumoEnvironment):
 
         # punish excessive lane changes by reducing the reward by a set value
         # every time an rl car changes lanes
-        for veh_id in self.rl_ids:
-            if self.vehicles.get_state(veh_id, "last_lc") == self.timer:
-                reward -= 1
+        reward += rewards.punish_rl_lane_changes(self.vehicles, self.rl_ids,
+                                                 self.timer)
 
         return reward
 
@@ -76,10 +75,9 @@ class SimpleLaneChangingAccelerationEnvironment(SumoEnvironment):
         The state is an array the velocities, absolute positions, and lane
         numbers for each vehicle.
         """
-        return np.array([[self.vehicles.get_speed(veh_id),
-                          self.vehicles.get_absolute_position(veh_id),
-                          self.vehicles.get_lane(veh_id)]
-                         for veh_id in self.sorted_ids])
+        return np.array([self.vehicles.get_speed(self.sorted_ids),
+                         self.vehicles.get_absolute_position(self.sorted_ids),
+                         self.vehicles.get_lane(self.sorted_ids)]).T
 
     def apply_rl_actions(self, actions):
         """
@@ -155,7 +153,7 @@ class LaneChangeOnlyEnvironment(SimpleLaneChangingAccelerationEnvironment):
 
         # represents vehicles that are allowed to change lanes
         non_lane_changing_veh = \
-            [self.timer <= self.lane_change_duration + self.vehicles[veh_id]['last_lc']
+            [self.timer <= self.lane_change_duration + self.vehicles.get_state(veh_id, 'last_lc')
              for veh_id in sorted_rl_ids]
         # vehicle that are not allowed to change have their directions set to 0
         direction[non_lane_changing_veh] = np.array([0] * sum(non_lane_changing_veh))
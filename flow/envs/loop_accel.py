@@ -68,14 +68,12 @@ class SimpleAccelerationEnvironment(SumoEnvironment):
         The state is an array of velocities and absolute positions for each
         vehicle
         """
-        scaled_pos = [self.vehicles.get_absolute_position(veh_id) /
-                      self.scenario.length for veh_id in self.sorted_ids]
-        scaled_vel = [self.vehicles.get_speed(veh_id) /
-                      self.env_params.get_additional_param("target_velocity")
-                      for veh_id in self.sorted_ids]
+        scaled_pos = self.vehicles.get_absolute_position(self.sorted_ids) / \
+            self.scenario.length
+        scaled_vel = self.vehicles.get_speed(self.sorted_ids) / \
+            self.env_params.get_additional_param("target_velocity")
 
-        return np.array([[scaled_vel[i], scaled_pos[i]]
-                         for i in range(len(self.sorted_ids))])
+        return np.array([scaled_vel, scaled_pos]).T
 
 
 class SimpleMultiAgentAccelerationEnvironment(SimpleAccelerationEnvironment):
@@ -104,7 +102,7 @@ class SimpleMultiAgentAccelerationEnvironment(SimpleAccelerationEnvironment):
         """
         See parent class
         """
-        num_vehicles = self.scenario.num_vehicles
+        num_vehicles = self.vehicles.num_vehicles
         observation_space = []
         speed = Box(low=0, high=np.inf, shape=(num_vehicles,))
         absolute_pos = Box(low=0., high=np.inf, shape=(num_vehicles,))
@@ -127,17 +125,28 @@ class SimpleMultiAgentAccelerationEnvironment(SimpleAccelerationEnvironment):
         See parent class
         The state is an array the velocities and absolute positions for
         each vehicle.
+
+        All agents observe the same state, which is built once per step as a
+        single matrix of shape (2, num_vehicles). The states of the agents are
+        returned as an array of shape (num_agents, 2, num_vehicles) in which
+        each agent's state is a read-only view of this matrix, so that no copy
+        is made per agent (see get_agent_observations).
         """
-        obs_arr = []
-        for i in range(self.scenario.num_rl_vehicles):
-            speed = [self.vehicles.get_speed(veh_id)
-                     for veh_id in self.sorted_ids]
-            abs_pos = [self.vehicles.get_absolute_position(veh_id)
-                       for veh_id in self.sorted_ids]
-            tup = (speed, abs_pos)
-            obs_arr.append(tup)
+        observation = np.array(
+            [self.vehicles.get_speed(self.sorted_ids),
+             self.vehicles.get_absolute_position(self.sorted_ids)])
 
-        return obs_arr
+        return np.broadcast_to(
+            observation, (self.vehicles.num_rl_vehicles,) + observation.shape)
+
+    def get_agent_observations(self):
+        """
+        Returns the flattened observations of all agents at the current step,
+        as an array of shape (num_agents, obs_dim) suited to evaluating a
+        shared policy on all agents in a single batch. The array is a
+        read-only view of the observation matrix of the step (see get_state).
+        """
+        return self.state.reshape((len(self.state), -1))
 
 
 class SimplePartiallyObservableEnvironment(SimpleAccelerationEnvironment):
@@ -167,19 +176,21 @@ class SimplePartiallyObservableEnvironment(SimpleAccelerationEnvironment):
         rl vehicle and the vehicle ahead of it.
         """
         rl_id = self.rl_ids[0]
-        lead_id = self.vehicles[rl_id]["leader"]
+        lead_id = self.vehicles.get_leader(rl_id)
         max_speed = self.max_speed
 
         # if a vehicle crashes into the car ahead of it, it no longer processes
         # a lead vehicle
         if lead_id is None:
             lead_id = rl_id
-            self.vehicles[rl_id]["headway"] = 0
+            self.vehicles.set_headway(rl_id, 0)
+
+        this_speed = self.vehicles.get_speed(rl_id)
+        lead_speed = self.vehicles.get_speed(lead_id)
 
         observation = np.array([
-            [self.vehicles[rl_id]["speed"] / max_speed],
-            [(self.vehicles[lead_id]["speed"] - self.vehicles[rl_id]["speed"])
-             / max_speed],
-            [self.vehicles[rl_id]["headway"] / self.scenario.length]])
+            [this_speed / max_speed],
+            [(lead_speed - this_speed) / max_speed],
+            [self.vehicles.get_headway(rl_id) / self.scenario.length]])
 
         return observation
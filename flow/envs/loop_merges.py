@@ -66,10 +66,9 @@ class SimpleLoopMergesEnvironment(SumoEnvironment):
             elif edge_id[i] == 2:
                 sorted_pos[i] = sorted_pos[i] / self.scenario.merge_out_len
 
-        return np.array([[self.vehicles.get_speed(veh_id),
-                          sorted_pos[i],
-                          edge_id[i]]
-                         for i, veh_id in enumerate(self.sorted_ids)])
+        return np.array([self.vehicles.get_speed(self.sorted_ids),
+                         sorted_pos,
+                         edge_id]).T
 
     def additional_command(self):
         """
@@ -95,7 +94,9 @@ class SimpleLoopMergesEnvironment(SumoEnvironment):
             # perform rerouting and update vehicle's perception of its route
             if route is not None:
                 self.vehicles.set_route(veh_id, route)
-                self.traci_connection.vehicle.setRoute(vehID=veh_id, edgeList=route)
+                self.command_batcher.defer(
+                    self.traci_connection.vehicle.setRoute,
+                    vehID=veh_id, edgeList=route)
 
     def sort_by_position(self, **kwargs):
         """
@@ -108,64 +109,55 @@ class SimpleLoopMergesEnvironment(SumoEnvironment):
         Vehicles are sorted by position on the ring, then the in-merge, and
         finally the out-merge.
         """
-        if self.scenario.merge_out_len is not None:
-            pos = [[], [], []]
-        else:
-            pos = [[], []]
-
-        for veh_id in self.ids:
-            this_edge = self.vehicles.get_edge(veh_id)
-            this_pos = self.vehicles.get_position(veh_id)
-
+        merge_out = self.scenario.merge_out_len is not None
+        ring_0_n = ":ring_0_%d" % self.scenario.lanes
+        ring_1_n = ":ring_1_%d" % self.scenario.lanes
+
+        # section of the network (0 for the ring, 1 for the in-merge, and 2
+        # for the out-merge) of the vehicles on each edge, and offset of their
+        # positions from the start of the section (vehicles on other edges
+        # are not sorted)
+        edges = self.vehicles.get_edge(self.ids)
+        sections = dict()
+        for edge in set(edges):
             # the position of vehicles on the ring is their relative position
             # from the intersection with the merge-in
-            if this_edge in ["ring_0", "ring_1"] or \
-                    ":ring_0_%d" % self.scenario.lanes in this_edge or \
-                    (":ring_1_%d" % self.scenario.lanes in this_edge and
-                        self.scenario.merge_out_len is not None) or \
-                    (":ring_1_0" in this_edge and
-                        self.scenario.merge_out_len is None):
-                pos[0].append(
-                    (veh_id, self.vehicles.get_absolute_position(veh_id)
-                     % self.scenario.length))
+            if edge in ["ring_0", "ring_1"] or ring_0_n in edge or \
+                    (ring_1_n in edge and merge_out) or \
+                    (":ring_1_0" in edge and not merge_out):
+                sections[edge] = (0, 0)
 
             # the position of vehicles in the merge-in / merge-out are their
-            # relative position
-            # from the start of the respective merge
-            elif this_edge == "merge_in" or ":ring_0_0" in this_edge:
-                if this_edge != "merge_in":
-                    pos[1].append((veh_id, this_pos + self.scenario.merge_in_len))
-                else:
-                    pos[1].append((veh_id, this_pos))
-
-            elif this_edge == "merge_out" or \
-                    (":ring_1_0" in this_edge and
-                        self.scenario.merge_out_len is not None):
-                if this_edge == "merge_out":
-                    pos[2].append((veh_id, this_pos + self.scenario.ring_1_0_len))
-                else:
-                    pos[2].append((veh_id, this_pos))
-
-        sorted_ids = []
-        sorted_pos = []
-        for i in range(len(pos)):
-            pos[i].sort(key=lambda tup: tup[1])
-            if i == 0:
-                sorted_ids += [tup[0] for tup in pos[i]]
-                sorted_pos += [tup[1] % self.scenario.length for tup in pos[i]]
+            # relative position from the start of the respective merge
+            elif edge == "merge_in":
+                sections[edge] = (1, 0)
+            elif ":ring_0_0" in edge:
+                sections[edge] = (1, self.scenario.merge_in_len)
+
+            elif edge == "merge_out":
+                sections[edge] = (2, self.scenario.ring_1_0_len)
+            elif ":ring_1_0" in edge and merge_out:
+                sections[edge] = (2, 0)
+
             else:
-                sorted_ids += [tup[0] for tup in pos[i]]
-                sorted_pos += [tup[1] for tup in pos[i]]
+                sections[edge] = (-1, 0)
+
+        section = np.array([sections[edge][0] for edge in edges], dtype=int)
+        offset = np.array([sections[edge][1] for edge in edges], dtype=float)
+        ring_pos = np.mod(self.vehicles.get_absolute_position(),
+                          self.scenario.length)
+        pos = np.where(section == 0, ring_pos,
+                       self.vehicles.get_position() + offset)
 
-        edge_id = [0] * len(pos[0]) + [1] * len(pos[1])
-        if self.scenario.merge_out_len is not None:
-            edge_id += [2] * len(pos[2])
+        # vehicles are sorted by position on the ring, then the in-merge, and
+        # finally the out-merge
+        sorted_index = self.ordering.update(pos, groups=section)
 
         # the extra data in this case is a tuple of sorted positions and
         # route ids
-        sorted_extra_data = (sorted_pos, edge_id)
+        sorted_extra_data = (pos[sorted_index], section[sorted_index])
 
-        return sorted_ids, sorted_extra_data
+        return self.ordering.get_sorted_ids(), sorted_extra_data
 
     def apply_acceleration(self, veh_ids, acc):
         """
@@ -185,14 +177,16 @@ class SimpleLoopMergesEnvironment(SumoEnvironment):
                 # vehicles that are about to exit are stopped
                 if this_edge == "merge_out" and \
                         this_pos > self.scenario.merge_out_len - 10:
-                    self.traci_connection.vehicle.slowDown(veh_id, 0, 1)
+                    self.command_batcher.defer(
+                        self.traci_connection.vehicle.slowDown, veh_id, 0, 1)
                     i_called.append(i)
 
                 # vehicles in the merging lanes move at the target velocity
                 # (if one is defined)
                 elif "target_velocity" in self.env_params.additional_params and \
                         this_edge in ["merge_in", "merge_out"]:
-                    self.traci_connection.vehicle.slowDown(
+                    self.command_batcher.defer(
+                        self.traci_connection.vehicle.slowDown,
                         veh_id,
                         self.env_params.get_additional_param("target_velocity"),
                         duration=1
@@ -1,13 +1,13 @@
 import numpy as np
 from gym.spaces.box import Box
 from gym.spaces.tuple_space import Tuple
+from traci import constants as tc
 
 from flow.core import rewards
+from flow.core.traffic_lights import TrafficLightTracker
 from flow.envs.intersection_env import IntersectionEnvironment
 
 
-
-
 class TwoIntersectionEnvironment(IntersectionEnvironment):
     """
     Fully functional environment. Takes in an *acceleration* as an action. Reward function is negative norm of the
@@ -15,6 +15,16 @@ class TwoIntersectionEnvironment(IntersectionEnvironment):
     velocities for each vehicle.
     """
 
+    # lanes approaching the intersection
+    approach_lanes = ["altleft1_0", "altleft1_1", "altright1_0", "altright1_1",
+                      "altbottom1_0", "altbottom1_1", "alttop1_0", "alttop1_1"]
+
+    # lane whose length is used to compute the distance to the junction
+    junction_lane = "altleft1_0"
+
+    # id of the traffic light at the center of the network
+    traffic_light = "center"
+
     @property
     def action_space(self):
         """
@@ -71,6 +81,29 @@ class TwoIntersectionEnvironment(IntersectionEnvironment):
         """
         return rewards.desired_velocity(self, fail=kwargs["fail"])
 
+    def setup_initial_state(self):
+        """
+        See parent class
+
+        Also caches the (static) lengths of the lanes approaching the
+        intersection, and subscribes to the ids of the vehicles in these
+        lanes, which are then collected with a single subscription read per
+        step. The schedule of the traffic light is cached as well (see
+        flow/core/traffic_lights.py).
+        """
+        super(TwoIntersectionEnvironment, self).setup_initial_state()
+
+        self.lane_lengths = dict(
+            (lane_id, self.traci_connection.lane.getLength(lane_id))
+            for lane_id in self.approach_lanes)
+
+        for lane_id in self.approach_lanes:
+            self.traci_connection.lane.subscribe(
+                lane_id, [tc.LAST_STEP_VEHICLE_ID_LIST])
+
+        self.traffic_light_tracker = TrafficLightTracker(
+            self.traci_connection, self.traffic_light, self.approach_lanes)
+
     def get_state(self, **kwargs):
         """
         See parent class
@@ -80,230 +113,80 @@ class TwoIntersectionEnvironment(IntersectionEnvironment):
         length = self.scenario.net_params.additional_params["length"]
         enter_speed = self.scenario.initial_config.additional_params["enter_speed"]
 
-        # all lenths are equal
-        altleft_length = self.traci_connection.lane.getLength("altleft1_0")
-        altbottom_length = self.traci_connection.lane.getLength("altbottom1_0")
-        altright_length = self.traci_connection.lane.getLength("altright1_0")
-        alttop_length = self.traci_connection.lane.getLength("alttop1_0")
-
-        veh_ids_altleft1_0 = self.traci_connection.lane.getLastStepVehicleIDs("altleft1_0")
-        veh_ids_altleft1_1 = self.traci_connection.lane.getLastStepVehicleIDs("altleft1_1")
-        veh_ids_altright1_0 = self.traci_connection.lane.getLastStepVehicleIDs("altright1_0")
-        veh_ids_altright1_1 = self.traci_connection.lane.getLastStepVehicleIDs("altright1_1")
-        veh_ids_altbottom1_0 = self.traci_connection.lane.getLastStepVehicleIDs("altbottom1_0")
-        veh_ids_altbottom1_1 = self.traci_connection.lane.getLastStepVehicleIDs("altbottom1_1")
-        veh_ids_alttop1_0 = self.traci_connection.lane.getLastStepVehicleIDs("alttop1_0")
-        veh_ids_alttop1_1 = self.traci_connection.lane.getLastStepVehicleIDs("alttop1_1")
-
-        distanceToJunction = {}
-        no_leader= {}
-        no_follower = {}
-        remaining_green_light = {}
-        next_green_light = {}
-
-        for veh_id in self.sorted_ids:
-            no_leader[veh_id] = 0
-            no_follower[veh_id] = 0
-            remaining_green_light[veh_id]=0
-            next_green_light[veh_id] =0
-
-        no_leader,no_follower=self.calculateNoOfLeadersAndFollowers(veh_ids_altleft1_0, altleft_length,no_leader,no_follower)
-        no_leader,no_follower=self.calculateNoOfLeadersAndFollowers(veh_ids_altleft1_1, altleft_length,no_leader,no_follower)
-        no_leader,no_follower=self.calculateNoOfLeadersAndFollowers(veh_ids_altright1_0, altright_length,no_leader,no_follower)
-        no_leader,no_follower=self.calculateNoOfLeadersAndFollowers(veh_ids_altright1_1, altright_length,no_leader,no_follower)
-        no_leader,no_follower=self.calculateNoOfLeadersAndFollowers(veh_ids_altbottom1_0, altbottom_length,no_leader,no_follower)
-        no_leader,no_follower=self.calculateNoOfLeadersAndFollowers(veh_ids_altbottom1_1, altbottom_length,no_leader,no_follower)
-        no_leader,no_follower=self.calculateNoOfLeadersAndFollowers(veh_ids_alttop1_0, alttop_length,no_leader,no_follower)
-        no_leader,no_follower=self.calculateNoOfLeadersAndFollowers(veh_ids_alttop1_1, alttop_length,no_leader,no_follower)
-
-        remaining_green_light, next_green_light= self.phaseSelector1(veh_ids_altleft1_0, altleft_length,remaining_green_light,next_green_light)
-        remaining_green_light, next_green_light= self.phaseSelector1(veh_ids_altleft1_1, altleft_length,remaining_green_light,next_green_light)
-        remaining_green_light, next_green_light= self.phaseSelector1(veh_ids_altright1_0, altright_length,remaining_green_light,next_green_light)
-        remaining_green_light, next_green_light=self.phaseSelector1(veh_ids_altright1_1, altright_length,remaining_green_light,next_green_light)
-        remaining_green_light, next_green_light=self.phaseSelector2(veh_ids_altbottom1_0, altbottom_length,remaining_green_light,next_green_light)
-        remaining_green_light, next_green_light=self.phaseSelector2(veh_ids_altbottom1_1, altbottom_length,remaining_green_light,next_green_light)
-        remaining_green_light, next_green_light=self.phaseSelector2(veh_ids_alttop1_0, alttop_length,remaining_green_light,next_green_light)
-        remaining_green_light, next_green_light=self.phaseSelector2(veh_ids_alttop1_1, alttop_length,remaining_green_light,next_green_light)
-
-        for veh_id in self.sorted_ids:
-            xPosition = self.traci_connection.vehicle.getLanePosition(veh_id)
-            distanceToJunction[veh_id] = altleft_length - xPosition
-
-        return np.array([[self.vehicles.get_speed(veh_id)/enter_speed,
-                          self.vehicles.get_absolute_position(veh_id)/length,
-                          distanceToJunction[veh_id],
-                          self.vehicles.get_lane(veh_id),
-                          no_leader[veh_id],
-                          no_follower[veh_id],
-                          remaining_green_light[veh_id],
-                          next_green_light[veh_id]]
-                          for veh_id in self.sorted_ids])
-
-
-    def phaseSelector1(self, veh_ids, positionJunctionX,remaining_green_light,next_green_light):
-        arraySize = len(veh_ids)
-        for x in range(0, arraySize):
-            print("vehicle Id", veh_ids[x])
-
-            phrase = self.traci_connection.trafficlights.getRedYellowGreenState("center")
-
-            if phrase == "rrrrGGGgrrrrGGGg":
-                print("PHRASE 1")
-                phraseNo = 1
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "rrrryyygrrrryyyg":
-                print("PHRASE 2")
-                phraseNo = 2
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "rrrrrrrGrrrrrrrG":
-                print("PHRASE 3")
-                phraseNo = 3
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "rrrrrrryrrrrrrry":
-                print("PHRASE 4")
-                phraseNo = 4
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "GGGgrrrrGGGgrrrr":
-                print("PHRASE 5")
-                phraseNo = 5
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "yyygrrrryyygrrrr":
-                print("PHRASE 6")
-                phraseNo = 6
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "rrrGrrrrrrrGrrrr":
-                print("PHRASE 7")
-                phraseNo = 7
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "rrryrrrrrrryrrrr":
-                print("PHRASE 8")
-                phraseNo = 8
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-        print("-------------------")
-        return remaining_green_light,next_green_light
-
-
-    def phaseSelector2(self,veh_ids, positionJunctionX,remaining_green_light,next_green_light):
-        arraySize = len(veh_ids)
-        for x in range(0, arraySize):
-            print("vehicle Id", veh_ids[x])
-
-            phrase = self.traci_connection.trafficlights.getRedYellowGreenState("center")
-            if phrase == "GGGgrrrrGGGgrrrr":
-                print ("PHRASE 1")
-                phraseNo = 1
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "yyygrrrryyygrrrr":
-                print("PHRASE 2")
-                phraseNo = 2
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "rrrGrrrrrrrGrrrr":
-                print("PHRASE 3")
-                phraseNo = 3
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "rrryrrrrrrryrrrr":
-                print("PHRASE 4")
-                phraseNo = 4
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "rrrrGGGgrrrrGGGg":
-                print("PHRASE 5")
-                phraseNo = 5
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "rrrryyygrrrryyyg":
-                print("PHRASE 6")
-                phraseNo = 6
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "rrrrrrrGrrrrrrrG":
-                print("PHRASE 7")
-                phraseNo = 7
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-            elif phrase == "rrrrrrryrrrrrrry":
-                print("PHRASE 8")
-                phraseNo = 8
-                remaining_green_light, next_green_light=self.calculateRemainigtimeANDNextGreenLight(veh_ids[x], positionJunctionX, phraseNo,remaining_green_light,next_green_light)
-
-        print("-------------------")
-        return remaining_green_light,next_green_light
-
-
-
-    def calculateRemainigtimeANDNextGreenLight(self,veh_id, positionJunctionX, phraseNo,remaining_green_light,next_green_light):
-
-        remaining = (self.traci_connection.trafficlights.getNextSwitch("center") - self.traci_connection.simulation.getCurrentTime()) / 1000
-
-        if phraseNo == 1:
-            nextGreenPhrase = 57 + remaining
-            remaining_green = (self.traci_connection.trafficlights.getNextSwitch("center") - self.traci_connection.simulation.getCurrentTime()) / 1000
-
-        elif phraseNo == 2:
-            nextGreenPhrase = 54 + remaining
-            remaining_green = 0
-
-        elif phraseNo == 3:
-            nextGreenPhrase = 48 + remaining
-            remaining_green =0
-
-        elif phraseNo == 4:
-            nextGreenPhrase = 45 + remaining
-            remaining_green =0
-
-        elif phraseNo == 5:
-            nextGreenPhrase = 12 + remaining
-            remaining_green = 0
-
-        elif phraseNo == 6:
-            nextGreenPhrase = 9 + remaining
-            remaining_green =0
-
-        elif phraseNo == 7:
-            nextGreenPhrase = 6 + remaining
-            remaining_green =0
-
-        elif phraseNo == 8:
-            nextGreenPhrase = (remaining)
-            remaining_green = 0
-
-        remaining_green_light[veh_id]=remaining_green
-        next_green_light[veh_id]=nextGreenPhrase
-        return  remaining_green_light,next_green_light
-
-
-    def calculateNoOfLeadersAndFollowers(self, vehicleList, laneLength,no_leader, no_follower):
-
-        for veh_id in vehicleList:
-            length = len(vehicleList)
-            # reference vehicle
-            xPositionRef = self.traci_connection.vehicle.getLanePosition(veh_id)
-            distanceRef = laneLength - xPositionRef
-            leaderCount = 0
-            followerCount=0
-
-            for x in range(0, length):
-                xPosition = self.traci_connection.vehicle.getLanePosition(vehicleList[x])
-                distance = laneLength - xPosition
-                if distanceRef > distance:
-                    leaderCount = leaderCount + 1
-                elif distanceRef < distance:
-                    followerCount= followerCount+1
-
-            print("no_leader[veh_id] ",no_leader)
-            print ("no_follower[veh_id]",no_follower)
-            no_leader[veh_id] = leaderCount
-            no_follower[veh_id] = followerCount
-
-        return  no_leader,no_follower
\ No newline at end of file
+        num_vehicles = self.vehicles.num_vehicles
+        no_leader = np.zeros(num_vehicles)
+        no_follower = np.zeros(num_vehicles)
+        remaining_green_light = np.zeros(num_vehicles)
+        next_green_light = np.zeros(num_vehicles)
+
+        # index of the approaching lane of each vehicle (-1 for vehicles that
+        # are not approaching the intersection)
+        lane_code = np.full(num_vehicles, -1, dtype=int)
+
+        # positions of the vehicles on their lanes, as subscribed at the
+        # beginning of the step
+        position = self.vehicles.get_position()
+
+        lane_vehicles = self.get_lane_vehicles()
+        self.traffic_light_tracker.update(self.get_current_time())
+
+        for code, lane_id in enumerate(self.approach_lanes):
+            veh_ids = lane_vehicles[lane_id]
+            if len(veh_ids) == 0:
+                continue
+
+            index = self.vehicles.get_index(veh_ids)
+            lane_code[index] = code
+            lane_pos = position[index]
+
+            # followers (leaders) of a vehicle are the vehicles in its lane
+            # with a strictly smaller (larger) position, i.e. its ranks in the
+            # sorted positions of the lane
+            sorted_pos = np.sort(lane_pos)
+            no_follower[index] = np.searchsorted(sorted_pos, lane_pos, "left")
+            no_leader[index] = len(lane_pos) - \
+                np.searchsorted(sorted_pos, lane_pos, "right")
+
+        approaching = np.flatnonzero(lane_code >= 0)
+        remaining_green_light[approaching], next_green_light[approaching] = \
+            self.traffic_light_tracker.get_green_times(lane_code[approaching])
+
+        index = self.sorted_index
+        distance_to_junction = \
+            self.lane_lengths[self.junction_lane] - position[index]
+
+        return np.column_stack((
+            self.vehicles.get_speed()[index] / enter_speed,
+            self.vehicles.get_absolute_position()[index] / length,
+            distance_to_junction,
+            self.vehicles.get_lane()[index],
+            no_leader[index],
+            no_follower[index],
+            remaining_green_light[index],
+            next_green_light[index]))
+
+    def get_lane_vehicles(self):
+        """
+        Collects the ids of the vehicles in the lanes approaching the
+        intersection from the lane subscriptions. Lanes without subscription
+        results (e.g. before the first simulation step following the
+        subscription) are queried directly.
+
+        Returns
+        -------
+        dictionary
+            key = lane IDs
+            elements = list of ids of the vehicles in the lane
+        """
+        results = self.traci_connection.lane.getSubscriptionResults() or {}
+
+        lane_vehicles = dict()
+        for lane_id in self.approach_lanes:
+            if lane_id in results:
+                lane_vehicles[lane_id] = \
+                    results[lane_id][tc.LAST_STEP_VEHICLE_ID_LIST]
+            else:
+                lane_vehicles[lane_id] = \
+                    self.traci_connection.lane.getLastStepVehicleIDs(lane_id)
+
+        return lane_vehicles
@@ -95,33 +95,32 @@ class TwoLoopsOneMergingEnvironment(SumoEnvironment):
         environment are sorted with regards to which ring this currently
         reside on.
         """
-        sorted_ids = []
-        sorted_edges = []
-        sorted_pos = []
-
         veh_edges = self.vehicles.get_edge(self.ids)
-        veh_pos = self.vehicles.get_position(self.ids)
 
         edge_list = [tup[0] for tup in self.scenario.total_edgestarts]
         edge_start_pos = [tup[1] for tup in self.scenario.total_edgestarts]
 
-        for i, edge in enumerate(edge_list):
-            veh_id_by_edge = [(self.ids[j], veh_pos[j] + edge_start_pos[i])
-                              for j in range(len(self.ids)) if edge in veh_edges[j]]
-            veh_id_by_edge.sort(key=lambda tup: tup[1])
-
-            sorted_ids += [tup[0] for tup in veh_id_by_edge]
-            # The edge ids of vehicles in the ring is set to 0, while those of
-            # vehicles outside the ring are set to 1. In addition, the positions
-            # of vehicles in the ring are their position on the ring starting
-            # from the left_top edge, while the positions of vehicles on the
-            # merge is their position on the merge starting from the left_bottom
-            # edge.
-            if i < 6:
-                sorted_pos += [tup[1] for tup in veh_id_by_edge]
-                sorted_edges += [0] * len(veh_id_by_edge)
-            else:
-                sorted_pos += [tup[1] - edge_start_pos[6] for tup in veh_id_by_edge]
-                sorted_edges += [1] * len(veh_id_by_edge)
-
-        return sorted_ids, (sorted_pos, sorted_edges)
+        # index in edge_list of the edges of vehicles (-1 for vehicles on
+        # edges that are not in the list, which are not sorted)
+        edge_index = dict()
+        for veh_edge in set(veh_edges):
+            edge_index[veh_edge] = next(
+                (i for i, edge in enumerate(edge_list) if edge in veh_edge),
+                -1)
+        index = np.array([edge_index[edge] for edge in veh_edges], dtype=int)
+        pos = self.vehicles.get_position() + \
+            np.array(edge_start_pos)[np.maximum(index, 0)]
+
+        sorted_index = self.ordering.update(pos, groups=index)
+        index = index[sorted_index]
+
+        # The edge ids of vehicles in the ring is set to 0, while those of
+        # vehicles outside the ring are set to 1. In addition, the positions
+        # of vehicles in the ring are their position on the ring starting
+        # from the left_top edge, while the positions of vehicles on the
+        # merge is their position on the merge starting from the left_bottom
+        # edge.
+        sorted_edges = (index >= 6).astype(int)
+        sorted_pos = pos[sorted_index] - sorted_edges * edge_start_pos[6]
+
+        return self.ordering.get_sorted_ids(), (sorted_pos, sorted_edges)
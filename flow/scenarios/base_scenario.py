@@ -1,3 +1,4 @@
+import bisect
 import logging
 import numpy as np
 from collections import OrderedDict
@@ -10,6 +11,12 @@ from flow.controllers.rlcontroller import RLController
 
 
 class Scenario(Serializable):
+
+    # whether the network is a single ring road, in which the leader of a
+    # vehicle is the next vehicle in its lane along the one-dimensional
+    # representation of the network (see get_x)
+    single_ring = False
+
     def __init__(self, name, generator_class, vehicles, net_params,
                  initial_config=InitialConfig()):
         """
@@ -73,6 +80,10 @@ class Scenario(Serializable):
 
         self.total_edgestarts_dict = dict(self.total_edgestarts)
 
+        # positional index of the edges, used to compute the edges and
+        # absolute positions of vehicles (see get_edge and get_x)
+        self.build_edge_index()
+
         # length of the network, or the portion of the network in which cars are
         # meant to be distributed (to be calculated during subclass __init__(),
         # or specified in net_params)
@@ -152,6 +163,37 @@ class Scenario(Serializable):
 
         return self.generator.cfg_path + cfg_name
 
+    def build_edge_index(self):
+        """
+        Builds the positional index of the edges of the network from
+        total_edgestarts and edgestarts. Must be called again if these are
+        modified after the scenario is initialized.
+        """
+        # names and starting positions of all edges, sorted by position
+        self._edge_names = [e for e, _ in self.total_edgestarts]
+        self._edge_starts = [s for _, s in self.total_edgestarts]
+        self._edge_starts_array = np.array(self._edge_starts, dtype=float)
+
+        # starting positions of edges, keyed by the names of the edges as
+        # reported by sumo. Internal edges are resolved, and added to this
+        # dictionary, when they are first looked up
+        self._edge_offsets = dict(
+            (e, self.total_edgestarts_dict[e]) for e, _ in self.edgestarts)
+
+        # whether each edge is an internal edge, and the index of the first
+        # edge after each edge that is not internal (wrapping around to the
+        # first edge after the last one)
+        internal = set(e for e, _ in self.internal_edgestarts)
+        self._edge_is_internal = np.array(
+            [e in internal for e in self._edge_names], dtype=bool)
+        num_edges = len(self._edge_names)
+        self._next_edge = list(range(num_edges))
+        for i in range(num_edges):
+            for j in range(1, num_edges + 1):
+                if not self._edge_is_internal[(i + j) % num_edges]:
+                    self._next_edge[i] = (i + j) % num_edges
+                    break
+
     def get_edge(self, x):
         """
         Given an absolute position x on the track, returns the edge (name) and
@@ -168,15 +210,67 @@ class Scenario(Serializable):
             1st element: edge name (such as bottom, right, etc.)
             2nd element: relative position on edge
         """
-        starte = ""
-        startx = 0
+        # positions before the first edge (or nan) do not belong to any edge
+        if not self._edge_starts or not x >= self._edge_starts[0]:
+            return "", 0
+
+        # the last edge starting at or before x
+        i = bisect.bisect_right(self._edge_starts, x) - 1
+
+        return self._edge_names[i], x - self._edge_starts[i]
+
+    def get_edge_array(self, x):
+        """
+        Vectorized version of get_edge.
 
-        for (e, s) in self.total_edgestarts:
-            if x >= s:
-                starte = e
-                startx = x - s
+        Parameters
+        ----------
+        x: list or numpy array of float
+            absolute positions in network
+
+        Returns
+        -------
+        edges: list of str
+            edge names
+        positions: numpy array of float
+            relative positions on the edges
+        """
+        x = np.asarray(x, dtype=float)
+        if not self._edge_starts:
+            return [""] * len(x), np.zeros(len(x))
+
+        indices = np.searchsorted(self._edge_starts_array, x, side="right") - 1
+
+        # positions before the first edge (or nan) do not belong to any edge
+        valid = x >= self._edge_starts_array[0]
+        indices[~valid] = 0
 
-        return starte, startx
+        edges = [self._edge_names[i] if v else ""
+                 for i, v in zip(indices, valid)]
+        positions = np.where(valid, x - self._edge_starts_array[indices], 0)
+
+        return edges, positions
+
+    def _get_edge_offset(self, edge):
+        """
+        Returns the starting position of an edge, or None if the edge is not
+        part of the network.
+        """
+        try:
+            return self._edge_offsets[edge]
+        except KeyError:
+            pass
+
+        # sumo names internal edges (and their lanes) with a suffix appended
+        # to the names in internal_edgestarts
+        offset = None
+        for edge_tuple in self.internal_edgestarts:
+            if edge_tuple[0] in edge:
+                offset = edge_tuple[1]
+                break
+
+        self._edge_offsets[edge] = offset
+        return offset
 
     def get_x(self, edge, position):
         """
@@ -195,12 +289,30 @@ class Scenario(Serializable):
         absolute_position: float
             position with respect to some global reference
         """
-        if edge in dict(self.edgestarts).keys():
-            return self.total_edgestarts_dict[edge] + position
-        else:
-            for edge_tuple in self.internal_edgestarts:
-                if edge_tuple[0] in edge:
-                    return edge_tuple[1] + position
+        offset = self._get_edge_offset(edge)
+        if offset is not None:
+            return offset + position
+
+    def get_x_array(self, edges, positions):
+        """
+        Vectorized version of get_x.
+
+        Parameters
+        ----------
+        edges: list of str
+            names of the edges
+        positions: list or numpy array of float
+            relative positions on the edges
+
+        Returns
+        -------
+        numpy array of float
+            positions with respect to some global reference, or nan for edges
+            that are not part of the network
+        """
+        offsets = np.array([self._get_edge_offset(edge) for edge in edges],
+                           dtype=float)
+        return offsets + np.asarray(positions, dtype=float)
 
     def generate_starting_positions(self, **kwargs):
         """
@@ -237,9 +349,10 @@ class Scenario(Serializable):
 
         return startpositions, startlanes
 
-    def gen_even_start_pos(self, initial_config, **kwargs):
+    def get_distribution_params(self, initial_config, **kwargs):
         """
-        Generates start positions that are uniformly spaced across the network.
+        Collects the parameters of the distribution of starting positions from
+        initial_config, after checking their validity.
 
         Parameters
         ----------
@@ -251,10 +364,14 @@ class Scenario(Serializable):
 
         Returns
         -------
-        startpositions: list
-            list of start positions [(edge0, pos0), (edge1, pos1), ...]
-        startlanes: list
-            list of start lanes
+        x0: float
+            position of the first vehicle in every lane
+        bunching: float
+            portion of the network that is not filled with vehicles
+        distribution_length: float
+            length of the network in which vehicles are distributed
+        lanes_distribution: int
+            number of lanes in which vehicles are distributed
         """
         x0 = initial_config.x0
         # changes to x0 in kwargs suggests a switch in between rollouts,
@@ -291,54 +408,145 @@ class Scenario(Serializable):
         else:
             lanes_distribution = initial_config.lanes_distribution
 
-        startpositions = []
-        startlanes = []
+        return x0, bunching, distribution_length, lanes_distribution
+
+    def in_internal_edge(self, x):
+        """
+        Returns whether absolute positions are located in internal edges (as
+        specified by internal_edgestarts).
+
+        Parameters
+        ----------
+        x: numpy array of float
+            absolute positions in network
+
+        Returns
+        -------
+        numpy array of bool
+        """
+        x = np.asarray(x, dtype=float)
+        if not self._edge_starts:
+            return np.zeros(x.shape, dtype=bool)
+        indices = np.searchsorted(self._edge_starts_array, x, side="right") - 1
+        return (x >= self._edge_starts_array[0]) & \
+            self._edge_is_internal[np.maximum(indices, 0)]
+
+    def next_edge_start(self, x):
+        """
+        Returns the starting position of the first edge after the position x
+        that is not an internal edge, wrapping around to the start of the
+        network after the last edge.
+        """
+        i = bisect.bisect_right(self._edge_starts, x) - 1
+        return self._edge_starts[self._next_edge[max(i, 0)]]
+
+    def place_vehicles(self, x0, increments, lanes_distribution, length,
+                       needs_skip=None, skip=None):
+        """
+        Places vehicles one after the other in each lane. Vehicle i is placed
+        in lane i % lanes_distribution, at a distance increments[j] ahead of
+        the previous vehicle j in the same lane (the first vehicle of each lane
+        being placed at x0). Positions are wrapped around the length of the
+        network.
+
+        Vehicles placed in forbidden positions (by default, in internal edges)
+        are moved forward, and the vehicles following them in the same lane
+        are placed with respect to their new positions. All vehicles up to the
+        next forbidden position in a lane are placed at once.
+
+        Parameters
+        ----------
+        x0: float
+            position of the first vehicle in every lane
+        increments: numpy array of float
+            distance between each vehicle and the next vehicle in its lane
+        lanes_distribution: int
+            number of lanes in which vehicles are distributed
+        length: float
+            length after which positions are wrapped around
+        needs_skip: function, optional
+            returns whether each position of an array is forbidden; defaults
+            to in_internal_edge
+        skip: function, optional
+            returns the position a vehicle placed at a forbidden position is
+            moved to; defaults to next_edge_start
+
+        Returns
+        -------
+        x: numpy array of float
+            absolute positions of the vehicles
+        lanes: numpy array of int
+            lanes of the vehicles
+        """
+        needs_skip = needs_skip or self.in_internal_edge
+        skip = skip or self.next_edge_start
+
+        increments = np.asarray(increments, dtype=float)
+        lanes = np.arange(len(increments)) % lanes_distribution
+        x = np.zeros(len(increments))
+
+        for lane in range(lanes_distribution):
+            indices = np.flatnonzero(lanes == lane)
+            inc = increments[indices]
+            # distance of each vehicle from the first vehicle in the lane
+            offsets = np.append(0, np.cumsum(inc[:-1]))
+
+            start, j = x0, 0
+            while j < len(indices):
+                x_lane = np.mod(start + offsets[j:] - offsets[j], length)
+                forbidden = needs_skip(x_lane)
+                k = int(np.argmax(forbidden)) if forbidden.any() \
+                    else len(x_lane)
+                x[indices[j:j + k]] = x_lane[:k]
+                if k == len(x_lane):
+                    break
+
+                # move the vehicle at a forbidden position, and place the next
+                # vehicles in the lane with respect to its new position
+                x[indices[j + k]] = skip(x_lane[k])
+                start = x[indices[j + k]] + inc[j + k]
+                j += k + 1
+
+        return x, lanes
+
+    def gen_even_start_pos(self, initial_config, **kwargs):
+        """
+        Generates start positions that are uniformly spaced across the network.
+
+        Parameters
+        ----------
+        initial_config: InitialConfig type
+            see flow/core/params.py
+        kwargs: dict
+            extra components, usually defined during reset to overwrite initial
+            config parameters
+
+        Returns
+        -------
+        startpositions: list
+            list of start positions [(edge0, pos0), (edge1, pos1), ...]
+        startlanes: list
+            list of start lanes
+        """
+        x0, bunching, distribution_length, lanes_distribution = \
+            self.get_distribution_params(initial_config, **kwargs)
+
+        num_vehicles = self.vehicles.num_vehicles
         increment = (distribution_length - bunching) / np.ceil(
-            self.vehicles.num_vehicles / lanes_distribution)
+            num_vehicles / lanes_distribution)
 
         if increment < 5:  # 5 is the length of all vehicles
             logging.warning("distribution is too compact; replacing with tight"
                             " (zero headway) starting positions")
             increment = 5
 
-        x = [x0] * lanes_distribution
-        car_count = 0
-        lane_count = 0
-        while car_count < self.vehicles.num_vehicles:
-            # collect the position and lane number of each new vehicle
-            pos = self.get_edge(x[lane_count])
-
-            # ensures that vehicles are not placed in an internal junction
-            while pos[0] in dict(self.internal_edgestarts).keys():
-                # find the location of the internal edge in total_edgestarts,
-                # which has the edges ordered by position
-                edges = [tup[0] for tup in self.total_edgestarts]
-                indx_edge = [i for i in range(len(edges)) if edges[i] == pos[0]][0]
-
-                # take the next edge in the list, and place the car at the
-                # beginning of this edge
-                if indx_edge == len(edges)-1:
-                    next_edge_pos = self.total_edgestarts[0]
-                else:
-                    next_edge_pos = self.total_edgestarts[indx_edge+1]
-
-                x[lane_count] = next_edge_pos[1]
-                pos = (next_edge_pos[0], 0)
-
-            startpositions.append(pos)
-            startlanes.append(lane_count)
-
-            x[lane_count] = (x[lane_count] + increment) % self.length
-
-            # increment the car_count and lane_num
-            car_count += 1
-            lane_count += 1
-            # if the lane num exceeds the number of lanes the vehicles should be
-            # distributed on in the network, reset
-            if lane_count >= lanes_distribution:
-                lane_count = 0
+        # vehicles are not placed in internal junctions
+        x, lanes = self.place_vehicles(
+            x0, np.full(num_vehicles, increment), lanes_distribution,
+            self.length)
 
-        return startpositions, startlanes
+        edges, pos = self.get_edge_array(x)
+        return list(zip(edges, pos.tolist())), lanes.tolist()
 
     def gen_gaussian_start_pos(self, initial_config, **kwargs):
         """
@@ -360,97 +568,38 @@ class Scenario(Serializable):
         startlanes: list
             list of start lanes
         """
-        x0 = initial_config.x0
-        # changes to x0 in kwargs suggests a switch in between rollouts,
-        #  and so overwrites anything in initial_config
-        if "x0" in kwargs:
-            x0 = kwargs["x0"]
-
-        bunching = initial_config.bunching
-        # check if requested bunching value is not valid (negative)
-        if bunching < 0:
-            logging.warning('"bunching" cannot be negative; setting to 0')
-            bunching = 0
-        # changes to bunching in kwargs suggests a switch in between rollouts,
-        #  and so overwrites anything in initial_config
-        if "bunching" in kwargs:
-            bunching = kwargs["bunching"]
+        x0, bunching, distribution_length, lanes_distribution = \
+            self.get_distribution_params(initial_config, **kwargs)
 
-        distribution_length = self.length
-        if initial_config.distribution_length is not None:
-            if initial_config.distribution_length > self.length:
-                logging.warning('"distribution_length" cannot be larger than '
-                                'the length of network; setting to max value')
-            else:
-                distribution_length = initial_config.distribution_length
-
-        if initial_config.lanes_distribution > self.lanes:
-            logging.warning('"lanes_distribution" is greater than the number '
-                            'of lanes in the network; distributing over all '
-                            'lanes instead.')
-            lanes_distribution = self.lanes
-        elif initial_config.lanes_distribution < 1:
-            logging.warning('"lanes_distribution" is too small; setting to 1')
-            lanes_distribution = 1
-        else:
-            lanes_distribution = initial_config.lanes_distribution
-
-        startpositions = []
-        startlanes = []
+        num_vehicles = self.vehicles.num_vehicles
         increment = (distribution_length - bunching) / np.ceil(
-            self.vehicles.num_vehicles / lanes_distribution)
+            num_vehicles / lanes_distribution)
 
         # if the increment is too small, bunch vehicles as close together as
         # possible
         if increment < 5:  # 5 is the length of all vehicles
             return self.gen_even_start_pos(initial_config, **kwargs)
 
-        x = [x0] * lanes_distribution
-        x_start = np.array([])
-        car_count = 0
-        lane_count = 0
-        while car_count < self.vehicles.num_vehicles:
-            # collect the position and lane number of each new vehicle
-            x_start = np.append(x_start, x[lane_count])
-            startlanes.append(lane_count)
-
-            x[lane_count] = (x[lane_count] + increment) % distribution_length
-
-            # increment the car_count and lane_num
-            car_count += 1
-            lane_count += 1
-            # if the lane num exceeds the number of lanes the vehicles should
-            # be distributed on in the network, reset
-            if lane_count >= lanes_distribution:
-                lane_count = 0
+        # uniformly spaced positions in each lane
+        lanes = np.arange(num_vehicles) % lanes_distribution
+        x_start = np.mod(
+            x0 + increment * (np.arange(num_vehicles) // lanes_distribution),
+            distribution_length)
 
         # perturb from uniform distribution
-        for i in range(len(x_start)):
-            perturb = np.random.normal(loc=0, scale=initial_config.scale)
-            x_start[i] = (x_start[i] + perturb) % distribution_length
-
-            pos = self.get_edge(x_start[i])
-
-            # ensures that vehicles are not placed in an internal junction
-            while pos[0] in dict(self.internal_edgestarts).keys():
-                # find the location of the internal edge in total_edgestarts,
-                # which has the edges ordered by position
-                edges = [tup[0] for tup in self.total_edgestarts]
-                indx_edge = [i for i in range(len(edges)) if edges[i] == pos[0]][0]
+        perturb = np.random.normal(loc=0, scale=initial_config.scale,
+                                   size=num_vehicles)
+        x_start = np.mod(x_start + perturb, distribution_length)
 
-                # take the next edge in the list, and place the car at the
-                # beginning of this edge
-                if indx_edge == len(edges)-1:
-                    next_edge_pos = self.total_edgestarts[0]
-                else:
-                    next_edge_pos = self.total_edgestarts[indx_edge+1]
+        edges, pos = self.get_edge_array(x_start)
+        pos = pos.tolist()
 
-                x[lane_count] = next_edge_pos[1]
-                pos = (next_edge_pos[0], 0)
+        # ensures that vehicles are not placed in an internal junction, by
+        # placing them at the beginning of the next edge
+        for i in np.flatnonzero(self.in_internal_edge(x_start)):
+            edges[i], pos[i] = self.get_edge(self.next_edge_start(x_start[i]))
 
-            startpositions.append(pos)
-
-        return startpositions, startlanes
+        return list(zip(edges, pos)), lanes.tolist()
 
     def gen_gaussian_additive_start_pos(self, initial_config, **kwargs):
         """
@@ -473,98 +622,33 @@ class Scenario(Serializable):
         startlanes: list
             list of start lanes
         """
-        x0 = initial_config.x0
-        # changes to x0 in kwargs suggests a switch in between rollouts,
-        #  and so overwrites anything in initial_config
-        if "x0" in kwargs:
-            x0 = kwargs["x0"]
-
-        bunching = initial_config.bunching
-        # check if requested bunching value is not valid (negative)
-        if bunching < 0:
-            logging.warning('"bunching" cannot be negative; setting to 0')
-            bunching = 0
-        # changes to bunching in kwargs suggests a switch in between rollouts,
-        #  and so overwrites anything in initial_config
-        if "bunching" in kwargs:
-            bunching = kwargs["bunching"]
-
-        distribution_length = self.length
-        if initial_config.distribution_length is not None:
-            if initial_config.distribution_length > self.length:
-                logging.warning('"distribution_length" cannot be larger than '
-                                'the length of network; setting to max value')
-            else:
-                distribution_length = initial_config.distribution_length
+        x0, bunching, distribution_length, lanes_distribution = \
+            self.get_distribution_params(initial_config, **kwargs)
 
-        if initial_config.lanes_distribution > self.lanes:
-            logging.warning('"lanes_distribution" is greater than the number '
-                            'of lanes in the network; distributing over all '
-                            'lanes instead.')
-            lanes_distribution = self.lanes
-        elif initial_config.lanes_distribution < 1:
-            logging.warning('"lanes_distribution" is too small; setting to 1')
-            lanes_distribution = 1
-        else:
-            lanes_distribution = initial_config.lanes_distribution
-
-        startpositions = []
-        startlanes = []
+        num_vehicles = self.vehicles.num_vehicles
         mean = (distribution_length - bunching) / np.ceil(
-            self.vehicles.num_vehicles / lanes_distribution)
+            num_vehicles / lanes_distribution)
 
         # if the mean (increment) is too small, bunch vehicles as close together
         # as possible
         if mean < 5:  # 5 is the length of all vehicles
             return self.gen_even_start_pos(initial_config, **kwargs)
 
-        x = [x0] * lanes_distribution
-        car_count = 0
-        lane_count = 0
-        while car_count < self.vehicles.num_vehicles:
-
-            pos = self.get_edge(x[lane_count])
-
-            # ensures that vehicles are not placed in an internal junction
-            while pos[0] in dict(self.internal_edgestarts).keys():
-                # find the location of the internal edge in total_edgestarts,
-                # which has the edges ordered by position
-                edges = [tup[0] for tup in self.total_edgestarts]
-                indx_edge = [i for i in range(len(edges)) if edges[i] == pos[0]][0]
-
-                # take the next edge in the list, and place the car at the
-                # beginning of this edge
-                if indx_edge == len(edges)-1:
-                    next_edge_pos = self.total_edgestarts[0]
-                else:
-                    next_edge_pos = self.total_edgestarts[indx_edge+1]
-
-                x[lane_count] = next_edge_pos[1]
-                pos = (next_edge_pos[0], 0)
-
-            # collect the position and lane number of each new vehicle
-            startpositions.append(pos)
-            startlanes.append(lane_count)
-
-            # calculate the increment given the mean, and ensure that the
-            # increment is never too large or too small (between 0 and the
-            # length of the network)
-            increment = np.clip(
-                np.random.normal(scale=mean/initial_config.downscale, loc=mean),
-                a_min=0, a_max=self.length
-            )
-
-            x[lane_count] = (x[lane_count] + increment) % self.length
-
-            # increment the car_count and lane_num
-            car_count += 1
-            lane_count += 1
-            # if the lane num exceeds the number of lanes the vehicles should
-            # be distributed on in the network, reset
-            if lane_count >= lanes_distribution:
-                lane_count = 0
-
-        return startpositions, startlanes
+        # calculate the increments given the mean, and ensure that the
+        # increments are never too large or too small (between 0 and the
+        # length of the network)
+        increments = np.clip(
+            np.random.normal(scale=mean/initial_config.downscale, loc=mean,
+                             size=num_vehicles),
+            a_min=0, a_max=self.length
+        )
+
+        # vehicles are not placed in internal junctions
+        x, lanes = self.place_vehicles(x0, increments, lanes_distribution,
+                                       self.length)
+
+        edges, pos = self.get_edge_array(x)
+        return list(zip(edges, pos.tolist())), lanes.tolist()
 
     def gen_custom_start_pos(self, initial_config, **kwargs):
         """
@@ -2,6 +2,9 @@ from flow.scenarios.base_scenario import Scenario
 
 
 class LoopScenario(Scenario):
+
+    single_ring = True
+
     def __init__(self, name, generator_class, vehicles, net_params,
                  initial_config=None):
         """
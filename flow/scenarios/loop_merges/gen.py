@@ -1,8 +1,5 @@
 from flow.core.generator import Generator
 
-from flow.core.util import makexml
-from flow.core.util import printxml
-
 from numpy import pi, sin, cos, linspace
 
 import random
@@ -42,15 +39,12 @@ class LoopMergesGenerator(Generator):
 
     def make_routes(self, scenario, initial_config):
 
-        type_list = scenario.vehicles.types
         num_cars = scenario.vehicles.num_vehicles
         if num_cars > 0:
-            routes = makexml("routes", "http://sumo.dlr.de/xsd/routes_file.xsd")
-
-            for veh_type in scenario.vehicles.types:
-                routes.append(E("vType", id=veh_type, minGap="0"))
+            vtypes = [E("vType", id=veh_type, minGap="0")
+                      for veh_type in scenario.vehicles.types]
 
-            vehicle_ids = scenario.vehicles.get_ids()
+            vehicle_ids = list(scenario.vehicles.get_ids())
 
             if initial_config.shuffle:
                 random.shuffle(vehicle_ids)
@@ -60,26 +54,28 @@ class LoopMergesGenerator(Generator):
                                        scenario.num_merge_vehicles]
             merge_positions = positions[scenario.vehicles.num_vehicles -
                                         scenario.num_merge_vehicles:]
-            i_merge = 0
-            i_ring = 0
-            for i, id in enumerate(vehicle_ids):
-                if "merge" in scenario.vehicles.get_state(id, "type"):
-                    route, pos = merge_positions[i_merge]
-                    i_merge += 1
-                else:
-                    route, pos = ring_positions[i_ring]
-                    i_ring += 1
-
-                veh_type = scenario.vehicles.get_state(id, "type")
-                type_depart_speed = scenario.vehicles.get_initial_speed(id)
-                routes.append(
-                    self._vehicle(veh_type, "route" + route,
-                                  depart="0",
-                                  departSpeed=str(type_depart_speed),
-                                  departPos=str(pos), id=id, color="1,0.0,0.0")
-                )
-
-            printxml(routes, self.cfg_path + self.roufn)
+
+            def departures():
+                i_merge = 0
+                i_ring = 0
+                for id in vehicle_ids:
+                    if "merge" in scenario.vehicles.get_state(id, "type"):
+                        route, pos = merge_positions[i_merge]
+                        i_merge += 1
+                    else:
+                        route, pos = ring_positions[i_ring]
+                        i_ring += 1
+
+                    veh_type = scenario.vehicles.get_state(id, "type")
+                    type_depart_speed = scenario.vehicles.get_initial_speed(id)
+                    yield (id, veh_type, "route" + route, str(pos),
+                           dict(depart="0", departSpeed=str(type_depart_speed),
+                                color="1,0.0,0.0"))
+
+            names = self.write_routes(vtypes, departures(),
+                                      flows=initial_config.flows)
+            if names:
+                self.rename_vehicles(scenario.vehicles, names)
 
     def specify_nodes(self, net_params):
         """
@@ -108,6 +108,47 @@ class LoopMergesScenario(Scenario):
 
         return internal_edgestarts
 
+    def in_ring_junction(self, x):
+        """
+        Returns whether absolute positions are located in the junctions of the
+        ring (the internal edges ":ring_0" and ":ring_1").
+        """
+        edges, _ = self.get_edge_array(x)
+        return np.array([":ring_0" in edge or ":ring_1" in edge
+                         for edge in edges], dtype=bool)
+
+    def skip_ring_junction(self, x):
+        """
+        Returns the position of a vehicle located in a junction of the ring,
+        moved past the junction.
+        """
+        edge, _ = self.get_edge(x)
+        if ":ring_0" in edge:
+            return x + self.ring_0_n_len
+        return x + self.ring_1_n_len
+
+    @staticmethod
+    def place_merge_vehicles(x0, increments, lanes_distribution):
+        """
+        Places vehicles one after the other in each lane of the merge, where
+        vehicle i is placed in lane i % lanes_distribution, at a distance
+        increments[j] ahead of the previous vehicle j in the same lane.
+
+        Returns
+        -------
+        x: numpy array of float
+            absolute positions of the vehicles
+        lanes: numpy array of int
+            lanes of the vehicles
+        """
+        lanes = np.arange(len(increments)) % lanes_distribution
+        x = np.zeros(len(increments))
+        for lane in range(lanes_distribution):
+            indices = np.flatnonzero(lanes == lane)
+            x[indices] = x0 + np.append(
+                0, np.cumsum(increments[indices][:-1]))
+        return x, lanes
+
     def gen_custom_start_pos(self, initial_config, **kwargs):
         """
         See base class
@@ -129,80 +170,45 @@ class LoopMergesScenario(Scenario):
             n_merge_platoons = \
                 initial_config.additional_params["n_merge_platoons"]
 
-        startpositions = []
-        startlanes = []
+        num_ring_vehicles = \
+            self.vehicles.num_vehicles - self.num_merge_vehicles
+        x = np.array([])
+        lanes = np.array([], dtype=int)
 
         # generate starting positions for non-merging vehicles
-        if self.vehicles.num_vehicles - self.num_merge_vehicles > 0:
-            # in order to avoid placing cars in the internal edges, their length is
-            # removed from the distribution length
-            distribution_len = self.length - self.ring_0_n_len - self.ring_1_n_len
+        if num_ring_vehicles > 0:
+            # in order to avoid placing cars in the internal edges, their
+            # length is removed from the distribution length
+            distribution_len = \
+                self.length - self.ring_0_n_len - self.ring_1_n_len
             increment = (distribution_len - bunching) * lanes_distribution / \
-                        (self.vehicles.num_vehicles - self.num_merge_vehicles)
-
-            x = [x0] * lanes_distribution
-            car_count = 0
-            lane_count = 0
-            while car_count < self.vehicles.num_vehicles - self.num_merge_vehicles:
-                # collect the position and lane number of each new vehicle
-                pos = self.get_edge(x[lane_count])
-
-                if ":ring_0" in pos[0]:
-                    x[lane_count] += self.ring_0_n_len
-                    pos = self.get_edge(x[lane_count])
-                elif ":ring_1" in pos[0]:
-                    x[lane_count] += self.ring_1_n_len
-                    pos = self.get_edge(x[lane_count])
-
-                startpositions.append(pos)
-                startlanes.append(lane_count)
-
-                x[lane_count] = (x[lane_count] + increment) % self.length
-
-                # increment the car_count and lane_count
-                car_count += 1
-                lane_count += 1
-                # if the lane num exceeds the number of lanes the vehicles should
-                # be distributed on in the network, reset
-                if lane_count >= lanes_distribution:
-                    lane_count = 0
+                num_ring_vehicles
+
+            x, lanes = self.place_vehicles(
+                x0, np.full(num_ring_vehicles, increment), lanes_distribution,
+                self.length, self.in_ring_junction, self.skip_ring_junction)
 
         # generate starting positions for merging vehicles
         if self.num_merge_vehicles > 0:
-            x = [self.get_x(edge="merge_in", position=0)] * lanes_distribution
-            car_count = 0
-            lane_count = 0
-            while car_count < self.num_merge_vehicles:
-                if n_merge_platoons is None:
-                    # if no platooning is requested for merging vehicles, the
-                    # vehicles are uniformly distributed across the appropriate
-                    # section of the merge_in length
-                    increment = (self.merge_in_len - merge_bunching) * \
-                                lanes_distribution / self.num_merge_vehicles
-                else:
-                    if True:  # FIXME
-                        # some small value (to ensure vehicles are bunched together)
-                        increment = 8
-                    else:
-                        increment = 1  # FIXME
-
-                # collect the position and lane number of each new vehicle
-                pos = self.get_edge(x[lane_count])
-
-                startpositions.append(pos)
-                startlanes.append(lane_count)
-
-                x[lane_count] += increment
-
-                # increment the car_count and lane_count
-                car_count += 1
-                lane_count += 1
-                # if the lane num exceeds the number of lanes the vehicles should
-                # be distributed on in the network, reset
-                if lane_count >= lanes_distribution:
-                    lane_count = 0
-
-        return startpositions, startlanes
+            if n_merge_platoons is None:
+                # if no platooning is requested for merging vehicles, the
+                # vehicles are uniformly distributed across the appropriate
+                # section of the merge_in length
+                increment = (self.merge_in_len - merge_bunching) * \
+                    lanes_distribution / self.num_merge_vehicles
+            else:
+                # some small value (to ensure vehicles are bunched together)
+                increment = 8
+
+            x_merge, lanes_merge = self.place_merge_vehicles(
+                self.get_x(edge="merge_in", position=0),
+                np.full(self.num_merge_vehicles, increment),
+                lanes_distribution)
+            x = np.append(x, x_merge)
+            lanes = np.append(lanes, lanes_merge)
+
+        edges, pos = self.get_edge_array(x)
+        return list(zip(edges, pos.tolist())), lanes.tolist()
 
     def gen_gaussian_start_pos(self, initial_config, **kwargs):
         """
@@ -213,54 +219,31 @@ class LoopMergesScenario(Scenario):
         if "x0" in kwargs:
             x0 = kwargs["x0"]
 
-        bunching = 0
-        if "bunching" in initial_config:
-            bunching = initial_config["bunching"]
+        bunching = initial_config.bunching
 
-        lanes_distribution = 1
-        if "lanes_distribution" in initial_config:
-            lanes_distribution = initial_config["lanes_distribution"]
+        lanes_distribution = initial_config.lanes_distribution
 
         distribution_length = self.length
-        if "distribution_length" in initial_config:
-            distribution_length = initial_config["distribution_length"]
+        if initial_config.distribution_length is not None:
+            distribution_length = initial_config.distribution_length
 
-        startpositions = []
-        startlanes = []
+        num_vehicles = self.vehicles.num_vehicles
         increment = (distribution_length - bunching) * lanes_distribution \
-            / self.vehicles.num_vehicles
-
-        x = [x0] * lanes_distribution
-        x_start = np.array([])
-        car_count = 0
-        lane_count = 0
-        while car_count < self.vehicles.num_vehicles:
-            # collect the position and lane number of each new vehicle
-            x_start = np.append(x_start, x[lane_count])
-            startlanes.append(lane_count)
-
-            x[lane_count] = (x[lane_count] + increment) % distribution_length
-
-            # increment the car_count and lane_num
-            car_count += 1
-            lane_count += 1
-            # if the lane num exceeds the number of lanes the vehicles should
-            # be distributed on in the network, reset
-            if lane_count >= lanes_distribution:
-                lane_count = 0
+            / num_vehicles
 
-        # add noise to uniform starting positions
-        for i in range(len(x_start)):
-            # perturbation from uniform distribution
-            x_start[i] =\
-                (x_start[i] +
-                 min(2.5, max(-2.5, np.random.normal(loc=0, scale=2.5)))) \
-                % distribution_length
+        # uniform starting positions
+        lanes = np.arange(num_vehicles) % lanes_distribution
+        x_start = np.mod(
+            x0 + increment * (np.arange(num_vehicles) // lanes_distribution),
+            distribution_length)
 
-            pos = self.get_edge(x_start[i])
-            startpositions.append(pos)
+        # add noise to uniform starting positions
+        perturb = np.clip(
+            np.random.normal(loc=0, scale=2.5, size=num_vehicles), -2.5, 2.5)
+        x_start = np.mod(x_start + perturb, distribution_length)
 
-        return startpositions, startlanes
+        edges, pos = self.get_edge_array(x_start)
+        return list(zip(edges, pos.tolist())), lanes.tolist()
 
     def gen_gaussian_additive_start_pos(self, initial_config, **kwargs):
         """
@@ -280,83 +263,44 @@ class LoopMergesScenario(Scenario):
         if "x0" in kwargs:
             x0 = kwargs["x0"]
 
-        bunching = 0
-        if "bunching" in initial_config:
-            bunching = kwargs["bunching"]
+        bunching = initial_config.bunching
 
-        lanes_distribution = 1
-        if "lanes_distribution" in initial_config:
-            lanes_distribution = kwargs["lanes_distribution"]
+        lanes_distribution = initial_config.lanes_distribution
 
-        downscale = 5
-        if "downscale" in initial_config:
-            downscale = kwargs["downscale"]
+        downscale = initial_config.downscale
 
         merge_bunching = 0
-        if "merge_bunching" in initial_config:
-            merge_bunching = kwargs["merge_bunching"]
+        if "merge_bunching" in initial_config.additional_params:
+            merge_bunching = initial_config.additional_params["merge_bunching"]
 
-        startpositions = []
-        startlanes = []
+        num_ring_vehicles = \
+            self.vehicles.num_vehicles - self.num_merge_vehicles
 
         # generate starting positions for non-merging vehicles
         # in order to avoid placing cars in the internal edges, their length is
         # removed from the distribution length
         distribution_len = self.length - self.ring_0_n_len - self.ring_1_n_len
         mean = (distribution_len - bunching) * lanes_distribution / \
-            (self.vehicles.num_vehicles - self.num_merge_vehicles)
-
-        x = [x0] * lanes_distribution
-        car_count = 0
-        lane_count = 0
-        while car_count < self.vehicles.num_vehicles - self.num_merge_vehicles:
-            # collect the position and lane number of each new vehicle
-            pos = self.get_edge(x[lane_count])
-
-            if ":ring_0" in pos[0]:
-                x[lane_count] += self.ring_0_n_len
-                pos = self.get_edge(x[lane_count])
-            elif ":ring_1" in pos[0]:
-                x[lane_count] += self.ring_1_n_len
-                pos = self.get_edge(x[lane_count])
-
-            startpositions.append(pos)
-            startlanes.append(lane_count)
-
-            x[lane_count] = \
-                (x[lane_count] +
-                 np.random.normal(scale=mean/downscale, loc=mean)) % self.length
-
-            # increment the car_count and lane_count
-            car_count += 1
-            lane_count += 1
-            # if the lane num exceeds the number of lanes the vehicles should
-            # be distributed on in the network, reset
-            if lane_count >= lanes_distribution:
-                lane_count = 0
+            num_ring_vehicles
+
+        increments = np.random.normal(scale=mean/downscale, loc=mean,
+                                      size=num_ring_vehicles)
+        x, lanes = self.place_vehicles(
+            x0, increments, lanes_distribution, self.length,
+            self.in_ring_junction, self.skip_ring_junction)
 
         # generate starting positions for merging vehicles
-        mean = (self.merge_in_len - merge_bunching) * lanes_distribution \
-            / self.num_merge_vehicles
-
-        x = [self.get_x(edge="merge_in", position=0)] * lanes_distribution
-        car_count = 0
-        lane_count = 0
-        while car_count < self.num_merge_vehicles:
-            # collect the position and lane number of each new vehicle
-            pos = self.get_edge(x[lane_count])
-
-            startpositions.append(pos)
-            startlanes.append(lane_count)
-
-            x[lane_count] += np.random.normal(scale=mean / downscale, loc=mean)
-
-            # increment the car_count and lane_count
-            car_count += 1
-            lane_count += 1
-            # if the lane num exceeds the number of lanes the vehicles should
-            # be distributed on in the network, reset
-            if lane_count >= lanes_distribution:
-                lane_count = 0
-
-        return startpositions, startlanes
+        if self.num_merge_vehicles > 0:
+            mean = (self.merge_in_len - merge_bunching) * lanes_distribution \
+                / self.num_merge_vehicles
+
+            increments = np.random.normal(scale=mean/downscale, loc=mean,
+                                          size=self.num_merge_vehicles)
+            x_merge, lanes_merge = self.place_merge_vehicles(
+                self.get_x(edge="merge_in", position=0), increments,
+                lanes_distribution)
+            x = np.append(x, x_merge)
+            lanes = np.append(lanes, lanes_merge)
+
+        edges, pos = self.get_edge_array(x)
+        return list(zip(edges, pos.tolist())), lanes.tolist()
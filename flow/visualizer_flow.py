@@ -2,14 +2,75 @@ import os
 from rllab.sampler.utils import rollout
 import argparse
 import joblib
+import multiprocessing
+import multiprocessing.util
 import numpy as np
 from matplotlib import pyplot as plt
+from flow.core.rollout_stats import RunningStats
 from flow.core.util import emission_to_csv
 
 import pickle
 
 import logging
 
+# folder in which sumo generates the emission files of the rollouts
+EMISSION_PATH = "./test_time_rollout/"
+
+# environment, policy, and maximum rollout length of the process running the
+# rollouts (see run_rollout)
+_worker = dict()
+
+
+def restart_env(env, emission_path, use_sumogui):
+    """
+    Restarts the sumo instance of the environment of a snapshot, generating
+    the emission file of the rollouts in emission_path.
+    """
+    # specify an emission path for sumo to generate an emission file for the
+    # rollout
+    unwrapped_env = env._wrapped_env._wrapped_env.env.unwrapped
+    unwrapped_env.emission_path = emission_path
+
+    # Set sumo to make a video
+    sumo_params = unwrapped_env.sumo_params
+    sumo_binary = 'sumo-gui' if use_sumogui else 'sumo'
+    unwrapped_env.restart_sumo(sumo_params, sumo_binary=sumo_binary)
+
+    return unwrapped_env
+
+
+def init_worker(snapshot_file, use_sumogui, max_path_length):
+    """
+    Loads the environment and policy of a snapshot in a worker process, with
+    its own sumo instance and emission file.
+    """
+    data = joblib.load(snapshot_file)
+    emission_path = "{0}worker-{1}/".format(EMISSION_PATH, os.getpid())
+    unwrapped_env = restart_env(data['env'], emission_path, use_sumogui)
+
+    # sumo only completes the emission file once it is closed. Handlers
+    # registered with atexit are not run by the workers of a pool, whereas
+    # finalizers are run when the worker exits
+    multiprocessing.util.Finalize(None, unwrapped_env.terminate,
+                                  exitpriority=10)
+
+    _worker.update(env=data['env'], policy=data['policy'],
+                   max_path_length=max_path_length,
+                   emission_path=emission_path)
+
+
+def run_rollout(j):
+    """
+    Runs a single rollout of the policy, and returns the index of the rollout,
+    its observations and rewards, and the folder of the emission file in
+    which it was recorded.
+    """
+    path = rollout(_worker["env"], _worker["policy"],
+                   max_path_length=_worker["max_path_length"],
+                   animated=False, speedup=1)
+    return j, path['observations'], path['rewards'], _worker["emission_path"]
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
@@ -26,6 +87,14 @@ if __name__ == "__main__":
     parser.add_argument('--emission_to_csv', action='store_true',
                         help='Specifies whether to convert the emission file '
                              'created by sumo into a csv file')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of processes, each with its own sumo '
+                             'instance, the rollouts are spread over')
+    parser.add_argument('--obs_memmap', type=str, default=None,
+                        help='Path to a .npy file to which the observations '
+                             'of all rollouts are written as a memory-mapped '
+                             'array, instead of being kept in memory and '
+                             'exported to observations.pkl')
 
     args = parser.parse_args()
 
@@ -44,6 +113,7 @@ if __name__ == "__main__":
         obs_vars = []
 
     # Recreate experiment params
+    sumo_params = unwrapped_env.sumo_params
     vehicles = unwrapped_env.vehicles
     tot_cars = vehicles.num_vehicles
     rl_cars = vehicles.num_rl_vehicles
@@ -68,38 +138,63 @@ if __name__ == "__main__":
     new_max_path_length = int(np.floor(env.horizon * args.run_long))
     # env_params.additional_params["num_steps"] = new_max_path_length
 
-    # specify an emission path for sumo to generate an emission file for the
-    # rollout
-    unwrapped_env.emission_path = "./test_time_rollout/"
-
-    # Set sumo to make a video
-    sumo_params = unwrapped_env.sumo_params
-    sumo_binary = 'sumo-gui' if args.use_sumogui else 'sumo'
-    unwrapped_env.restart_sumo(sumo_params, sumo_binary=sumo_binary)
-
-    # Load data into arrays
-    all_obs = np.zeros((args.num_rollouts, max_path_length, flat_obs))
+    # the observations of all rollouts are only kept in memory if they are
+    # not spilled to a memory-mapped file, as their mean and variance at
+    # every time step are computed online
+    if args.obs_memmap:
+        all_obs = np.lib.format.open_memmap(
+            args.obs_memmap, mode='w+', dtype=np.float64,
+            shape=(args.num_rollouts, max_path_length, flat_obs))
+    else:
+        all_obs = np.zeros((args.num_rollouts, max_path_length, flat_obs))
     all_rewards = np.zeros((args.num_rollouts, max_path_length))
-    for j in range(args.num_rollouts):
-        # run a single rollout of the experiment
-        path = rollout(env, policy,
+    obs_stats = RunningStats(max_path_length, flat_obs)
+    reward_stats = RunningStats(max_path_length)
+
+    if args.jobs > 1:
+        # each worker process loads its own copy of the snapshot, and runs
+        # its own sumo instance
+        pool = multiprocessing.Pool(
+            args.jobs, initializer=init_worker,
+            initargs=(args.file, args.use_sumogui, max_path_length))
+        results = pool.imap_unordered(run_rollout, range(args.num_rollouts))
+    else:
+        restart_env(env, EMISSION_PATH, args.use_sumogui)
+        _worker.update(env=env, policy=policy,
                        max_path_length=max_path_length,
-                       animated=False, speedup=1)
+                       emission_path=EMISSION_PATH)
+        results = (run_rollout(j) for j in range(args.num_rollouts))
+
+    # folders of the emission files of the processes running the rollouts
+    emission_paths = set()
+
+    for i, (j, new_obs, new_rewards, emission_path) in enumerate(results):
+        emission_paths.add(emission_path)
 
         # collect the observations and rewards from the rollout
-        new_obs = path['observations']
         all_obs[j, :new_obs.shape[0], :new_obs.shape[1]] = new_obs
-        new_rewards = path['rewards']
         all_rewards[j, :len(new_rewards)] = new_rewards
+        obs_stats.update(all_obs[j, :new_obs.shape[0]])
+        reward_stats.update(new_rewards)
 
         logging.info("\n Done: {0} / {1}, {2}%".format(
-            j+1, args.num_rollouts, (j+1) / args.num_rollouts * 100))
+            i+1, args.num_rollouts, (i+1) / args.num_rollouts * 100))
 
-    # export observations to a pickle file
-    output_filename = 'observations.pkl'
-    output = open(output_filename, 'wb')
-    pickle.dump(all_obs, output)
-    output.close()
+    # close the sumo instances, which completes their emission files
+    if args.jobs > 1:
+        pool.close()
+        pool.join()
+    else:
+        unwrapped_env.terminate()
+
+    if args.obs_memmap:
+        all_obs.flush()
+    else:
+        # export observations to a pickle file
+        output_filename = 'observations.pkl'
+        output = open(output_filename, 'wb')
+        pickle.dump(all_obs, output)
+        output.close()
 
     # export rewards to a pickle file
     output_filename = 'rewards.pkl'
@@ -107,6 +202,13 @@ if __name__ == "__main__":
     pickle.dump(all_rewards, output)
     output.close()
 
+    # export the mean and variance of the observations and rewards at every
+    # time step
+    np.savez('rollout_stats.npz', count=reward_stats.count,
+             obs_mean=obs_stats.mean, obs_variance=obs_stats.variance,
+             reward_mean=reward_stats.mean,
+             reward_variance=reward_stats.variance)
+
     # ensure that a reward_plots folder exists in the directory, and if not,
     # create one
     if not os.path.exists("plots"):
@@ -125,7 +227,7 @@ if __name__ == "__main__":
         # plot mean value for observation for each vehicle across rollouts
         plt.figure()
         for car in range(tot_cars):
-            center = np.mean(all_obs[:, :, tot_cars*obs_var_idx + car], axis=0)
+            center = obs_stats.mean[:, tot_cars*obs_var_idx + car]
             plt.plot(range(max_path_length), center, lw=2.0,
                      label='Veh {}'.format(car))
         plt.ylabel(obs_var, fontsize=15)
@@ -140,9 +242,9 @@ if __name__ == "__main__":
 
         # plot mean values for the observations across all vehicles and all
         # rollouts
-        car_mean = np.mean(np.mean(
-            all_obs[:, :, tot_cars*obs_var_idx:tot_cars*(obs_var_idx + 1)],
-            axis=0), axis=1)
+        car_mean = np.mean(
+            obs_stats.mean[:, tot_cars*obs_var_idx:tot_cars*(obs_var_idx + 1)],
+            axis=1)
         plt.figure()
         plt.plot(t, car_mean)
         plt.ylabel(obs_var, fontsize=15)
@@ -155,10 +257,13 @@ if __name__ == "__main__":
                     bbox="tight")
 
     # Make a figure for the mean rewards over the course of the rollout
-    mean_reward = np.mean(all_rewards, axis=0)
+    mean_reward = reward_stats.mean
+    std_reward = np.sqrt(reward_stats.variance)
 
     plt.figure()
     plt.plot(t, mean_reward, lw=2.0)
+    plt.fill_between(t, mean_reward - std_reward, mean_reward + std_reward,
+                     alpha=0.25)
     plt.ylabel("reward", fontsize=15)
     plt.xlabel("time (s)", fontsize=15)
     plt.title("Reward, Autonomous Penetration: {0}/{1}".
@@ -169,10 +274,9 @@ if __name__ == "__main__":
 
     # if prompted, convert the emission file into a csv file
     if args.emission_to_csv:
-        dir_path = os.path.dirname(os.path.realpath(__file__))
         emission_filename = "{0}-emission.xml".format(scenario.name)
 
-        emission_path = \
-            "{0}/test_time_rollout/{1}".format(dir_path, emission_filename)
-
-        emission_to_csv(emission_path)
+        # only the files of the processes of this run are converted, and not
+        # those left by the workers of earlier runs
+        for emission_path in sorted(emission_paths):
+            emission_to_csv(os.path.join(emission_path, emission_filename))
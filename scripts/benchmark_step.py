@@ -0,0 +1,137 @@
+"""
+Benchmarks the per-step cost of the python-side of SumoEnvironment, and checks
+that it grows linearly with the number of vehicles in the network.
+
+The environments are run with the mock simulation backend (see
+flow/core/mock_traci.py), so that the results are reproducible and do not
+depend on the latency of sumo. Note that the cost of a full step includes the
+cost of the mock simulation step.
+
+Usage
+    python scripts/benchmark_step.py [--sizes 20 200 2000] [--steps 50]
+
+The script exits with a non-zero status if the cost of a step grows faster than
+linearly in between two consecutive sizes (up to a tolerance factor).
+"""
+import argparse
+import logging
+import sys
+import timeit
+
+sys.path.append(".")
+
+from flow.controllers.car_following_models import IDMController
+from flow.controllers.routing_controllers import ContinuousRouter
+from flow.core.params import SumoParams, EnvParams, InitialConfig, NetParams
+from flow.core.vehicles import Vehicles
+from flow.envs.loop_accel import SimpleAccelerationEnvironment
+from flow.scenarios.loop.gen import CircleGenerator
+from flow.scenarios.loop.loop_scenario import LoopScenario
+
+# maximum allowed ratio between the growth in the cost of a step and the
+# growth in the number of vehicles
+TOLERANCE = 2.
+
+# length of the ring road per vehicle (in meters)
+SPACING = 10.
+
+
+def ring_road_env(num_vehicles):
+    """
+    Creates a single lane ring road environment with IDM vehicles, running on
+    the mock simulation backend.
+    """
+    vehicles = Vehicles()
+    vehicles.add_vehicles(veh_id="idm",
+                          acceleration_controller=(IDMController, {}),
+                          routing_controller=(ContinuousRouter, {}),
+                          num_vehicles=num_vehicles)
+
+    sumo_params = SumoParams(time_step=0.1, sim_backend="mock")
+
+    env_params = EnvParams(additional_params={"target_velocity": 8,
+                                              "max-deacc": 3, "max-acc": 3,
+                                              "num_steps": 500})
+
+    net_params = NetParams(additional_params={"length": SPACING * num_vehicles,
+                                              "lanes": 1, "speed_limit": 30,
+                                              "resolution": 40})
+
+    scenario = LoopScenario(name="benchmark_%d" % num_vehicles,
+                            generator_class=CircleGenerator,
+                            vehicles=vehicles,
+                            net_params=net_params,
+                            initial_config=InitialConfig())
+
+    return SimpleAccelerationEnvironment(env_params=env_params,
+                                         sumo_params=sumo_params,
+                                         scenario=scenario)
+
+
+def benchmark(num_vehicles, steps):
+    """
+    Returns a dictionary of the average time (in seconds) needed to perform
+    components of a step, and a full step.
+    """
+    env = ring_road_env(num_vehicles)
+
+    # let the vehicles start moving before timing
+    for _ in range(10):
+        env.step([])
+
+    observations = env.traci_connection.vehicle.getSubscriptionResults()
+
+    def scalar_controllers():
+        return [env.vehicles.get_acc_controller(veh_id).get_action(env)
+                for veh_id in env.controlled_ids]
+
+    times = dict()
+    times["update_headways"] = timeit.timeit(
+        lambda: env.update_headways(observations), number=steps) / steps
+    times["controllers"] = timeit.timeit(
+        lambda: env.batch_controller.get_actions(env), number=steps) / steps
+    times["controllers_scalar"] = timeit.timeit(
+        scalar_controllers, number=steps) / steps
+    times["step"] = timeit.timeit(
+        lambda: env.step([]), number=steps) / steps
+
+    env.terminate()
+
+    return times
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000],
+                        help="number of vehicles in the network")
+    parser.add_argument("--steps", type=int, default=50,
+                        help="number of steps averaged over for each size")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = []
+    for num_vehicles in args.sizes:
+        results.append(benchmark(num_vehicles, args.steps))
+        for name in sorted(results[-1]):
+            t = results[-1][name]
+            print("%-18s %5d vehicles, %9.3f ms/step, %7.3f us/vehicle"
+                  % (name, num_vehicles, 1e3 * t, 1e6 * t / num_vehicles))
+
+    # the cost of a step should grow at most linearly with the number of
+    # vehicles
+    regression = False
+    for i in range(1, len(args.sizes)):
+        expected = args.sizes[i] / args.sizes[i - 1]
+        for name in sorted(results[i]):
+            growth = results[i][name] / results[i - 1][name]
+            if growth > TOLERANCE * expected:
+                print("regression in %s: %dx more vehicles made it %.1fx "
+                      "slower" % (name, expected, growth))
+                regression = True
+
+    return 1 if regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,80 @@
+"""
+Converts emission files generated by sumo into csv files, .npz archives, or
+memory-mappable .npy files, with the records sorted by vehicle id.
+
+The files are parsed incrementally and sorted with an external merge sort (see
+flow/core/emission.py), so that the memory usage of each conversion is bounded
+by the chunk size, whatever the size of the emission file. Several files are
+converted in parallel with --jobs, in which case the peak memory usage is
+bounded by the number of jobs times the chunk size.
+
+Usage
+    python scripts/convert_emission.py FILE [FILE ...] [--format csv]
+        [--output_dir DIR] [--chunk_size 100000] [--jobs 1]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+
+sys.path.append(".")
+
+from flow.core.emission import convert_emission, OUTPUT_FORMATS
+
+
+def output_path(emission_path, output_dir, output_format):
+    """
+    Returns the path of the file converted from an emission file, with the
+    extension of the output format, in output_dir if specified, or next to the
+    emission file otherwise.
+    """
+    path = emission_path[:-3] + output_format
+    if output_dir is not None:
+        path = os.path.join(output_dir, os.path.basename(path))
+    return path
+
+
+def convert(task):
+    emission_path, path, output_format, chunk_size = task
+    return convert_emission(emission_path, path, output_format=output_format,
+                            chunk_size=chunk_size)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", type=str, nargs="+",
+                        help="paths to the emission files")
+    parser.add_argument("--format", type=str, default="csv",
+                        choices=OUTPUT_FORMATS, help="output format")
+    parser.add_argument("--output_dir", type=str, default=None,
+                        help="directory of the converted files, default is "
+                             "the directory of each emission file")
+    parser.add_argument("--chunk_size", type=int, default=100000,
+                        help="number of records sorted in memory at a time")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="number of files converted in parallel")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    tasks = [(path, output_path(path, args.output_dir, args.format),
+              args.format, args.chunk_size) for path in args.files]
+
+    if args.jobs > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(args.jobs, len(tasks)))
+        try:
+            for path in pool.imap_unordered(convert, tasks):
+                print(path)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for task in tasks:
+            print(convert(task))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
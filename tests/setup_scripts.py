@@ -17,6 +17,23 @@ from flow.scenarios.figure8.gen import Figure8Generator
 from flow.scenarios.figure8.figure8_scenario import Figure8Scenario
 
 
+# lanes controlled by each link of the four-way traffic light added to the
+# mock simulation in the traffic light tests: the right and straight links of
+# every approach leave from its first lane, and the straight and left links
+# from its second lane
+CONTROLLED_LANES = ["bottom_0", "bottom_0", "bottom_1", "bottom_1",
+                    "right_0", "right_0", "right_1", "right_1",
+                    "top_0", "top_0", "top_1", "top_1",
+                    "left_0", "left_0", "left_1", "left_1"]
+
+# program of the traffic light, with the phases of netconvert's default
+# programs for a four-way intersection
+PROGRAM = [(10, "GGGgrrrrGGGgrrrr"), (2, "yyygrrrryyygrrrr"),
+           (3, "rrrGrrrrrrrGrrrr"), (2, "rrryrrrrrrryrrrr"),
+           (10, "rrrrGGGgrrrrGGGg"), (2, "rrrryyygrrrryyyg"),
+           (3, "rrrrrrrGrrrrrrrG"), (2, "rrrrrrryrrrrrrry")]
+
+
 def ring_road_exp_setup(sumo_params=None,
                         vehicles=None,
                         env_params=None,
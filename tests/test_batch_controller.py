@@ -0,0 +1,128 @@
+import unittest
+import numpy as np
+
+from flow.core.vehicles import Vehicles
+
+from flow.controllers.batch_controller import BatchController
+from flow.controllers.car_following_models import *
+
+
+class _Env:
+    """
+    Minimal environment containing only the vehicles in the network, which is
+    all that is needed by the car-following controllers.
+    """
+    def __init__(self, vehicles):
+        self.vehicles = vehicles
+
+
+class TestBatchController(unittest.TestCase):
+    """
+    Tests that the accelerations computed by the batched engine match those of
+    the scalar get_action methods of each controller, for vehicles with and
+    without leaders, and over several steps (to test delays).
+    """
+    def setUp(self):
+        np.random.seed(0)
+
+    def compare(self, controller, params, num_steps=15, ring=False):
+        vehicles = Vehicles()
+        vehicles.add_vehicles(veh_id="test",
+                              acceleration_controller=(controller, params),
+                              num_vehicles=6)
+        vehicles.add_vehicles(veh_id="other",
+                              acceleration_controller=(controller, {}),
+                              num_vehicles=2)
+        env = _Env(vehicles)
+        ids = vehicles.get_ids()
+
+        batch = BatchController(vehicles, ids)
+
+        for step in range(num_steps):
+            # vehicles form a platoon, with a vehicle without a leader at the
+            # front, and a vehicle without a leader every few steps (unless
+            # the vehicles are in a ring)
+            leader_index = np.append(np.arange(1, len(ids)), -1)
+            if ring:
+                leader_index[-1] = 0
+            elif step % 4 == 0:
+                leader_index[2] = -1
+            vehicles.set_headway_data(
+                leader_index, np.random.uniform(1, 40, len(ids)))
+            vehicles.set_speed("all", np.random.uniform(0, 20, len(ids)))
+
+            expected = [vehicles.get_acc_controller(veh_id).get_action(env)
+                        for veh_id in ids]
+
+            np.testing.assert_array_almost_equal(batch.get_actions(env),
+                                                 expected)
+
+        # delays are cleared upon reset
+        batch.reset_delay(env)
+        for veh_id in ids:
+            vehicles.get_acc_controller(veh_id).reset_delay(env)
+        expected = [vehicles.get_acc_controller(veh_id).get_action(env)
+                    for veh_id in ids]
+        np.testing.assert_array_almost_equal(batch.get_actions(env), expected)
+
+        return batch
+
+    def test_cfm(self):
+        self.compare(CFMController, {"k_d": 2, "tau": 0.5})
+
+    def test_bcm(self):
+        # the scalar controller requires all vehicles to have followers
+        self.compare(BCMController, {"v_des": 12, "tau": 0.3}, ring=True)
+
+    def test_ovm(self):
+        self.compare(OVMController, {"h_st": 5, "h_go": 25})
+
+    def test_linear_ovm(self):
+        self.compare(LinearOVM, {"h_st": 3, "tau": 0.45})
+
+    def test_idm(self):
+        self.compare(IDMController, {"v0": 20, "T": 1.5})
+
+    def test_grouping(self):
+        # vehicles with different parameters are placed in different groups
+        batch = self.compare(IDMController, {"v0": 20})
+        self.assertEqual(len(batch.groups), 2)
+        self.assertEqual(len(batch.fallback), 0)
+
+    def test_reindex(self):
+        # vehicles entering and leaving the network keep the accelerations of
+        # the remaining vehicles (and their delays) consistent
+        vehicles = Vehicles()
+        vehicles.add_vehicles(veh_id="test",
+                              acceleration_controller=(CFMController,
+                                                       {"tau": 0.5}),
+                              num_vehicles=6)
+        vehicles.add_vehicles(veh_id="other",
+                              acceleration_controller=(OVMController, {}),
+                              num_vehicles=2)
+        env = _Env(vehicles)
+        ids = vehicles.get_ids()
+        batch = BatchController(vehicles, ids)
+
+        for step in range(15):
+            if step == 5:
+                new_index = vehicles.remove(["test_1", "other_0"])
+                vehicles.add("test_new", "test")
+                vehicles.add("other_new", "other")
+                batch.reindex(vehicles, ids, new_index)
+                self.assertListEqual(batch.veh_ids, ids)
+
+            leader_index = np.append(np.arange(1, len(ids)), -1)
+            vehicles.set_headway_data(
+                leader_index, np.random.uniform(1, 40, len(ids)))
+            vehicles.set_speed("all", np.random.uniform(0, 20, len(ids)))
+
+            expected = [vehicles.get_acc_controller(veh_id).get_action(env)
+                        for veh_id in ids]
+            np.testing.assert_array_almost_equal(batch.get_actions(env),
+                                                 expected)
+        self.assertEqual(len(batch.groups), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
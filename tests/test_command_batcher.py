@@ -0,0 +1,98 @@
+import unittest
+
+from flow.core.command_batcher import CommandBatcher
+
+
+class _VehicleDomain:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def slowDown(self, veh_id, speed, duration):
+        self._connection._queue.append(("slowDown", veh_id))
+        self._connection._sendExact()
+
+    def getSpeed(self, veh_id):
+        self._connection._queue.append(("getSpeed", veh_id))
+        return self._connection._sendExact()
+
+
+class _Connection:
+    """
+    Stand-in for a traci connection, recording the commands contained in each
+    message sent to sumo.
+    """
+    def __init__(self):
+        self._queue = []
+        self.messages = []
+        self.vehicle = _VehicleDomain(self)
+
+    def _sendExact(self):
+        self.messages.append(self._queue)
+        self._queue = []
+        return "result"
+
+    def simulationStep(self):
+        self._queue.append(("simulationStep",))
+        self._sendExact()
+
+
+class TestCommandBatcher(unittest.TestCase):
+    """
+    Tests that deferred commands are sent to sumo in the same message as the
+    next command that requires a response.
+    """
+    def setUp(self):
+        self.connection = _Connection()
+        self.batcher = CommandBatcher(self.connection)
+
+    def tearDown(self):
+        # free data used by the class
+        self.connection = None
+        self.batcher = None
+
+    def test_simulation_step(self):
+        for veh_id in ["a", "b", "c"]:
+            self.batcher.defer(self.connection.vehicle.slowDown, veh_id, 1, 1)
+        self.assertListEqual(self.connection.messages, [])
+
+        self.connection.simulationStep()
+        self.assertListEqual(
+            self.connection.messages,
+            [[("slowDown", "a"), ("slowDown", "b"), ("slowDown", "c"),
+              ("simulationStep",)]])
+        self.assertEqual(self.batcher.round_trips, 1)
+        self.assertEqual(self.batcher.num_commands, 3)
+
+    def test_getters(self):
+        # commands that return a value are not deferred
+        self.batcher.defer(self.connection.vehicle.slowDown, "a", 1, 1)
+        self.assertEqual(self.connection.vehicle.getSpeed("a"), "result")
+        self.assertListEqual(self.connection.messages,
+                             [[("slowDown", "a"), ("getSpeed", "a")]])
+
+    def test_flush(self):
+        self.batcher.flush()
+        self.assertEqual(self.batcher.round_trips, 0)
+
+        self.batcher.defer(self.connection.vehicle.slowDown, "a", 1, 1)
+        self.batcher.flush()
+        self.assertListEqual(self.connection.messages, [[("slowDown", "a")]])
+
+        self.batcher.reset_counts()
+        self.assertEqual(self.batcher.round_trips, 0)
+        self.assertEqual(self.batcher.num_commands, 0)
+
+    def test_reuse(self):
+        # a new batcher of the same connection replaces the previous one,
+        # instead of wrapping it
+        batcher = CommandBatcher(self.connection)
+        for _ in range(3):
+            batcher = CommandBatcher(self.connection)
+        self.connection.vehicle.getSpeed("a")
+        self.assertEqual(batcher.round_trips, 1)
+        self.assertEqual(self.batcher.round_trips, 0)
+        self.assertIs(batcher._send_exact.__self__, self.connection)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,8 @@ from flow.core.vehicles import Vehicles
 
 from flow.controllers.routing_controllers import ContinuousRouter
 from flow.controllers.car_following_models import *
+from flow.controllers.base_controller import safe_action_instantaneous, \
+    safe_velocity_action
 
 from setup_scripts import ring_road_exp_setup
 
@@ -347,6 +349,73 @@ class TestSafeVelocityFailsafe(TestInstantaneousFailsafe):
         self.exp = SumoExperiment(env, scenario)
 
 
+class TestBatchedFailsafes(unittest.TestCase):
+    """
+    Tests that the batched failsafes used by apply_acceleration match the
+    failsafe methods of the base acceleration controller, for vehicles with
+    different delays and random states.
+    """
+    def setUp(self):
+        vehicles = Vehicles()
+        vehicles.add_vehicles(
+            veh_id="ovm",
+            acceleration_controller=(OVMController, {"tau": 0.5}),
+            routing_controller=(ContinuousRouter, {}),
+            num_vehicles=10)
+        vehicles.add_vehicles(
+            veh_id="idm",
+            acceleration_controller=(IDMController, {}),
+            routing_controller=(ContinuousRouter, {}),
+            num_vehicles=10)
+
+        # create the environment and scenario classes for a ring road
+        self.env, scenario = ring_road_exp_setup(
+            sumo_params=SumoParams(sim_backend="mock"), vehicles=vehicles)
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+
+    def test_failsafes(self):
+        rng = np.random.RandomState(0)
+        ids = self.env.vehicles.get_ids()
+        for _ in range(10):
+            self.env.vehicles.set_speed(ids, rng.uniform(0, 10, len(ids)))
+            leader = rng.randint(-1, len(ids), len(ids))
+            self.env.vehicles.set_headway_data(
+                leader, rng.uniform(0, 10, len(ids)))
+            acc = rng.uniform(-5, 5, len(ids))
+
+            indices = self.env.vehicles.get_index(ids)
+            speed = self.env.vehicles.get_speed()[indices]
+            headway = self.env.vehicles.get_headway()[indices]
+            lead = self.env.vehicles.get_leader_index()[indices]
+            lead_speed = np.append(self.env.vehicles.get_speed(), np.nan)[lead]
+            delay = np.array([contr.delay for contr in
+                              self.env.vehicles.get_acc_controller(ids)])
+
+            expected = [self.env.vehicles.get_acc_controller(veh_id).
+                        get_safe_action_instantaneous(self.env, acc[i])
+                        for i, veh_id in enumerate(ids)]
+            np.testing.assert_array_almost_equal(
+                safe_action_instantaneous(acc, speed, headway, lead >= 0,
+                                          self.env.time_step),
+                expected)
+
+            # the scalar safe velocity requires a leader
+            has_leader = np.flatnonzero(lead >= 0)
+            expected = [self.env.vehicles.get_acc_controller(ids[i]).
+                        get_safe_action(self.env, acc[i]) for i in has_leader]
+            safe_acc = safe_velocity_action(acc, speed, lead_speed, headway,
+                                            delay, lead >= 0,
+                                            self.env.time_step)
+            np.testing.assert_array_almost_equal(safe_acc[has_leader],
+                                                 expected)
+
+
 class TestStaticLaneChanger(unittest.TestCase):
     """
     Makes sure that vehicles with a static lane-changing controller do not
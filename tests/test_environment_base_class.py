@@ -146,9 +146,9 @@ class TestEmissionPath(unittest.TestCase):
 #         pass
 
 
-# class TestGetHeadwayDict(unittest.TestCase):
+# class TestUpdateHeadways(unittest.TestCase):
 #     """
-#     Tests that get_headway_dict is functioning correctly at the start of a
+#     Tests that update_headways is functioning correctly at the start of a
 #     run, in the middle of a run, upon reset, and when a collision occurs.
 #     """
 #     def setUp(self):
@@ -0,0 +1,109 @@
+import unittest
+
+import numpy as np
+
+from flow.core.lane_index import LaneIndex
+from flow.core.params import SumoParams, NetParams, InitialConfig
+from flow.core.vehicles import Vehicles
+from flow.controllers.car_following_models import IDMController
+from flow.controllers.lane_change_controllers import StochasticLaneChanger
+
+from setup_scripts import ring_road_exp_setup
+
+
+class TestLaneIndex(unittest.TestCase):
+    """
+    Tests that the leaders, followers, and vehicles within a range given by
+    the lane index match those found by scanning all vehicles, in every lane.
+    """
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.length = 100
+        self.ids = ["veh_%d" % i for i in range(40)]
+        self.x = rng.uniform(0, self.length, size=40)
+        self.lanes = rng.randint(0, 3, size=40)
+        self.index = LaneIndex(self.ids, self.x, self.lanes, self.length)
+
+    def tearDown(self):
+        # free data used by the class
+        self.index = None
+
+    def test_neighbors(self):
+        for i, veh_id in enumerate(self.ids):
+            for lane in range(4):
+                others = [j for j in range(40)
+                          if self.lanes[j] == lane and j != i]
+                if not others:
+                    self.assertIsNone(self.index.get_leader(veh_id, lane))
+                    self.assertIsNone(self.index.get_follower(veh_id, lane))
+                    continue
+
+                # distances to the vehicles ahead and behind, in a ring
+                ahead = np.mod(self.x[others] - self.x[i], self.length)
+                behind = np.mod(self.x[i] - self.x[others], self.length)
+                self.assertEqual(self.index.get_leader(veh_id, lane),
+                                 self.ids[others[int(np.argmin(ahead))]])
+                self.assertEqual(self.index.get_follower(veh_id, lane),
+                                 self.ids[others[int(np.argmin(behind))]])
+
+    def test_range(self):
+        for i, veh_id in enumerate(self.ids):
+            for dx_back, dx_forward in [(0, 10), (20, 30), (60, 60)]:
+                in_range = set(
+                    self.ids[j] for j in range(40) if self.lanes[j] == 1
+                    and j != i and
+                    (np.mod(self.x[j] - self.x[i], self.length) <= dx_forward
+                     or np.mod(self.x[i] - self.x[j], self.length) <= dx_back))
+                cars = self.index.get_range(veh_id, 1, dx_back, dx_forward)
+                self.assertSetEqual(set(cars), in_range)
+                self.assertEqual(len(cars), len(in_range))
+
+    def test_empty(self):
+        index = LaneIndex([], np.array([]), np.array([]), self.length)
+        self.assertDictEqual(index.lane_ids, {})
+
+
+class TestEnvNeighbors(unittest.TestCase):
+    """
+    Tests the neighbor queries of the environment on a two-lane ring road with
+    stochastic lane-changing vehicles.
+    """
+    def setUp(self):
+        vehicles = Vehicles()
+        vehicles.add_vehicles(
+            veh_id="idm", acceleration_controller=(IDMController, {}),
+            lane_change_controller=(StochasticLaneChanger, {}),
+            num_vehicles=10)
+
+        net_params = NetParams(additional_params={
+            "length": 230, "lanes": 2, "speed_limit": 30, "resolution": 40})
+
+        self.env, self.scenario = ring_road_exp_setup(
+            sumo_params=SumoParams(sim_backend="mock",
+                                   subscription_mode="context"),
+            vehicles=vehicles, net_params=net_params,
+            initial_config=InitialConfig(lanes_distribution=2))
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+        self.scenario = None
+
+    def test_leaders(self):
+        for _ in range(5):
+            self.env.step([])
+
+            # in their own lanes, the leading cars of vehicles are their
+            # leaders
+            for veh_id in self.env.ids:
+                self.assertEqual(self.env.get_leading_car(veh_id),
+                                 self.env.vehicles.get_leader(veh_id))
+                self.assertEqual(self.env.get_trailing_car(veh_id),
+                                 self.env.vehicles.get_follower(veh_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,348 @@
+import unittest
+import numpy as np
+
+from flow.core.params import SumoParams
+from flow.core.vehicles import Vehicles
+
+from flow.controllers.routing_controllers import ContinuousRouter
+from flow.controllers.car_following_models import *
+
+from setup_scripts import ring_road_exp_setup, figure_eight_exp_setup
+
+
+def count_messages(env):
+    """
+    Wraps the commands of the mock traci connection of an environment, and
+    returns a list to which the name of every command is appended when it is
+    not deferred by the command batcher of the environment, i.e. when it would
+    be sent to sumo in its own message.
+    """
+    messages = []
+    connection = env.traci_connection
+    batcher = env.command_batcher
+
+    def wrap(name, command):
+        def counted(*args, **kwargs):
+            if not batcher._deferring:
+                messages.append(name)
+            return command(*args, **kwargs)
+        return counted
+
+    connection.simulationStep = wrap("simulationStep",
+                                     connection.simulationStep)
+    for domain in [connection.vehicle, connection.simulation,
+                   connection.junction, connection.lane,
+                   connection.trafficlights]:
+        for name in dir(domain):
+            command = getattr(domain, name)
+            if not name.startswith("_") and callable(command):
+                setattr(domain, name, wrap(name, command))
+
+    return messages
+
+
+class TestMockBackend(unittest.TestCase):
+    """
+    Tests that environments can be run with the mock simulation backend, and
+    that the mock produces consistent vehicle states.
+    """
+    def setUp(self):
+        sumo_params = SumoParams(sim_backend="mock")
+
+        vehicles = Vehicles()
+        vehicles.add_vehicles(veh_id="test",
+                              acceleration_controller=(IDMController, {}),
+                              routing_controller=(ContinuousRouter, {}),
+                              num_vehicles=5)
+
+        # create the environment and scenario classes for a ring road
+        self.env, scenario = ring_road_exp_setup(sumo_params=sumo_params,
+                                                 vehicles=vehicles)
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+
+    def test_initial_state(self):
+        # vehicles are evenly spaced in a ring road of length 230 m
+        ids = self.env.vehicles.get_ids()
+        self.assertListEqual(self.env.vehicles.get_leader(),
+                             ids[1:] + ids[:1])
+        np.testing.assert_array_almost_equal(
+            self.env.vehicles.get_headway(), [230 / 5 - 5] * 5)
+
+    def test_step(self):
+        pos_before = np.array([self.env.get_x_by_id(veh_id)
+                               for veh_id in self.env.ids])
+
+        for _ in range(10):
+            self.env.step([])
+
+        # all vehicles moved forward by the same amount
+        pos_after = np.array([self.env.get_x_by_id(veh_id)
+                              for veh_id in self.env.ids])
+        change = np.mod(pos_after - pos_before, self.env.scenario.length)
+        self.assertTrue(np.all(change > 0))
+        np.testing.assert_array_almost_equal(change, [change[0]] * 5)
+
+    def test_reset(self):
+        for _ in range(10):
+            self.env.step([])
+
+        self.env.reset()
+
+        # vehicles are returned to their initial speeds and positions
+        np.testing.assert_array_almost_equal(
+            self.env.vehicles.get_speed(), [0] * 5)
+        np.testing.assert_array_almost_equal(
+            self.env.vehicles.get_headway(), [230 / 5 - 5] * 5)
+
+
+class TestContextSubscriptions(unittest.TestCase):
+    """
+    Tests that the "context" subscription mode produces the same vehicle
+    states as per-vehicle subscriptions, and keeps updating them after a
+    reset.
+    """
+    def setUp(self):
+        self.envs = []
+        for mode in ["vehicle", "context"]:
+            sumo_params = SumoParams(sim_backend="mock",
+                                     subscription_mode=mode)
+
+            vehicles = Vehicles()
+            vehicles.add_vehicles(veh_id="test",
+                                  acceleration_controller=(IDMController, {}),
+                                  routing_controller=(ContinuousRouter, {}),
+                                  num_vehicles=5)
+
+            env, scenario = ring_road_exp_setup(sumo_params=sumo_params,
+                                                vehicles=vehicles)
+            self.envs.append(env)
+
+    def tearDown(self):
+        # terminate the traci instances
+        for env in self.envs:
+            env.terminate()
+
+        # free data used by the class
+        self.envs = None
+
+    def compare_states(self):
+        vehicle_env, context_env = self.envs
+        self.assertListEqual(vehicle_env.vehicles.get_leader(),
+                             context_env.vehicles.get_leader())
+        self.assertListEqual(vehicle_env.vehicles.get_follower(),
+                             context_env.vehicles.get_follower())
+        np.testing.assert_array_almost_equal(
+            vehicle_env.vehicles.get_headway(),
+            context_env.vehicles.get_headway())
+        np.testing.assert_array_almost_equal(
+            vehicle_env.vehicles.get_speed(),
+            context_env.vehicles.get_speed())
+
+    def test_step_and_reset(self):
+        for _ in range(10):
+            for env in self.envs:
+                env.step([])
+        self.compare_states()
+
+        # per-vehicle subscriptions are lost when vehicles are re-introduced
+        # during a reset, whereas context subscriptions are not
+        context_env = self.envs[1]
+        context_env.reset()
+        for _ in range(10):
+            context_env.step([])
+        ids = context_env.vehicles.get_ids()
+        self.assertListEqual(context_env.vehicles.get_leader(),
+                             ids[1:] + ids[:1])
+        self.assertTrue(np.all(context_env.vehicles.get_speed() > 0))
+
+    def test_invalid_mode(self):
+        self.assertRaises(ValueError, ring_road_exp_setup,
+                          sumo_params=SumoParams(sim_backend="mock",
+                                                 subscription_mode="lane"))
+
+        # leaders cannot be computed from positions outside of ring roads
+        self.assertRaises(ValueError, figure_eight_exp_setup,
+                          sumo_params=SumoParams(sim_backend="mock",
+                                                 subscription_mode="context"))
+
+
+class TestStateReset(unittest.TestCase):
+    """
+    Tests that resetting by loading a snapshot of the simulation returns the
+    vehicles to the same states as removing and re-adding them.
+    """
+    def setUp(self):
+        self.envs = []
+        for mode in ["readd", "state"]:
+            sumo_params = SumoParams(sim_backend="mock", reset_mode=mode)
+
+            vehicles = Vehicles()
+            vehicles.add_vehicles(veh_id="test",
+                                  acceleration_controller=(IDMController, {}),
+                                  routing_controller=(ContinuousRouter, {}),
+                                  num_vehicles=5)
+
+            env, scenario = ring_road_exp_setup(sumo_params=sumo_params,
+                                                vehicles=vehicles)
+            self.envs.append(env)
+
+    def tearDown(self):
+        # terminate the traci instances
+        for env in self.envs:
+            env.terminate()
+
+        # free data used by the class
+        self.envs = None
+
+    def test_reset(self):
+        readd_env, state_env = self.envs
+        for env in self.envs:
+            for _ in range(10):
+                env.step([])
+            env.reset()
+
+        # the simulation time is returned to the start of the rollout
+        self.assertEqual(
+            state_env.traci_connection.simulation.getCurrentTime(),
+            state_env.time_step * 1000)
+
+        for name in ["speed", "position", "headway", "absolute_position"]:
+            np.testing.assert_array_almost_equal(
+                readd_env.vehicles.get_state("all", name),
+                state_env.vehicles.get_state("all", name))
+        self.assertListEqual(readd_env.vehicles.get_leader(),
+                             state_env.vehicles.get_leader())
+        self.assertListEqual(readd_env.vehicles.get_follower(),
+                             state_env.vehicles.get_follower())
+
+        # vehicles keep updating after the reset
+        for _ in range(10):
+            state_env.step([])
+        self.assertTrue(np.all(state_env.vehicles.get_speed() > 0))
+
+    def test_round_trips(self):
+        readd_env, state_env = self.envs
+        for env in self.envs:
+            env.step([])
+
+        # loading the snapshot is the only message that does not carry a
+        # deferred command, whereas re-adding vehicles requires several
+        # messages per vehicle
+        messages = count_messages(state_env)
+        state_env.load_initial_state()
+        self.assertListEqual(messages, ["loadState"])
+
+        messages = count_messages(readd_env)
+        readd_env.readd_vehicles()
+        self.assertGreater(len(messages), 2 * len(readd_env.ids))
+
+    def test_vehicle_subscriptions(self):
+        self.assertEqual(self.envs[1].subscription_mode, "context")
+        self.assertRaises(ValueError, ring_road_exp_setup,
+                          sumo_params=SumoParams(sim_backend="mock",
+                                                 reset_mode="state",
+                                                 subscription_mode="vehicle"))
+
+    def test_single_ring(self):
+        # leaders cannot be computed from positions in other networks
+        self.assertRaises(ValueError, figure_eight_exp_setup,
+                          sumo_params=SumoParams(sim_backend="mock",
+                                                 reset_mode="state"))
+
+    def test_shuffle(self):
+        # the initial arrangement of the vehicles is not used when shuffling
+        state_env = self.envs[1]
+        state_env.starting_position_shuffle = True
+        state_env.reset()
+        state_env.step([])
+        self.assertEqual(
+            state_env.traci_connection.simulation.getCurrentTime(),
+            state_env.time_step * 3000)
+
+
+class TestDynamicVehicles(unittest.TestCase):
+    """
+    Tests that vehicles entering and leaving the network during a rollout are
+    added to and removed from the vehicles class, and that the vehicles of the
+    first rollout are restored upon reset.
+    """
+    def setUp(self):
+        sumo_params = SumoParams(sim_backend="mock", dynamic_vehicles=True)
+
+        vehicles = Vehicles()
+        vehicles.add_vehicles(veh_id="test",
+                              acceleration_controller=(IDMController, {}),
+                              routing_controller=(ContinuousRouter, {}),
+                              num_vehicles=5)
+
+        # create the environment and scenario classes for a ring road
+        self.env, scenario = ring_road_exp_setup(sumo_params=sumo_params,
+                                                 vehicles=vehicles)
+        self.traci = self.env.traci_connection
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+        self.traci = None
+
+    def compare_states(self):
+        ids = self.traci.vehicle.getIDList()
+        self.assertListEqual(sorted(self.env.ids), sorted(ids))
+        np.testing.assert_array_almost_equal(
+            self.env.vehicles.get_speed(ids),
+            [self.traci.vehicle.getSpeed(veh_id) for veh_id in ids])
+        self.assertListEqual(
+            sorted(self.env.sorted_ids), sorted(self.env.ids))
+
+        # the accelerations of the batched controllers match the scalar ones
+        np.testing.assert_array_almost_equal(
+            self.env.batch_controller.get_actions(self.env),
+            [self.env.vehicles.get_acc_controller(veh_id).get_action(self.env)
+             for veh_id in self.env.controlled_ids])
+
+    def test_step_and_reset(self):
+        for _ in range(10):
+            self.env.step([])
+
+        # a vehicle leaves the network, and two vehicles enter it
+        self.traci.vehicle.remove("test_1")
+        self.traci.vehicle.addFull("test_in", "routebottom", typeID="test",
+                                   departPos="20", departSpeed="5")
+        self.traci.vehicle.addFull("sumo_in", "routetop", typeID="sumo",
+                                   departSpeed="5")
+        self.env.step([])
+
+        self.assertNotIn("test_1", self.env.vehicles)
+        self.assertIn("test_in", self.env.controlled_ids)
+        self.assertIn("sumo_in", self.env.sumo_ids)
+        self.assertEqual(self.env.vehicles.get_speed("test_in"), 5)
+        self.assertListEqual(self.env.vehicles.get_route("test_in"),
+                             self.env.available_routes["bottom"])
+        self.compare_states()
+
+        # the new vehicles are observed from their subscriptions
+        for _ in range(10):
+            self.env.step([])
+        self.assertIn("test_in", self.env.vehicles.get_leader())
+        self.compare_states()
+
+        # the initial vehicles are restored upon reset
+        self.env.reset()
+        self.assertListEqual(self.env.ids,
+                             ["test_%d" % i for i in range(5)])
+        self.assertListEqual(sorted(self.traci.vehicle.getIDList()),
+                             self.env.ids)
+        self.assertEqual(self.env.vehicles.num_vehicles, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+
+from flow.core import multi_agent_rewards
+from flow.core import rewards
+from flow.core.params import SumoParams, EnvParams, NetParams, InitialConfig
+from flow.core.vehicles import Vehicles
+from flow.controllers.car_following_models import IDMController
+from flow.controllers.rlcontroller import RLController
+from flow.controllers.routing_controllers import ContinuousRouter
+from flow.envs.loop_accel import SimpleMultiAgentAccelerationEnvironment
+from flow.scenarios.loop.gen import CircleGenerator
+from flow.scenarios.loop.loop_scenario import LoopScenario
+
+
+class TestMultiAgentObservations(unittest.TestCase):
+    """
+    Tests that the agents of a multi-agent ring road environment share a
+    single observation matrix per step, and that their rewards match the
+    reward computed from the state of each agent.
+    """
+    def setUp(self):
+        vehicles = Vehicles()
+        vehicles.add_vehicles(veh_id="idm",
+                              acceleration_controller=(IDMController, {}),
+                              routing_controller=(ContinuousRouter, {}),
+                              num_vehicles=5)
+        vehicles.add_vehicles(veh_id="rl",
+                              acceleration_controller=(RLController, {}),
+                              routing_controller=(ContinuousRouter, {}),
+                              num_vehicles=3)
+
+        net_params = NetParams(additional_params={
+            "length": 230, "lanes": 1, "speed_limit": 30, "resolution": 40})
+
+        self.scenario = LoopScenario(name="MultiAgentTest",
+                                     generator_class=CircleGenerator,
+                                     vehicles=vehicles,
+                                     net_params=net_params,
+                                     initial_config=InitialConfig())
+
+        self.env = SimpleMultiAgentAccelerationEnvironment(
+            env_params=EnvParams(additional_params={"target_velocity": 8}),
+            sumo_params=SumoParams(sim_backend="mock"),
+            scenario=self.scenario)
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+        self.scenario = None
+
+    def test_observations(self):
+        actions = [np.array([1.]), np.array([0.5]), np.array([0.])]
+        for _ in range(20):
+            state, reward, _, info = self.env.step(actions)
+
+        # all agents observe the speeds and positions of the sorted vehicles
+        self.assertEqual(state.shape, (3, 2, 8))
+        for agent_state in state:
+            np.testing.assert_array_equal(
+                agent_state[0],
+                self.env.vehicles.get_speed(self.env.sorted_ids))
+            np.testing.assert_array_equal(
+                agent_state[1],
+                self.env.vehicles.get_absolute_position(self.env.sorted_ids))
+            self.assertTrue(np.shares_memory(agent_state, state[0]))
+
+        # flattened observations for a shared policy, without copies
+        observations = self.env.get_agent_observations()
+        self.assertEqual(observations.shape, (3, 16))
+        self.assertTrue(np.shares_memory(observations, state))
+
+        # the reward of each agent is computed from its own state
+        expected = rewards.velocity_reward(state[0][0], 8)
+        self.assertGreater(expected, 0)
+        self.assertListEqual(info["reward_n"], [expected] * 3)
+        self.assertAlmostEqual(reward, 3 * expected)
+
+    def test_rewards(self):
+        # states that are not shared are computed for each agent
+        state = np.random.RandomState(0).uniform(0, 10, size=(3, 2, 8))
+        reward = multi_agent_rewards.desired_velocity(
+            state, None, fail=False, target_velocity=8)
+        self.assertListEqual(
+            reward, [rewards.velocity_reward(s[0], 8) for s in state])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from flow.core.net_cache import NetCache, fcntl
+
+
+class TestNetCache(unittest.TestCase):
+    """
+    Tests the storage, retrieval, and eviction of networks in the cache of
+    networks.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = NetCache(os.path.join(self.tmp_dir, "cache"), max_size=2)
+
+        # network file generated by netconvert
+        self.net_file = os.path.join(self.tmp_dir, "test.net.xml")
+        with open(self.net_file, "w") as f:
+            f.write("<net/>")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+        # free data used by the class
+        self.cache = None
+
+    def test_key(self):
+        key = NetCache.key("true", b"<nodes/>", b"<edges/>")
+        self.assertEqual(key, NetCache.key("true", b"<nodes/>", b"<edges/>"))
+        self.assertNotEqual(
+            key, NetCache.key("false", b"<nodes/>", b"<edges/>"))
+        self.assertNotEqual(NetCache.key(b"ab", b"c"),
+                            NetCache.key(b"a", b"bc"))
+
+    def test_fetch(self):
+        dest = os.path.join(self.tmp_dir, "copy.net.xml")
+        self.assertFalse(self.cache.fetch("a", dest))
+        self.assertFalse(os.path.exists(dest))
+
+        self.cache.store("a", self.net_file)
+        self.assertTrue(self.cache.fetch("a", dest))
+        with open(dest) as f:
+            self.assertEqual(f.read(), "<net/>")
+
+    def test_evict(self):
+        self.cache.store("a", self.net_file)
+        self.cache.store("b", self.net_file)
+
+        # the least recently used network is evicted
+        path_a = os.path.join(self.cache.cache_dir, "a.net.xml")
+        path_b = os.path.join(self.cache.cache_dir, "b.net.xml")
+        os.utime(path_a, (1, 1))
+        os.utime(path_b, (2, 2))
+        self.assertTrue(self.cache.fetch("a", self.net_file))
+
+        self.cache.store("c", self.net_file)
+        cached = sorted(name for name in os.listdir(self.cache.cache_dir)
+                        if name.endswith(".net.xml"))
+        self.assertListEqual(cached, ["a.net.xml", "c.net.xml"])
+
+    def test_evict_lock(self):
+        # the lock files of evicted networks are removed, unless the network
+        # is locked
+        for key in ["a", "b"]:
+            with self.cache.lock(key):
+                self.cache.store(key, self.net_file)
+        os.utime(os.path.join(self.cache.cache_dir, "a.net.xml"), (1, 1))
+        with self.cache.lock("c"):
+            self.cache.store("c", self.net_file)
+
+        lock_files = sorted(name for name in os.listdir(self.cache.cache_dir)
+                            if name.endswith(".lock"))
+        if fcntl is not None:
+            self.assertListEqual(lock_files, ["b.lock", "c.lock"])
+
+        os.utime(os.path.join(self.cache.cache_dir, "b.net.xml"), (2, 2))
+        with self.cache.lock("b"):
+            self.cache.max_size = 1
+            self.cache.evict()
+        self.assertTrue(self.cache.fetch("c", self.net_file))
+        self.assertFalse(self.cache.fetch("b", self.net_file))
+        if fcntl is not None:
+            self.assertTrue(os.path.exists(
+                os.path.join(self.cache.cache_dir, "b.lock")))
+
+        # networks whose lock file was removed can be locked again
+        with self.cache.lock("a") as locked:
+            self.assertEqual(locked, fcntl is not None)
+
+    def test_lock(self):
+        with self.cache.lock("a"):
+            self.cache.store("a", self.net_file)
+        self.assertTrue(self.cache.fetch("a", self.net_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+import numpy as np
+
+from flow.core.ordering import IncrementalOrdering
+
+
+class TestIncrementalOrdering(unittest.TestCase):
+    """
+    Tests that the order maintained across updates matches a full sort of the
+    keys, and is only repaired when vehicles change order.
+    """
+    def setUp(self):
+        self.ids = ["veh_%d" % i for i in range(50)]
+        self.ordering = IncrementalOrdering(self.ids)
+
+    def tearDown(self):
+        # free data used by the class
+        self.ordering = None
+
+    def test_keys(self):
+        rng = np.random.RandomState(0)
+        x = rng.uniform(0, 100, size=50)
+        for _ in range(100):
+            # vehicles move a little, and occasionally overtake each other
+            x += rng.uniform(0, 1, size=50)
+            sorted_index = self.ordering.update(x)
+            np.testing.assert_array_equal(sorted_index,
+                                          np.argsort(x, kind="mergesort"))
+            self.assertListEqual(list(self.ordering.get_sorted_ids()),
+                                 [self.ids[i] for i in sorted_index])
+        self.assertLess(self.ordering.num_sorts, 100)
+
+        # the order is not repaired when it is still sorted
+        num_sorts = self.ordering.num_sorts
+        self.ordering.update(x + 1)
+        self.assertEqual(self.ordering.num_sorts, num_sorts)
+
+    def test_groups(self):
+        rng = np.random.RandomState(1)
+        for _ in range(20):
+            x = rng.uniform(0, 100, size=50)
+            groups = rng.randint(-1, 3, size=50)
+            sorted_index = self.ordering.update(x, groups)
+
+            # vehicles with a negative group are excluded
+            expected = np.lexsort((x, groups))
+            expected = expected[groups[expected] >= 0]
+            np.testing.assert_array_equal(sorted_index, expected)
+
+    def test_ties(self):
+        # vehicles with equal keys keep their previous order
+        self.ordering.update(np.arange(50)[::-1])
+        sorted_index = self.ordering.update(np.zeros(50))
+        np.testing.assert_array_equal(sorted_index, np.arange(50)[::-1])
+
+    def test_reindex(self):
+        x = np.arange(50.)[::-1]
+        self.ordering.update(x)
+
+        # vehicles 0 and 10 leave the network, and a new vehicle enters ahead
+        # of all others
+        new_index = np.arange(50) - 1
+        new_index[10:] -= 1
+        new_index[[0, 10]] = -1
+        ids = [self.ids[i] for i in range(50) if i not in (0, 10)] + ["new"]
+        self.ordering.reindex(ids, new_index)
+
+        num_sorts = self.ordering.num_sorts
+        keys = np.append(np.delete(x, [0, 10]), 100.)
+        sorted_index = self.ordering.update(keys)
+        self.assertEqual(self.ordering.num_sorts, num_sorts)
+        self.assertListEqual(list(self.ordering.get_sorted_ids()),
+                             ids[-2::-1] + ["new"])
+
+        # the order is repaired when the new vehicle does not enter last
+        keys[-1] = 20.5
+        sorted_index = self.ordering.update(keys)
+        np.testing.assert_array_equal(sorted_index,
+                                      np.argsort(keys, kind="mergesort"))
+        self.assertEqual(self.ordering.num_sorts, num_sorts + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from flow.core.params import SumoParams
+from flow.core.profiler import PHASES
+from flow.core.vehicles import Vehicles
+from flow.controllers.routing_controllers import ContinuousRouter
+from flow.controllers.car_following_models import IDMController
+from flow.controllers.rlcontroller import RLController
+
+from setup_scripts import ring_road_exp_setup
+
+
+class TestStepProfiler(unittest.TestCase):
+    """
+    Tests that the phases of the steps of a ring road environment are timed
+    when requested, and that the traces of the steps of every episode are
+    written.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+        vehicles = Vehicles()
+        vehicles.add_vehicles(veh_id="idm",
+                              acceleration_controller=(IDMController, {}),
+                              routing_controller=(ContinuousRouter, {}),
+                              num_vehicles=4)
+        vehicles.add_vehicles(veh_id="rl",
+                              acceleration_controller=(RLController, {}),
+                              routing_controller=(ContinuousRouter, {}),
+                              num_vehicles=1)
+
+        sumo_params = SumoParams(sim_backend="mock",
+                                 step_profile_size=8,
+                                 step_trace_path=self.path)
+
+        self.env, self.scenario = ring_road_exp_setup(sumo_params=sumo_params,
+                                                      vehicles=vehicles)
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+        self.scenario = None
+        shutil.rmtree(self.path)
+
+    def test_profile(self):
+        self.assertEqual(len(self.env.get_step_profile()), 0)
+
+        for _ in range(5):
+            self.env.step([1.])
+        profile = self.env.get_step_profile([50, 100])
+        self.assertListEqual(list(profile), PHASES + ["step"])
+        self.assertEqual(profile["step"].shape, (2,))
+
+        # steps last longer than their phases, and the trajectories are not
+        # recorded
+        for phase in PHASES:
+            self.assertLessEqual(profile[phase][1], profile["step"][1])
+        self.assertEqual(profile["recording"][1], 0)
+        self.assertGreater(profile["simulation_step"][0], 0)
+
+    def test_trace(self):
+        for _ in range(10):
+            self.env.step([1.])
+        self.env.reset()
+        for _ in range(3):
+            self.env.step([1.])
+        self.env.reset()
+
+        # only the last steps of the first episode are kept
+        filename = os.path.join(self.path, "RingRoadTest-step-trace-0.json")
+        with open(filename) as f:
+            events = json.load(f)["traceEvents"]
+        steps = [event for event in events if event["name"] == "step"]
+        self.assertListEqual([event["args"]["step"] for event in steps],
+                             list(range(2, 10)))
+        # every step has an event, as well as all of its phases except for
+        # the recording of trajectories
+        self.assertEqual(len(events), 8 * len(PHASES))
+
+        # phases are performed in order within their step
+        for step in steps:
+            phases = [event for event in events
+                      if event["args"] == step["args"]
+                      and event["name"] != "step"]
+            starts = [event["ts"] for event in phases]
+            self.assertListEqual(starts, sorted(starts))
+            self.assertGreaterEqual(starts[0], step["ts"])
+            self.assertLessEqual(phases[-1]["ts"] + phases[-1]["dur"],
+                                 step["ts"] + step["dur"] + 1e-3)
+
+        filename = os.path.join(self.path, "RingRoadTest-step-trace-1.json")
+        with open(filename) as f:
+            events = json.load(f)["traceEvents"]
+        self.assertEqual(len(events), 3 * len(PHASES))
+
+    def test_disabled(self):
+        env, _ = ring_road_exp_setup(
+            sumo_params=SumoParams(sim_backend="mock"))
+        self.assertIsNone(env.step_profiler)
+        self.assertRaises(ValueError, env.get_step_profile)
+        env.terminate()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+
+from flow.core import rewards
+from flow.core import multi_agent_rewards
+
+
+class TestRewardKernels(unittest.TestCase):
+    """
+    Tests that the vectorized reward kernels match their definitions computed
+    vehicle by vehicle, and that the reward of each agent matches the reward
+    computed from its state alone.
+    """
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.speeds = rng.uniform(0, 30, size=(3, 20))
+        self.headways = rng.uniform(0, 40, size=(3, 20))
+        self.target_velocity = 25
+
+    def tearDown(self):
+        # free data used by the class
+        self.speeds = None
+        self.headways = None
+
+    def test_velocity_reward(self):
+        for speeds in self.speeds:
+            max_cost = np.linalg.norm([self.target_velocity] * len(speeds))
+            cost = np.linalg.norm(speeds - self.target_velocity)
+            self.assertAlmostEqual(
+                rewards.velocity_reward(speeds, self.target_velocity),
+                max(max_cost - cost, 0))
+
+        # invalid speeds
+        speeds = self.speeds.copy()
+        speeds[1, 3] = -1001
+        np.testing.assert_array_equal(
+            rewards.velocity_reward(speeds, self.target_velocity) == 0,
+            [False, True, False])
+
+    def test_headway_penalty(self):
+        threshold = 10
+        for headways in self.headways:
+            expected = len(headways) * 2
+            for headway in headways:
+                if headway < threshold:
+                    expected -= 2 * ((threshold - headway) / threshold) ** 2
+            self.assertAlmostEqual(
+                rewards.headway_penalty(headways, threshold, 2, 2), expected)
+
+    def test_lane_change_penalty(self):
+        last_lc = np.array([[3, 5, 5, -1], [5, 5, 5, 5]])
+        np.testing.assert_array_equal(
+            rewards.lane_change_penalty(last_lc, 5, penalty=2), [-4, -8])
+
+    def test_multi_agent(self):
+        # states of the agents are tuples of lists of speeds and positions
+        state = [(speeds.tolist(), list(range(20))) for speeds in self.speeds]
+
+        reward = multi_agent_rewards.desired_velocity(
+            state, None, fail=False, target_velocity=self.target_velocity)
+        for i, speeds in enumerate(self.speeds):
+            self.assertAlmostEqual(
+                reward[i],
+                rewards.velocity_reward(speeds, self.target_velocity))
+
+        reward = multi_agent_rewards.min_delay(
+            state, None, fail=False, target_velocity=self.target_velocity,
+            time_step=0.1)
+        for i, speeds in enumerate(self.speeds):
+            max_cost = 0.1 * len(speeds)
+            cost = 0.1 * sum((self.target_velocity - speeds) /
+                             self.target_velocity)
+            self.assertAlmostEqual(reward[i], max(max_cost - cost, 0))
+
+        reward = multi_agent_rewards.distance_traveled(
+            state, None, fail=False, time_step=0.1)
+        np.testing.assert_array_almost_equal(
+            reward, 0.1 * self.speeds.sum(axis=1))
+
+        self.assertListEqual(multi_agent_rewards.desired_velocity(
+            state, None, fail=True, target_velocity=self.target_velocity),
+            [0.0] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
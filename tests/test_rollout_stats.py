@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+
+from flow.core.rollout_stats import RunningStats
+
+
+class TestRunningStats(unittest.TestCase):
+    """
+    Tests that the online mean and variance at every time step match those
+    computed from all rollouts at once, including rollouts that terminate
+    early.
+    """
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.lengths = [20, 20, 15, 20, 5, 20]
+        self.rollouts = [rng.normal(3, 2, size=(length, 4))
+                         for length in self.lengths]
+
+    def tearDown(self):
+        # free data used by the class
+        self.rollouts = None
+
+    def test_stats(self):
+        stats = RunningStats(20, 4)
+        for values in self.rollouts:
+            stats.update(values)
+
+        np.testing.assert_array_equal(
+            stats.count, [6] * 5 + [5] * 10 + [4] * 5)
+        for t in range(20):
+            values = np.array([rollout[t] for rollout in self.rollouts
+                               if len(rollout) > t])
+            np.testing.assert_array_almost_equal(stats.mean[t],
+                                                 values.mean(axis=0))
+            np.testing.assert_array_almost_equal(stats.variance[t],
+                                                 values.var(axis=0))
+
+    def test_scalar(self):
+        stats = RunningStats(25)
+        for values in self.rollouts:
+            stats.update(values[:, 0])
+
+        rewards = np.array([values[:5, 0] for values in self.rollouts])
+        np.testing.assert_array_almost_equal(stats.mean[:5],
+                                             rewards.mean(axis=0))
+
+        # time steps that no rollout reached have no statistics
+        self.assertTrue(np.all(np.isnan(stats.mean[20:])))
+        self.assertTrue(np.all(np.isnan(stats.variance[20:])))
+
+        self.assertRaises(ValueError, stats.update, np.zeros(30))
+
+
+if __name__ == '__main__':
+    unittest.main()
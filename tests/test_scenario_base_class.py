@@ -1,9 +1,11 @@
 import unittest
+from lxml import etree
 
 from flow.core.params import SumoParams, EnvParams, InitialConfig, NetParams
 from flow.core.vehicles import Vehicles
 
 from flow.controllers.routing_controllers import ContinuousRouter
+from flow.controllers.rlcontroller import RLController
 from flow.controllers.car_following_models import *
 
 from setup_scripts import ring_road_exp_setup, figure_eight_exp_setup
@@ -60,6 +62,184 @@ class TestGetEdge(unittest.TestCase):
             self.scenario.get_edge(x2), (":bottom_lower_ring", 0.1))
 
 
+class TestEdgeIndex(unittest.TestCase):
+    """
+    Tests that the vectorized get_edge_array and get_x_array functions match
+    the scalar get_edge and get_x functions, for positions in links and in
+    internal edges (figure 8).
+    """
+    def setUp(self):
+        # create the environment and scenario classes for a figure eight
+        self.env, self.scenario = figure_eight_exp_setup(
+            sumo_params=SumoParams(sim_backend="mock"))
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+        self.scenario = None
+
+    def runTest(self):
+        x = np.append(np.linspace(-1, self.scenario.length, 1000), np.nan)
+        edges, positions = self.scenario.get_edge_array(x)
+        for i in range(len(x)):
+            edge, pos = self.scenario.get_edge(x[i])
+            self.assertEqual(edges[i], edge)
+            self.assertAlmostEqual(positions[i], pos)
+
+        # positions before the first edge do not belong to any edge
+        self.assertTupleEqual(self.scenario.get_edge(-1), ("", 0))
+        self.assertTupleEqual(self.scenario.get_edge(np.nan), ("", 0))
+
+        # positions are recovered from the edges, including internal edges
+        # whose names are extended by sumo (e.g. lane ids)
+        valid = x >= 0
+        edges = [edge + "_0" if edge.startswith(":") else edge
+                 for edge in np.array(edges)[valid]]
+        np.testing.assert_array_almost_equal(
+            self.scenario.get_x_array(edges, positions[valid]), x[valid])
+        self.assertAlmostEqual(
+            self.scenario.get_x(":bottom_lower_ring_0", 0.1), 0.1)
+
+        # unknown edges have no position
+        self.assertIsNone(self.scenario.get_x("unknown", 0))
+        self.assertTrue(np.isnan(
+            self.scenario.get_x_array(["unknown"], [0])[0]))
+
+
+class TestPlaceVehicles(unittest.TestCase):
+    """
+    Tests that the function place_vehicles, used by the start position
+    generators, places vehicles one after the other in each lane, and moves
+    the vehicles placed in internal edges (figure 8) to the start of the next
+    edge, the following vehicles in their lanes being placed from there.
+    """
+    def setUp(self):
+        # create the environment and scenario classes for a figure eight
+        self.env, self.scenario = figure_eight_exp_setup(
+            sumo_params=SumoParams(sim_backend="mock"))
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+        self.scenario = None
+
+    def runTest(self):
+        increments = np.random.RandomState(0).uniform(0, 30, size=60)
+        x, lanes = self.scenario.place_vehicles(
+            10, increments, 2, self.scenario.length)
+
+        # place the vehicles one at a time
+        expected_x = []
+        lane_x = [10, 10]
+        for i in range(len(increments)):
+            lane = i % 2
+            if self.scenario.get_edge(lane_x[lane])[0].startswith(":"):
+                lane_x[lane] = self.scenario.next_edge_start(lane_x[lane])
+            expected_x.append(lane_x[lane])
+            lane_x[lane] = \
+                (lane_x[lane] + increments[i]) % self.scenario.length
+
+        np.testing.assert_array_almost_equal(x, expected_x)
+        np.testing.assert_array_equal(lanes, np.arange(60) % 2)
+        self.assertFalse(self.scenario.in_internal_edge(x).any())
+
+
+class TestMakeRoutes(unittest.TestCase):
+    """
+    Tests that the routes file streamed by the generator contains the types
+    and departures of all vehicles, in order of departure, and that vehicles
+    sharing their departure parameters are grouped into flows when requested.
+    """
+    def setUp(self):
+        # create the environment and scenario classes for a ring road
+        self.env, self.scenario = ring_road_exp_setup(
+            sumo_params=SumoParams(sim_backend="mock"))
+        self.generator = self.scenario.generator
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+        self.scenario = None
+        self.generator = None
+
+    def read_routes(self):
+        return etree.parse(self.generator.cfg_path + self.generator.roufn)
+
+    def test_vehicles(self):
+        routes = self.read_routes().getroot()
+        self.assertEqual(routes.tag, "routes")
+        self.assertListEqual(
+            [vtype.get("id") for vtype in routes.iter("vType")],
+            self.scenario.vehicles.types)
+        self.assertListEqual(
+            [vehicle.get("id") for vehicle in routes.iter("vehicle")],
+            self.generator.vehicle_ids)
+
+        positions = self.scenario.initial_config.positions
+        for vehicle, (edge, pos) in zip(routes.iter("vehicle"), positions):
+            self.assertEqual(vehicle.get("route"), "route" + edge)
+            self.assertEqual(vehicle.get("departPos"), str(pos))
+
+    def test_departures(self):
+        # vehicles with identical departure parameters are written one by one
+        departures = [
+            ("a", "idm", "routebottom", "0", {"depart": "0"}),
+            ("b", "idm", "routebottom", "0", {"depart": "0"}),
+            ("c", "idm", "routetop", "0", {"depart": "0"}),
+            ("d", "idm", "routebottom", "0", {"depart": "0"}),
+            ("e", "idm", "routebottom", "0", {"depart": "1"})]
+
+        self.generator.write_routes([], departures)
+        routes = self.read_routes().getroot()
+        self.assertListEqual([element.get("id") for element in routes],
+                             ["a", "b", "c", "d", "e"])
+
+    def test_flows(self):
+        # vehicles are grouped regardless of their departure positions
+        departures = [
+            ("a", "idm", "routebottom", "0", dict(depart="0", departLane="0")),
+            ("b", "idm", "routebottom", "5", dict(depart="0", departLane="0")),
+            ("c", "idm", "routebottom", "9", dict(depart="0", departLane="1")),
+            ("d", "idm", "routebottom", "7", dict(depart="0", departLane="0")),
+            ("e", "idm", "routetop", "3", dict(depart="0", departLane="0"))]
+
+        names = self.generator.write_routes([], departures, flows=True)
+        routes = self.read_routes().getroot()
+        self.assertListEqual([element.tag for element in routes],
+                             ["flow", "vehicle", "vehicle"])
+        self.assertDictEqual(dict(routes[0].attrib),
+                             {"id": "a", "number": "3", "type": "idm",
+                              "route": "routebottom", "begin": "0",
+                              "end": "0", "departPos": "free",
+                              "departLane": "0"})
+        self.assertListEqual([vehicle.get("id") for vehicle in routes[1:]],
+                             ["c", "e"])
+
+        # the vehicles of the flow are named by sumo
+        self.assertDictEqual(names, {"a": "a.0", "b": "a.1", "d": "a.2"})
+
+    def test_rename_vehicles(self):
+        vehicles = Vehicles()
+        vehicles.add_vehicles("idm", (IDMController, {}), num_vehicles=3)
+        vehicles.add_vehicles("rl", (RLController, {}), num_vehicles=1)
+
+        self.generator.rename_vehicles(vehicles, {"idm_0": "idm_0.0",
+                                                  "idm_2": "idm_0.1"})
+        self.assertListEqual(vehicles.get_ids(),
+                             ["idm_0.0", "idm_1", "idm_0.1", "rl_0"])
+        self.assertListEqual(vehicles.get_rl_ids(), ["rl_0"])
+        self.assertEqual(vehicles.get_state("idm_0.1", "type"), "idm")
+
+
 class TestEvenStartPos(unittest.TestCase):
     """
     Tests the function gen_even_start_pos in base_scenario.py. This function can
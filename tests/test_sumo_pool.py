@@ -0,0 +1,133 @@
+import unittest
+
+from flow.core.command_batcher import CommandBatcher
+from flow.core.params import SumoParams
+from flow.core.sumo_pool import SumoProcessPool, close_pools
+
+from setup_scripts import ring_road_exp_setup
+
+
+class TestSumoPool(unittest.TestCase):
+    """
+    Tests that environments using the "traci_pool" backend reuse the sumo
+    processes of terminated environments, and that crashed processes are
+    replaced.
+    """
+    def setUp(self):
+        self.sumo_params = SumoParams(sim_backend="traci_pool", pool_size=1)
+
+    def tearDown(self):
+        # kill the processes of the pools
+        close_pools()
+
+        # free data used by the class
+        self.sumo_params = None
+
+    def test_recycle(self):
+        env, scenario = ring_road_exp_setup(sumo_params=self.sumo_params)
+        port = env.port
+        for _ in range(10):
+            env.step([])
+        env.terminate()
+
+        # the process of the terminated environment is handed out again, at
+        # the start of its simulation
+        env, scenario = ring_road_exp_setup(sumo_params=self.sumo_params)
+        self.assertEqual(env.port, port)
+        self.assertEqual(
+            env.traci_connection.simulation.getCurrentTime(),
+            env.time_step * 1000)
+        env.terminate()
+
+    def test_respawn(self):
+        env, scenario = ring_road_exp_setup(sumo_params=self.sumo_params)
+        env.terminate()
+
+        # kill the recycled process
+        pool = env.sim_backend.pool
+        process, port, connection = pool.idle[0]
+        process.kill()
+        process.wait()
+
+        env, scenario = ring_road_exp_setup(sumo_params=self.sumo_params)
+        self.assertNotEqual(env.port, port)
+        env.step([])
+        env.terminate()
+
+
+class _Process:
+    """
+    Stand-in for a running sumo process.
+    """
+    def poll(self):
+        return None
+
+
+class _SimulationDomain:
+    def getCurrentTime(self):
+        return 0
+
+
+class _Connection:
+    """
+    Stand-in for a traci connection to a pooled sumo process, counting the
+    messages sent to sumo.
+    """
+    def __init__(self):
+        self._queue = []
+        self._string = bytes()
+        self.simulation = _SimulationDomain()
+        self.num_messages = 0
+        self.num_loads = 0
+
+    def _sendExact(self):
+        self.num_messages += 1
+        self._queue = []
+
+    def load(self, args):
+        self.num_loads += 1
+
+
+class TestRecycledConnection(unittest.TestCase):
+    """
+    Tests that connections are returned to the pool without the changes made
+    to them by the environments that used them.
+    """
+    def setUp(self):
+        self.connection = _Connection()
+        self.pool = SumoProcessPool(["sumo"], size=0)
+        self.pool.size = 1
+        self.pool.idle.append((_Process(), 1234, self.connection))
+
+    def tearDown(self):
+        # free data used by the class
+        self.connection = None
+        self.pool = None
+
+    def test_acquire_release(self):
+        for i in range(5):
+            connection, port = self.pool.acquire()
+            self.assertIs(connection, self.connection)
+            self.assertEqual(port, 1234)
+
+            # environments wrap the connection in a command batcher, and may
+            # leave deferred commands behind
+            batcher = CommandBatcher(connection)
+            batcher.defer(connection._queue.append, "slowDown")
+            connection._sendExact()
+            self.assertEqual(batcher.round_trips, 1)
+
+            batcher.defer(connection._queue.append, "slowDown")
+            self.pool.release(connection)
+
+            # the connection is reset before being recycled
+            self.assertEqual(len(self.pool.idle), 1)
+            self.assertEqual(connection.num_loads, i + 1)
+            self.assertListEqual(connection._queue, [])
+            self.assertFalse(hasattr(connection, "_flow_send_exact"))
+            self.assertEqual(connection._sendExact.__func__,
+                             _Connection._sendExact)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+
+import numpy as np
+
+from flow.core.params import SumoParams
+from flow.core.traffic_lights import TrafficLightTracker, get_program
+
+from setup_scripts import ring_road_exp_setup, CONTROLLED_LANES, PROGRAM
+
+
+class TestTrafficLightTracker(unittest.TestCase):
+    """
+    Tests that the remaining and next green times computed from the cached
+    program of a traffic light match the times observed while the traffic
+    light cycles through its program.
+    """
+    def setUp(self):
+        # create the environment and scenario classes for a ring road
+        self.env, _ = ring_road_exp_setup(
+            sumo_params=SumoParams(sim_backend="mock", time_step=0.5))
+
+        self.traci = self.env.traci_connection
+        self.traci.add_traffic_light("tls", CONTROLLED_LANES, PROGRAM)
+        self.lanes = ["bottom_0", "bottom_1", "right_0", "right_1"]
+        self.tracker = TrafficLightTracker(self.traci, "tls", self.lanes)
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+        self.traci = None
+        self.tracker = None
+
+    def test_green_times(self):
+        times, green, remaining_green, next_green = [], [], [], []
+        for _ in range(3 * 68):
+            self.tracker.update(self.env.get_current_time())
+            times.append(self.traci.simulation.getCurrentTime())
+            state = self.traci.trafficlights.getRedYellowGreenState("tls")
+            green.append([state[2 * i] in "Gg" and state[2 * i + 1] in "Gg"
+                          for i in [0, 1, 2, 3]])
+            rg, ng = self.tracker.get_green_times([0, 1, 2, 3])
+            remaining_green.append(rg)
+            next_green.append(ng)
+            self.traci.simulationStep()
+
+        times = np.array(times)
+        green = np.array(green)
+
+        # only the straight and right links are green in the left turn phases
+        self.assertEqual(np.sum(green[:68, 0]), 20)
+        self.assertEqual(np.sum(green[:68, 1]), 20)
+
+        for t in range(68):
+            for lane in range(4):
+                later = np.arange(t + 1, len(times))
+                if green[t, lane]:
+                    end = later[~green[later, lane]][0]
+                    self.assertAlmostEqual(remaining_green[t][lane],
+                                           (times[end] - times[t]) / 1000)
+                    later = later[later > end]
+                else:
+                    self.assertEqual(remaining_green[t][lane], 0)
+                start = later[green[later, lane]][0]
+                self.assertAlmostEqual(next_green[t][lane],
+                                       (times[start] - times[t]) / 1000)
+
+    def test_unknown_state(self):
+        # states that are not part of the program have no green times
+        self.traci.trafficlights.setRedYellowGreenState("tls", "G" * 16)
+        self.tracker.update(self.env.get_current_time())
+        self.assertEqual(self.tracker.phase, -1)
+        rg, ng = self.tracker.get_green_times([0, 1, 2, 3])
+        np.testing.assert_array_equal(rg, 0)
+        np.testing.assert_array_equal(ng, 0)
+
+        # states that are part of the program are identified by their state
+        self.traci.trafficlights.setRedYellowGreenState("tls", PROGRAM[2][1])
+        self.tracker.update(self.env.get_current_time())
+        self.assertEqual(self.tracker.phase, 2)
+
+    def test_invalid_lane(self):
+        self.assertRaises(ValueError, TrafficLightTracker, self.traci, "tls",
+                          ["bottom_0", "center_0"])
+
+    def test_program(self):
+        # the tracker defaults to all lanes controlled by the traffic light
+        tracker = TrafficLightTracker(self.traci, "tls")
+        self.assertListEqual(tracker.lanes, sorted(set(CONTROLLED_LANES)))
+
+        # definitions of traci versions prior to sumo 1.0 (durations in ms)
+        class Phase:
+            def __init__(self, duration, state):
+                self._duration = 1000 * duration
+                self._phaseDef = state
+
+        class Logic:
+            def __init__(self, program_id, phases):
+                self._subID = program_id
+                self._phases = [Phase(*phase) for phase in phases]
+
+        durations, states = get_program(
+            [Logic("0", PROGRAM[:2]), Logic("1", PROGRAM[2:])], "1")
+        self.assertListEqual(durations, [3, 2, 10, 2, 3, 2])
+        self.assertListEqual(states, [state for _, state in PROGRAM[2:]])
+
+        # these versions also report the times of the next switch in ms
+        self.tracker.update(self.env.get_current_time())
+        tls = self.traci.trafficlights
+        next_switch = tls.getNextSwitch("tls")
+        tls.getCompleteRedYellowGreenDefinition = \
+            lambda tls_id: [Logic("0", PROGRAM)]
+        tls.getNextSwitch = lambda tls_id: 1000 * next_switch
+        tracker = TrafficLightTracker(self.traci, "tls", self.lanes)
+        tracker.update(self.env.get_current_time())
+        self.assertAlmostEqual(tracker.remaining, self.tracker.remaining)
+        self.assertAlmostEqual(tracker.remaining, PROGRAM[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
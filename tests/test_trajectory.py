@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from flow.core.params import SumoParams
+from flow.core.trajectory import TrajectoryRecorder, load_trajectory
+from flow.core.vehicles import Vehicles
+from flow.controllers.routing_controllers import ContinuousRouter
+from flow.controllers.car_following_models import IDMController
+from flow.controllers.rlcontroller import RLController
+
+from setup_scripts import ring_road_exp_setup
+
+
+class TestTrajectoryRecorder(unittest.TestCase):
+    """
+    Tests that the trajectories recorded during the rollouts of a ring road
+    environment match the states of the vehicles at the recorded steps.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+        vehicles = Vehicles()
+        vehicles.add_vehicles(veh_id="idm",
+                              acceleration_controller=(IDMController, {}),
+                              routing_controller=(ContinuousRouter, {}),
+                              num_vehicles=4)
+        vehicles.add_vehicles(veh_id="rl",
+                              acceleration_controller=(RLController, {}),
+                              routing_controller=(ContinuousRouter, {}),
+                              num_vehicles=1)
+
+        sumo_params = SumoParams(sim_backend="mock",
+                                 trajectory_path=self.path,
+                                 trajectory_period=2)
+
+        self.env, self.scenario = ring_road_exp_setup(sumo_params=sumo_params,
+                                                      vehicles=vehicles)
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+        self.scenario = None
+        shutil.rmtree(self.path)
+
+    def test_record(self):
+        expected = []
+        self.env.reset()
+        for step in range(1, 11):
+            self.env.step([0.5 * step])
+            if step % 2 == 0:
+                expected.append((self.env.vehicles.get_ids(),
+                                 self.env.vehicles.get_speed().copy(),
+                                 self.env.vehicles.get_edge(),
+                                 self.env.vehicles.get_headway().copy()))
+
+        # the trajectories are written when the environment is reset
+        self.env.reset()
+        directory = os.path.join(
+            self.path, "%s-trajectory-0" % self.scenario.name)
+        trajectory = load_trajectory(directory)
+
+        np.testing.assert_array_equal(trajectory["step"], [2, 4, 6, 8, 10])
+        np.testing.assert_array_almost_equal(
+            trajectory["time"], 0.1 * trajectory["step"])
+        np.testing.assert_array_equal(trajectory["offsets"],
+                                      np.arange(0, 30, 5))
+        np.testing.assert_array_equal(trajectory["rl_action"][:, 0],
+                                      [1, 2, 3, 4, 5])
+
+        for i, (ids, speed, edges, headway) in enumerate(expected):
+            rows = slice(trajectory["offsets"][i],
+                         trajectory["offsets"][i + 1])
+            self.assertListEqual(
+                trajectory["ids"][trajectory["vehicle"][rows]].tolist(), ids)
+            self.assertListEqual(
+                trajectory["edges"][trajectory["edge"][rows]].tolist(), edges)
+            np.testing.assert_array_equal(trajectory["speed"][rows], speed)
+            np.testing.assert_array_equal(trajectory["headway"][rows],
+                                          headway)
+
+    def test_fields(self):
+        self.assertRaises(ValueError, TrajectoryRecorder, self.path, "test",
+                          fields=["speed", "color"])
+
+        recorder = TrajectoryRecorder(self.path, "test", fields=["speed"],
+                                      initial_capacity=1)
+        for _ in range(10):
+            self.env.step([0])
+            recorder.record(self.env)
+        trajectory = load_trajectory(recorder.flush())
+
+        self.assertSetEqual(
+            set(trajectory),
+            {"time", "step", "offsets", "vehicle", "ids", "edges", "speed"})
+        self.assertEqual(len(trajectory["speed"]), 50)
+
+        # nothing is written for empty episodes
+        self.assertIsNone(recorder.flush())
+
+
+if __name__ == '__main__':
+    unittest.main()
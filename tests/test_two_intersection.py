@@ -0,0 +1,118 @@
+import unittest
+
+import numpy as np
+
+from flow.core.params import SumoParams, EnvParams, NetParams, InitialConfig
+from flow.core.vehicles import Vehicles
+from flow.controllers.car_following_models import IDMController
+from flow.controllers.routing_controllers import ContinuousRouter
+from flow.envs.two_intersection import TwoIntersectionEnvironment
+from flow.scenarios.loop.gen import CircleGenerator
+from flow.scenarios.loop.loop_scenario import LoopScenario
+
+from setup_scripts import CONTROLLED_LANES, PROGRAM
+
+
+class LoopIntersectionEnvironment(TwoIntersectionEnvironment):
+    """
+    Two-way intersection environment whose approaching lanes are the edges of
+    a ring road, which may be run on the mock backend.
+    """
+    approach_lanes = ["bottom_0", "bottom_1", "top_0", "top_1",
+                      "right_0", "right_1", "left_0", "left_1"]
+
+    junction_lane = "bottom_0"
+
+    traffic_light = "tls"
+
+    def setup_initial_state(self):
+        self.traci_connection.add_traffic_light(
+            "tls", CONTROLLED_LANES, PROGRAM)
+        super(LoopIntersectionEnvironment, self).setup_initial_state()
+
+
+class TestIntersectionState(unittest.TestCase):
+    """
+    Tests that the state of the two-way intersection environment, computed
+    from lane subscriptions and the ranks of the positions of vehicles in
+    their lanes, matches the state computed vehicle by vehicle.
+    """
+    def setUp(self):
+        vehicles = Vehicles()
+        vehicles.add_vehicles(veh_id="idm",
+                              acceleration_controller=(IDMController, {}),
+                              routing_controller=(ContinuousRouter, {}),
+                              num_vehicles=30)
+
+        net_params = NetParams(additional_params={
+            "length": 400, "lanes": 2, "speed_limit": 30, "resolution": 40})
+
+        initial_config = InitialConfig(lanes_distribution=2, shuffle=True,
+                                       additional_params={"enter_speed": 10})
+
+        self.scenario = LoopScenario(name="IntersectionTest",
+                                     generator_class=CircleGenerator,
+                                     vehicles=vehicles,
+                                     net_params=net_params,
+                                     initial_config=initial_config)
+
+        self.env = LoopIntersectionEnvironment(
+            env_params=EnvParams(),
+            sumo_params=SumoParams(sim_backend="mock"),
+            scenario=self.scenario)
+
+    def tearDown(self):
+        # terminate the traci instance
+        self.env.terminate()
+
+        # free data used by the class
+        self.env = None
+        self.scenario = None
+
+    def expected_state(self):
+        """
+        Computes the state of the environment vehicle by vehicle.
+        """
+        traci = self.env.traci_connection
+        tracker = self.env.traffic_light_tracker
+        junction_length = traci.lane.getLength("bottom_0")
+
+        no_leader, no_follower, remaining_green, next_green = \
+            dict(), dict(), dict(), dict()
+        for code, lane_id in enumerate(self.env.approach_lanes):
+            veh_ids = traci.lane.getLastStepVehicleIDs(lane_id)
+            for veh_id in veh_ids:
+                pos = traci.vehicle.getLanePosition(veh_id)
+                others = [traci.vehicle.getLanePosition(other)
+                          for other in veh_ids]
+                no_leader[veh_id] = sum(other > pos for other in others)
+                no_follower[veh_id] = sum(other < pos for other in others)
+                rg, ng = tracker.get_green_times([code])
+                remaining_green[veh_id] = rg[0]
+                next_green[veh_id] = ng[0]
+
+        return np.array(
+            [[self.env.vehicles.get_speed(veh_id) / 10,
+              self.env.vehicles.get_absolute_position(veh_id) / 400,
+              junction_length - traci.vehicle.getLanePosition(veh_id),
+              self.env.vehicles.get_lane(veh_id),
+              no_leader.get(veh_id, 0),
+              no_follower.get(veh_id, 0),
+              remaining_green.get(veh_id, 0),
+              next_green.get(veh_id, 0)]
+             for veh_id in self.env.sorted_ids])
+
+    def test_state(self):
+        for _ in range(20):
+            for _ in range(17):
+                self.env.step([])
+            state = self.env.get_state()
+            np.testing.assert_array_almost_equal(state, self.expected_state())
+
+        self.assertGreater(np.sum(state[:, 4]), 0)
+        self.assertGreater(np.sum(state[:, 6]), 0)
+        self.assertTrue(np.all(state[:, 7] > 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
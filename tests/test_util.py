@@ -1,8 +1,12 @@
 import unittest
+import os
+import shutil
+import tempfile
 import numpy as np
 import csv
 
 from flow.core.util import emission_to_csv
+from flow.core.emission import convert_emission, COLUMN_NAMES
 
 
 class TestEmissionToCSV(unittest.TestCase):
@@ -38,5 +42,64 @@ class TestEmissionToCSV(unittest.TestCase):
         self.assertEqual(len(dict1), 104)
 
 
+class TestConvertEmission(unittest.TestCase):
+    """
+    Tests that the sorted records do not depend on the size of the chunks
+    sorted in memory and merged, and that the columnar outputs match the csv
+    output.
+    """
+    def setUp(self):
+        self.emission_path = "./test_files/test-emission.xml"
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        # free data used by the class
+        shutil.rmtree(self.tmp_dir)
+
+    def read_csv(self, path):
+        with open(path, "r") as infile:
+            return list(csv.reader(infile))
+
+    def test_chunk_size(self):
+        expected = self.read_csv(convert_emission(
+            self.emission_path, os.path.join(self.tmp_dir, "expected.csv")))
+
+        # the records of each vehicle are sorted by time
+        self.assertListEqual(expected[0], COLUMN_NAMES)
+        rows = expected[1:]
+        self.assertListEqual(
+            rows, sorted(rows, key=lambda row: (row[6], float(row[0]))))
+
+        # small chunks, merged in several passes
+        for chunk_size, fan_in in [(1, 2), (7, 3), (30, 64)]:
+            path = convert_emission(
+                self.emission_path, os.path.join(self.tmp_dir, "out.csv"),
+                chunk_size=chunk_size, fan_in=fan_in)
+            self.assertListEqual(self.read_csv(path), expected)
+
+        # only the output file is left behind
+        self.assertListEqual(sorted(os.listdir(self.tmp_dir)),
+                             ["expected.csv", "out.csv"])
+
+    def test_columnar(self):
+        rows = self.read_csv(convert_emission(
+            self.emission_path, os.path.join(self.tmp_dir, "out.csv")))[1:]
+
+        columns = np.load(convert_emission(
+            self.emission_path, os.path.join(self.tmp_dir, "out.npz"),
+            output_format="npz", chunk_size=10))
+        records = np.load(convert_emission(
+            self.emission_path, os.path.join(self.tmp_dir, "out.npy"),
+            output_format="npy", chunk_size=10), mmap_mode="r")
+
+        self.assertEqual(columns["speed"].dtype, np.float64)
+        self.assertEqual(columns["lane_number"].dtype, np.int64)
+        for i, name in enumerate(COLUMN_NAMES):
+            self.assertListEqual([str(v) for v in columns[name].tolist()],
+                                 [row[i] for row in rows])
+            np.testing.assert_array_equal(records[name], columns[name])
+        columns.close()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+import numpy as np
+
+from flow.core.params import SumoParams
+from flow.core.vec_env import VecEnv
+from flow.core.vehicles import Vehicles
+
+from flow.controllers.routing_controllers import ContinuousRouter
+from flow.controllers.car_following_models import *
+from flow.controllers.rlcontroller import RLController
+
+from setup_scripts import ring_road_exp_setup
+
+
+def make_env(num_vehicles=4):
+    """
+    Creates a ring road environment with an rl vehicle, running on the mock
+    simulation backend.
+    """
+    sumo_params = SumoParams(sim_backend="mock")
+
+    vehicles = Vehicles()
+    vehicles.add_vehicles(veh_id="test",
+                          acceleration_controller=(IDMController, {}),
+                          routing_controller=(ContinuousRouter, {}),
+                          num_vehicles=num_vehicles)
+    vehicles.add_vehicles(veh_id="rl",
+                          acceleration_controller=(RLController, {}),
+                          routing_controller=(ContinuousRouter, {}),
+                          num_vehicles=1)
+
+    env, scenario = ring_road_exp_setup(sumo_params=sumo_params,
+                                        vehicles=vehicles)
+    return env
+
+
+def make_failing_env():
+    """
+    Creates a ring road environment whose steps raise an exception.
+    """
+    env = make_env()
+
+    def step(rl_actions):
+        raise ValueError("failing step")
+    env.step = step
+    return env
+
+
+def fail():
+    raise ValueError("failing environment")
+
+
+class TestVecEnv(unittest.TestCase):
+    """
+    Tests that environments stepped by a VecEnv produce the same observations
+    as environments stepped one at a time.
+    """
+    def setUp(self):
+        self.vec_env = VecEnv([make_env, make_env])
+
+    def tearDown(self):
+        # terminate the workers
+        self.vec_env.close()
+
+        # free data used by the class
+        self.vec_env = None
+
+    def test_step(self):
+        env = make_env()
+        expected = [np.asarray(env.reset())]
+        for _ in range(10):
+            expected.append(np.asarray(env.step([1])[0]))
+        env.terminate()
+
+        observations = self.vec_env.reset()
+        self.assertEqual(observations.shape, (2,) + expected[0].shape)
+        np.testing.assert_array_almost_equal(observations[1], expected[0])
+
+        for i in range(10):
+            observations, rewards, dones, infos = \
+                self.vec_env.step([[1], [1]])
+            self.assertEqual(len(rewards), 2)
+            self.assertFalse(np.any(dones))
+            for j in range(2):
+                np.testing.assert_array_almost_equal(observations[j],
+                                                     expected[i + 1])
+
+    def test_step_async(self):
+        num_steps = np.zeros(2, dtype=int)
+        for _ in range(10):
+            env_ids, observations, rewards, dones, infos = \
+                self.vec_env.step_async([[1], [1]])
+            self.assertGreaterEqual(len(env_ids), 1)
+            self.assertEqual(len(observations), len(env_ids))
+            num_steps[env_ids] += 1
+        self.assertGreaterEqual(num_steps.sum(), 10)
+
+        # stepping synchronously waits for pending actions
+        self.vec_env.step([[1], [1]])
+        self.assertEqual(len(self.vec_env.pending), 0)
+
+    def test_shapes(self):
+        # environments with different number of vehicles cannot be stacked
+        self.assertRaises(ValueError, VecEnv,
+                          [make_env, lambda: make_env(num_vehicles=3)])
+
+
+
+class TestWorkerErrors(unittest.TestCase):
+    """
+    Tests that exceptions raised by environments in their workers are raised
+    by the VecEnv, with the traceback of the worker.
+    """
+    def test_step(self):
+        vec_env = VecEnv([make_env, make_failing_env])
+        with self.assertRaises(RuntimeError) as context:
+            vec_env.step([[1], [1]])
+        self.assertIn("Environment 1", str(context.exception))
+        self.assertIn("failing step", str(context.exception))
+        self.assertEqual(len(vec_env.pending), 0)
+        vec_env.close()
+
+    def test_creation(self):
+        with self.assertRaises(RuntimeError) as context:
+            VecEnv([make_env, fail])
+        self.assertIn("failing environment", str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+import unittest
+import numpy as np
+
+from flow.core.vehicles import Vehicles
+
+from flow.controllers.car_following_models import *
+
+
+class TestColumnarStates(unittest.TestCase):
+    """
+    Tests that states stored in columnar form can be set and retrieved for a
+    single vehicle, a list of vehicles, or all vehicles in the network.
+    """
+    def setUp(self):
+        self.vehicles = Vehicles()
+        self.vehicles.add_vehicles(veh_id="idm",
+                                   acceleration_controller=(IDMController, {}),
+                                   num_vehicles=3)
+        self.vehicles.add_vehicles(veh_id="cfm",
+                                   acceleration_controller=(CFMController, {}),
+                                   num_vehicles=2)
+
+    def tearDown(self):
+        # free data used by the class
+        self.vehicles = None
+
+    def runTest(self):
+        ids = self.vehicles.get_ids()
+
+        # set the speeds of all vehicles, one at a time
+        for i, veh_id in enumerate(ids):
+            self.vehicles.set_speed(veh_id, i)
+
+        np.testing.assert_array_almost_equal(
+            self.vehicles.get_speed(), [0, 1, 2, 3, 4])
+        np.testing.assert_array_almost_equal(
+            self.vehicles.get_speed(["cfm_1", "idm_0"]), [4, 0])
+        self.assertEqual(self.vehicles.get_speed("idm_2"), 2)
+        self.assertEqual(self.vehicles.get_index("cfm_0"), 3)
+
+        # set the speeds of a list of vehicles at once
+        self.vehicles.set_speed(["idm_1", "cfm_0"], [10, 30])
+        np.testing.assert_array_almost_equal(
+            self.vehicles.get_state("all", "speed"), [0, 10, 2, 30, 4])
+
+        # the full state of a vehicle includes both columnar and non-columnar
+        # states
+        full_state = self.vehicles.get_full_state("cfm_0")
+        self.assertEqual(full_state["speed"], 30)
+        self.assertEqual(full_state["type"], "cfm")
+
+
+class TestSetHeadwayData(unittest.TestCase):
+    """
+    Tests that the leaders, followers, and headways of all vehicles are
+    properly set when updated at once, including for vehicles without leaders.
+    """
+    def setUp(self):
+        self.vehicles = Vehicles()
+        self.vehicles.add_vehicles(veh_id="test",
+                                   acceleration_controller=(IDMController, {}),
+                                   num_vehicles=4)
+
+    def tearDown(self):
+        # free data used by the class
+        self.vehicles = None
+
+    def runTest(self):
+        # test_0 -> test_1 -> test_2 are in a platoon, and test_3 is alone
+        self.vehicles.set_headway_data(
+            leader_index=np.array([1, 2, -1, -1]),
+            headway=np.array([5, 10, 1e-3, 1e-3]))
+
+        self.assertListEqual(self.vehicles.get_leader(),
+                             ["test_1", "test_2", None, None])
+        self.assertListEqual(self.vehicles.get_follower(),
+                             [None, "test_0", "test_1", None])
+        np.testing.assert_array_almost_equal(
+            self.vehicles.get_headway(), [5, 10, 1e-3, 1e-3])
+        np.testing.assert_array_equal(
+            self.vehicles.get_follower_index(), [-1, 0, 1, -1])
+
+        # followers of vehicles that lost their leader are reset
+        self.vehicles.set_headway_data(
+            leader_index=np.array([-1, 2, -1, -1]),
+            headway=np.array([1e-3, 10, 1e-3, 1e-3]))
+        self.assertIsNone(self.vehicles.get_follower("test_1"))
+        self.assertEqual(self.vehicles.get_follower("test_2"), "test_1")
+
+        # single-vehicle setters are consistent with the bulk update
+        self.vehicles.set_leader("test_3", "test_0")
+        self.assertEqual(self.vehicles.get_state("test_3", "leader"), "test_0")
+
+
+class TestDynamicVehicles(unittest.TestCase):
+    """
+    Tests that vehicles may be added to and removed from the network, while
+    keeping the states, leaders, and followers of the remaining vehicles, and
+    that controllers are only instantiated when requested.
+    """
+    def setUp(self):
+        self.vehicles = Vehicles()
+        self.vehicles.add_vehicles(veh_id="test",
+                                   acceleration_controller=(IDMController, {}),
+                                   num_vehicles=5)
+        self.vehicles.add_vehicles(veh_id="cfm",
+                                   acceleration_controller=(CFMController, {}),
+                                   num_vehicles=0)
+
+    def tearDown(self):
+        # free data used by the class
+        self.vehicles = None
+
+    def test_remove(self):
+        self.vehicles.set_speed("all", np.arange(5))
+
+        # test_0 -> test_1 -> ... -> test_4 -> test_0 in a ring
+        self.vehicles.set_headway_data(
+            leader_index=np.array([1, 2, 3, 4, 0]), headway=np.ones(5))
+        new_index = self.vehicles.remove(["test_1", "test_4"])
+
+        # the remaining vehicles move up, keeping their order
+        self.assertListEqual(self.vehicles.get_ids(),
+                             ["test_0", "test_2", "test_3"])
+        np.testing.assert_array_equal(new_index, [0, -1, 1, 2, -1])
+        self.assertEqual(self.vehicles.get_index("test_3"), 2)
+        self.assertEqual(self.vehicles.num_vehicles, 3)
+        np.testing.assert_array_almost_equal(self.vehicles.get_speed(),
+                                             [0, 2, 3])
+        self.assertListEqual(self.vehicles.get_leader(),
+                             [None, "test_3", None])
+        self.assertListEqual(self.vehicles.get_follower(),
+                             [None, None, "test_2"])
+        self.assertListEqual(self.vehicles.get_controlled_ids(),
+                             ["test_0", "test_2", "test_3"])
+
+    def test_add(self):
+        self.vehicles.remove("test_0")
+        self.vehicles.add("cfm_in", "cfm")
+        self.vehicles.add("test_0", "test")
+        self.assertListEqual(self.vehicles.get_ids(),
+                             ["test_1", "test_2", "test_3", "test_4",
+                              "cfm_in", "test_0"])
+        self.assertEqual(self.vehicles.get_speed("cfm_in"), 0)
+        self.assertIsNone(self.vehicles.get_leader("cfm_in"))
+        self.assertEqual(self.vehicles.get_state("cfm_in", "type"), "cfm")
+        self.assertIsInstance(self.vehicles.get_acc_controller("cfm_in"),
+                              CFMController)
+
+        self.assertRaises(ValueError, self.vehicles.add, "test_0", "test")
+        self.assertRaises(ValueError, self.vehicles.add, "new", "unknown")
+
+    def test_stable_order(self):
+        # the lists of ids are updated in place, in their previous order
+        ids = self.vehicles.get_ids()
+        controlled_ids = self.vehicles.get_controlled_ids()
+        for i in range(5):
+            self.vehicles.add("cfm_%d" % i, "cfm")
+        self.vehicles.set_speed("all", np.arange(10))
+
+        self.vehicles.remove(["cfm_3", "test_1", "cfm_0"])
+        expected = ["test_0", "test_2", "test_3", "test_4", "cfm_1", "cfm_2",
+                    "cfm_4"]
+        self.assertListEqual(ids, expected)
+        self.assertListEqual(controlled_ids, expected)
+        np.testing.assert_array_equal(self.vehicles.get_index(expected),
+                                      np.arange(7))
+        np.testing.assert_array_almost_equal(self.vehicles.get_speed(),
+                                             [0, 2, 3, 4, 6, 7, 9])
+
+    def test_capacity(self):
+        # the state arrays grow with the number of vehicles in the network,
+        # and shrink once most vehicles left
+        for step in range(20):
+            new_ids = ["cfm_%d_%d" % (step, i) for i in range(50)]
+            for veh_id in new_ids:
+                self.vehicles.add(veh_id, "cfm")
+            self.vehicles.remove(new_ids)
+        self.assertEqual(self.vehicles.num_vehicles, 5)
+        self.assertListEqual(self.vehicles.get_ids(),
+                             ["test_%d" % i for i in range(5)])
+
+        # the states of all vehicles are views of the state arrays
+        self.assertLessEqual(len(self.vehicles.get_headway().base), 10)
+
+    def test_lazy_controllers(self):
+        full_state = self.vehicles.get_full_state("test_0")
+        self.assertIsInstance(full_state["acc_controller"], IDMController)
+        self.assertIsNone(full_state["router"])
+
+        # controllers are instantiated once per vehicle
+        self.assertIs(self.vehicles.get_acc_controller("test_0"),
+                      self.vehicles.get_acc_controller("test_0"))
+        self.assertIsNot(self.vehicles.get_acc_controller("test_0"),
+                         self.vehicles.get_acc_controller("test_1"))
+        self.assertEqual(self.vehicles.get_acc_controller("test_1").veh_id,
+                         "test_1")
+
+
+if __name__ == '__main__':
+    unittest.main()